@@ -3,12 +3,20 @@ from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
 from datetime import timedelta, datetime
-import requests
-import pickle
+from bisect import bisect_left
 import numpy as np
 import os
 from dotenv import load_dotenv
+from forecast_cache import ForecastCache
+from open_meteo import client_from_env
+from model_registry import ModelRegistry
+from temporal_features import TemporalFeatureStore, add_temporal_features
+from gazetteer import Gazetteer
+from locations import nearest_location
+from database import engine_options, configure_sqlite, apply_migrations
+from favorites_cache import FavoritesCache
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +31,7 @@ CORS(app, origins=cors_origins)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///weather.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'fallback-jwt-key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES_HOURS', 1)))
 app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES_DAYS', 30)))
@@ -33,9 +42,73 @@ DEFAULT_LON = float(os.getenv('DEFAULT_LONGITUDE', 105.8542))
 DEFAULT_CITY = os.getenv('DEFAULT_CITY', 'Hanoi')
 DEFAULT_COUNTRY = os.getenv('DEFAULT_COUNTRY', 'Vietnam')
 
-# API URLs
-OPEN_METEO_API = os.getenv('OPEN_METEO_API_URL', 'https://api.open-meteo.com/v1/forecast')
-OPEN_METEO_ARCHIVE = os.getenv('OPEN_METEO_ARCHIVE_URL', 'https://archive-api.open-meteo.com/v1/archive')
+# Superset forecast query: một lần gọi phục vụ cả /api/weather/, /api/chatbot/ và /api/model-forecast/.
+# past_days=1 lấy thêm 24 giờ trước (lag / rolling dài nhất) cho temporal features của /api/model-forecast/
+# và /api/predict-temperature/; các projection bỏ phần quá khứ này qua forecast_start
+FORECAST_PARAMS = {
+    "current": "temperature_2m,relative_humidity_2m,precipitation,weathercode,cloud_cover,windspeed_10m,winddirection_10m,pressure_msl,shortwave_radiation",
+    "hourly": "temperature_2m,relative_humidity_2m,precipitation,weathercode,cloud_cover,windspeed_10m,winddirection_10m,pressure_msl,shortwave_radiation",
+    "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode,sunrise,sunset",
+    "timezone": "auto",
+    "past_days": 1,
+    "forecast_days": 14
+}
+
+# Biến hourly của Open-Meteo -> tên cột trong dữ liệu train (giống scripts/collect_data.py)
+MODEL_FORECAST_COLUMNS = {
+    'temperature_2m': 'temperature',
+    'relative_humidity_2m': 'humidity',
+    'precipitation': 'precipitation',
+    'weathercode': 'weathercode',
+    'cloud_cover': 'cloud_cover',
+    'windspeed_10m': 'windspeed',
+    'winddirection_10m': 'winddirection',
+    'pressure_msl': 'pressure_msl',
+    'shortwave_radiation': 'radiation'
+}
+
+# Target của model -> biến hourly Open-Meteo để so sánh
+MODEL_FORECAST_TARGETS = {
+    'temperature': ('temperature_2m', 1),
+    'humidity': ('relative_humidity_2m', 1),
+    'precipitation': ('precipitation', 2)
+}
+
+# Điều kiện hiện tại cho danh sách yêu thích (request nhiều toạ độ)
+CONDITIONS_PARAMS = {
+    "current": "temperature_2m,weathercode",
+    "timezone": "auto",
+    "forecast_days": 1
+}
+# Số toạ độ tối đa trong một request Open-Meteo
+OPEN_METEO_MAX_LOCATIONS = int(os.getenv('OPEN_METEO_MAX_LOCATIONS', 100))
+
+# Shared Open-Meteo client (connection pool, retry, circuit breaker)
+open_meteo = client_from_env()
+
+# Forecast cache (toạ độ snap theo lưới, TTL theo chu kỳ cập nhật của Open-Meteo)
+forecast_cache = ForecastCache(
+    max_size=int(os.getenv('FORECAST_CACHE_SIZE', 512)),
+    grid=float(os.getenv('FORECAST_CACHE_GRID', 0.01)),
+    field_ttl={
+        'current': int(os.getenv('FORECAST_TTL_CURRENT', 900)),
+        'hourly': int(os.getenv('FORECAST_TTL_HOURLY', 3600)),
+        'daily': int(os.getenv('FORECAST_TTL_DAILY', 10800))
+    },
+    stale_ttl=int(os.getenv('FORECAST_CACHE_STALE_SECONDS', 600)),
+    snap_km=float(os.getenv('FORECAST_CACHE_SNAP_KM', 0))
+)
+
+# Ring buffer quan sát theo vị trí cho lag / rolling features (cùng lưới snap với forecast cache)
+temporal_store = TemporalFeatureStore(
+    grid=forecast_cache.grid,
+    max_locations=int(os.getenv('TEMPORAL_MAX_LOCATIONS', 1024))
+)
+
+# Chỉ mục tìm thành phố từ file gazetteer cục bộ (không gọi geocoder bên ngoài)
+gazetteer = Gazetteer.load(os.getenv('GAZETTEER_FILE', 'data/gazetteer.csv'))
+SEARCH_CITY_LIMIT = int(os.getenv('SEARCH_CITY_LIMIT', 10))
+SEARCH_CITY_MAX_LIMIT = 50
 
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
@@ -58,152 +131,224 @@ class Favorite(db.Model):
     longitude = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'latitude', 'longitude', name='_user_location_uc'),)
-
-
-class WeatherPredictor:
-    """
-    Multi-model predictor với features được tối ưu cho từng loại dự báo
-    Sử dụng dữ liệu đã được chuẩn hóa theo chuỗi thời gian
-    """
-    def __init__(self):
-        self.models = {}
-        self.scalers = {}
-        self.feature_config = {}
-        self.load_models()
-    
-    def load_models(self):
-        try:
-            # Load main temperature model (backward compatible)
-            with open('model/weather_model.pkl', 'rb') as f:
-                self.models['temperature'] = pickle.load(f)
-            with open('model/scaler.pkl', 'rb') as f:
-                self.scalers['temperature'] = pickle.load(f)
-            
-            # Load all models if available
-            try:
-                with open('model/all_models.pkl', 'rb') as f:
-                    self.models = pickle.load(f)
-                with open('model/all_scalers.pkl', 'rb') as f:
-                    self.scalers = pickle.load(f)
-                with open('model/feature_config.pkl', 'rb') as f:
-                    self.feature_config = pickle.load(f)
-                print("  Multi-model system loaded successfully")
-            except FileNotFoundError:
-                # Fallback to temperature-only model
-                self.feature_config = {
-                    'temperature': ['pressure_msl', 'radiation', 'wind_y']
-                }
-                print("  Temperature model loaded (single model mode)")
-                
-        except FileNotFoundError:
-            print("⚠ Model files not found. Please train the model first.")
-            self.models = {}
-            self.scalers = {}
-            self.feature_config = {}
-    
-    def preprocess_weather_code(self, weathercode):
-        """
-        Chuyển đổi weathercode thành các biến dummy (w_xx)
-        Theo phân tích báo cáo: w_51, w_53, w_61, w_63, w_65 quan trọng
-        """
-        weather_features = {}
-        important_codes = [51, 53, 61, 63, 65]
-        
-        for code in important_codes:
-            weather_features[f'w_{code}'] = 1 if weathercode == code else 0
-        
-        return weather_features
-    
-    def predict_temperature(self, features_dict):
-        """
-        Dự báo nhiệt độ sử dụng: pressure_msl, radiation, wind_y
-        """
-        if 'temperature' not in self.models:
-            return None
-        
-        feature_names = self.feature_config.get('temperature', 
-                                                ['pressure_msl', 'radiation', 'wind_y'])
-        
-        # Chuẩn bị features
-        features = []
-        for col in feature_names:
-            features.append(features_dict.get(col, 0))
-        
-        X = np.array(features).reshape(1, -1)
-        X_scaled = self.scalers['temperature'].transform(X)
-        prediction = self.models['temperature'].predict(X_scaled)
-        
-        return float(prediction[0])
-    
-    def predict_humidity(self, features_dict):
-        """
-        Dự báo độ ẩm sử dụng: radiation (nghịch), w_51, w_53, w_61, w_63 (thuận)
-        """
-        if 'humidity' not in self.models:
-            return None
-        
-        feature_names = self.feature_config.get('humidity', 
-                                                ['radiation', 'w_51', 'w_53', 'w_61', 'w_63'])
-        
-        # Thêm weather code features nếu có
-        if 'weathercode' in features_dict:
-            weather_features = self.preprocess_weather_code(features_dict['weathercode'])
-            features_dict.update(weather_features)
-        
-        features = []
-        for col in feature_names:
-            features.append(features_dict.get(col, 0))
-        
-        X = np.array(features).reshape(1, -1)
-        X_scaled = self.scalers['humidity'].transform(X)
-        prediction = self.models['humidity'].predict(X_scaled)
-        
-        # Giới hạn trong khoảng [0, 100]%
-        return float(max(0, min(100, prediction[0])))
-    
-    def predict_precipitation(self, features_dict):
-        """
-        Dự báo lượng mưa sử dụng: w_63, w_65, w_61 (bắt buộc)
-        """
-        if 'precipitation' not in self.models:
-            return None
-        
-        feature_names = self.feature_config.get('precipitation', 
-                                                ['w_63', 'w_65', 'w_61'])
-        
-        # Thêm weather code features nếu có
-        if 'weathercode' in features_dict:
-            weather_features = self.preprocess_weather_code(features_dict['weathercode'])
-            features_dict.update(weather_features)
-        
-        features = []
-        for col in feature_names:
-            features.append(features_dict.get(col, 0))
-        
-        X = np.array(features).reshape(1, -1)
-        X_scaled = self.scalers['precipitation'].transform(X)
-        prediction = self.models['precipitation'].predict(X_scaled)
-        
-        # Lượng mưa không âm
-        return float(max(0, prediction[0]))
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'latitude', 'longitude', name='_user_location_uc'),
+        # Danh sách yêu thích của một user theo thứ tự thêm vào (database cũ: migration 1)
+        db.Index('ix_favorite_user_created', 'user_id', 'created_at'),
+    )
+
+
+# Model registry: tự load lại artifact khi model/*.pkl thay đổi (0 = tắt watcher)
+model_registry = ModelRegistry(
+    model_dir=os.getenv('MODEL_DIR', 'model'),
+    watch_interval=float(os.getenv('MODEL_WATCH_INTERVAL', 30))
+)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+# Bán kính tối đa (km) để dùng model riêng của vị trí đã train gần nhất
+LOCATION_MODEL_MAX_KM = float(os.getenv('LOCATION_MODEL_MAX_KM', 50))
+
+# Danh sách yêu thích đã serialize theo user, xoá khi user thêm / xoá (REDIS_URL để dùng chung giữa các worker)
+favorites_cache = FavoritesCache(
+    max_size=int(os.getenv('FAVORITES_CACHE_SIZE', 1024)),
+    redis_url=os.getenv('REDIS_URL') or None,
+    ttl=int(os.getenv('FAVORITES_CACHE_TTL', 300))
+)
+# Vị trí mới cách một vị trí yêu thích sẵn có trong bán kính này (km) coi là trùng
+FAVORITE_MATCH_KM = float(os.getenv('FAVORITE_MATCH_KM', 0.5))
+
+PREDICT_BATCH_MAX_ROWS = int(os.getenv('PREDICT_BATCH_MAX_ROWS', 10000))
+MODEL_FORECAST_HOURS = int(os.getenv('MODEL_FORECAST_HOURS', 48))
+
+
+def fetch_open_meteo(params, timeout=10):
+    return open_meteo.forecast(params, timeout=timeout)
+
+def forecast_key(lat, lon, params):
+    """
+    Key forecast cache của một query (toạ độ snap lưới + tập biến + số ngày) và các trường của nó
+    """
+    sections = [s for s in ('current', 'hourly', 'daily') if s in params]
+    variables = tuple((s, tuple(sorted(params[s].split(',')))) for s in sections)
+    key = forecast_cache.make_key(lat, lon, variables, params.get('forecast_days'), params.get('past_days'))
+    return key, sections
+
+def get_forecast(lat, lon, params, timeout=10):
+    """
+    Lấy dự báo qua forecast cache. Key gồm toạ độ đã snap, tập biến, forecast_days và past_days
+    nên các request đồng thời giống nhau chỉ tạo một lần gọi Open-Meteo.
+    Kết quả được chia sẻ giữa các request, không sửa trực tiếp.
+    """
+    key, sections = forecast_key(lat, lon, params)
+    params = dict(params, latitude=key[0], longitude=key[1])
+    return forecast_cache.get_or_fetch(
+        key,
+        lambda: fetch_open_meteo(params, timeout=timeout),
+        fields=sections
+    )
+
+def get_forecasts(locations, params, timeout=10):
+    """
+    Dự báo cho nhiều vị trí [(lat, lon), ...] qua forecast cache. Các vị trí chưa có trong cache
+    được lấy bằng một request Open-Meteo nhiều toạ độ (latitude/longitude phân tách bởi dấu phẩy,
+    tối đa OPEN_METEO_MAX_LOCATIONS mỗi request). Trả về list cùng thứ tự, None nếu không lấy được.
+    """
+    keys = [forecast_key(lat, lon, params)[0] for lat, lon in locations]
+    if not keys:
+        return []
+    sections = forecast_key(*locations[0], params)[1]
+    
+    def fetch_many(missing):
+        values = []
+        for i in range(0, len(missing), OPEN_METEO_MAX_LOCATIONS):
+            batch = missing[i:i + OPEN_METEO_MAX_LOCATIONS]
+            data = fetch_open_meteo(dict(
+                params,
+                latitude=','.join(str(key[0]) for key in batch),
+                longitude=','.join(str(key[1]) for key in batch)
+            ), timeout=timeout)
+            # Một toạ độ thì Open-Meteo trả object, nhiều toạ độ thì trả list
+            values.extend(data if isinstance(data, list) else [data])
+        return values
+    
+    found = forecast_cache.get_many_or_fetch(keys, fetch_many, fields=sections)
+    return [found.get(key) for key in keys]
+
+def get_location_forecast(lat, lon, timeout=10):
+    """
+    Tài liệu dự báo chuẩn (superset) cho một vị trí, dùng chung giữa các endpoint
+    """
+    return get_forecast(lat, lon, FORECAST_PARAMS, timeout=timeout)
+
+def forecast_start(data):
+    """
+    Chỉ số giờ (hourly) và ngày (daily) đầu tiên của hôm nay trong superset forecast,
+    bỏ qua các ngày quá khứ do past_days thêm vào
+    """
+    past = FORECAST_PARAMS.get('past_days', 0)
+    return bisect_left(data['hourly']['time'], data['daily']['time'][past]), past
+
+def with_temporal_features(predictor, data):
+    """
+    Thêm temporal features (lag, rolling, harmonic) cho request dự báo có lat/lon nếu model dùng tới:
+    nạp các giờ mới trong superset forecast (cùng entry cache với trang thời tiết) vào ring buffer của vị trí
+    rồi tính O(1). Thời điểm dự báo là data['time'] nếu có, ngược lại là giờ hiện tại của vị trí.
+    Feature nào client đã gửi thì giữ nguyên.
+    """
+    lat, lon = data.get('lat'), data.get('lon')
+    if not predictor.temporal_features or lat is None or lon is None:
+        return data
 
-predictor = WeatherPredictor()
+    timestamp = data.get('time')
+    try:
+        history = get_location_forecast(lat, lon)
+        temporal_store.observe_forecast(lat, lon, history)
+        timestamp = timestamp or history['current']['time']
+    except Exception as e:
+        # Không có lịch sử: model vẫn chạy, feature thiếu được điền bằng mean
+        print(f"⚠ Temporal history unavailable: {e}")
+    if timestamp is None:
+        return data
+    return {**temporal_store.features(lat, lon, timestamp), **data}
 
+def build_model_forecast(predictor, data, hours):
+    """
+    Chạy mọi model trên chuỗi hourly của Open-Meteo (cùng 48 giờ đầu như /api/weather/):
+    dựng ma trận features hours x F một lần, predict_batch cho cả chuỗi rồi đặt cạnh giá trị upstream.
+    Temporal features được tính trên cả các giờ past_days trước đó để lag / rolling của những giờ đầu
+    có lịch sử thật, sau đó cắt bỏ phần quá khứ.
+    """
+    hourly = data['hourly']
+    start, _ = forecast_start(data)
+    n = min(hours, len(hourly['time']) - start)
+    columns = {
+        col: np.array([np.nan if v is None else v for v in hourly[name][:start + n]], dtype=float)
+        for name, col in MODEL_FORECAST_COLUMNS.items() if name in hourly
+    }
+    if predictor.temporal_features:
+        columns = add_temporal_features(dict(columns, timestamp=hourly['time'][:start + n]))
+        columns.pop('timestamp')
+    columns = {col: np.asarray(values)[start:] for col, values in columns.items()}
+    predictions = predictor.predict_batch(columns)
+    
+    series = {}
+    for target, values in predictions.items():
+        upstream_name, digits = MODEL_FORECAST_TARGETS[target]
+        upstream = hourly.get(upstream_name)
+        entry = {'model': np.round(values, digits).tolist()}
+        if upstream is not None:
+            upstream = np.array([np.nan if v is None else v for v in upstream[start:start + n]], dtype=float)
+            entry['upstream'] = [None if np.isnan(v) else round(float(v), digits) for v in upstream]
+            entry['mean_abs_diff'] = round(float(np.nanmean(np.abs(values - upstream))), digits) if np.isfinite(upstream).any() else None
+        series[target] = entry
+    
+    return {
+        'hours': n,
+        'time': hourly['time'][start:start + n],
+        'model_version': predictor.version,
+        'model_location': predictor.location['name'] if predictor.location else None,
+        'series': series
+    }
 
-def preprocess_weather_data(raw_data):
+def project_weather(data):
     """
-    Tiền xử lý dữ liệu thời tiết để phù hợp với model
-    Chuyển đổi wind direction thành wind_x, wind_y
+    Chiếu superset forecast sang response của /api/weather/
     """
-    processed = raw_data.copy()
+    # Format current weather
+    current = {
+        'temperature': round(data['current']['temperature_2m'], 1),
+        'weathercode': data['current']['weathercode'],
+        'windspeed': round(data['current']['windspeed_10m'], 1),
+        'humidity': data['current']['relative_humidity_2m'],
+        'pressure': round(data['current']['pressure_msl'], 1),
+        'precipitation': data['current']['precipitation'],
+        'radiation': data['current'].get('shortwave_radiation', 0),
+        'winddirection': data['current']['winddirection_10m']
+    }
+    
+    hour_start, day_start = forecast_start(data)
+
+    # Format hourly data
+    hourly = []
+    for i in range(hour_start, min(hour_start + 48, len(data['hourly']['time']))):
+        dt = datetime.fromisoformat(data['hourly']['time'][i].replace('Z', '+00:00'))
+        hourly.append({
+            'full_time': data['hourly']['time'][i],
+            'time': dt.strftime('%H:%M'),
+            'temp': round(data['hourly']['temperature_2m'][i], 1),
+            'rain': data['hourly']['precipitation'][i],
+            'code': data['hourly']['weathercode'][i]
+        })
     
-    if 'winddirection' in raw_data:
-        radians = np.deg2rad(raw_data['winddirection'])
-        processed['wind_x'] = float(np.sin(radians))
-        processed['wind_y'] = float(np.cos(radians))
+    # Format daily forecast
+    forecast = []
+    for i in range(day_start, len(data['daily']['time'])):
+        forecast.append({
+            'date': data['daily']['time'][i],
+            'max_temp': round(data['daily']['temperature_2m_max'][i], 1),
+            'min_temp': round(data['daily']['temperature_2m_min'][i], 1),
+            'weathercode': data['daily']['weathercode'][i]
+        })
     
-    return processed
+    return {
+        'current': current,
+        'hourly': hourly,
+        'forecast': forecast
+    }
+
+def project_chatbot(data):
+    """
+    Chiếu superset forecast sang các giá trị chatbot cần (hiện tại + ngày mai)
+    """
+    daily = data['daily']
+    _, today = forecast_start(data)
+    return {
+        'current_temp': data['current']['temperature_2m'],
+        'current_code': data['current']['weathercode'],
+        'tomorrow_rain': daily['precipitation_sum'][today + 1],
+        'tomorrow_max': daily['temperature_2m_max'][today + 1],
+        'tomorrow_min': daily['temperature_2m_min'][today + 1],
+        'tomorrow_code': daily['weathercode'][today + 1]
+    }
 
 def get_weather_status(code):
     if code == 0: return "Clear sky"
@@ -264,87 +409,86 @@ def get_default_location():
         'country': DEFAULT_COUNTRY
     }), 200
 
+@app.route('/api/search-city/', methods=['GET'])
+def search_city():
+    city = request.args.get('city', default='')
+    limit = request.args.get('limit', type=int, default=SEARCH_CITY_LIMIT)
+    limit = max(1, min(limit, SEARCH_CITY_MAX_LIMIT))
+    return jsonify(gazetteer.search(city, limit)), 200
+
 @app.route('/api/weather/', methods=['GET'])
 def get_weather():
     lat = request.args.get('lat', type=float, default=DEFAULT_LAT)
     lon = request.args.get('lon', type=float, default=DEFAULT_LON)
     
     try:
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "current": "temperature_2m,relative_humidity_2m,precipitation,weathercode,cloud_cover,windspeed_10m,winddirection_10m,pressure_msl,shortwave_radiation",
-            "hourly": "temperature_2m,precipitation,weathercode,shortwave_radiation",
-            "daily": "temperature_2m_max,temperature_2m_min,weathercode,sunrise,sunset",
-            "timezone": "auto",
-            "forecast_days": 14
-        }
-        
-        response = requests.get(OPEN_METEO_API, params=params, timeout=10)
-        data = response.json()
-        
-        # Format current weather
-        current = {
-            'temperature': round(data['current']['temperature_2m'], 1),
-            'weathercode': data['current']['weathercode'],
-            'windspeed': round(data['current']['windspeed_10m'], 1),
-            'humidity': data['current']['relative_humidity_2m'],
-            'pressure': round(data['current']['pressure_msl'], 1),
-            'precipitation': data['current']['precipitation'],
-            'radiation': data['current'].get('shortwave_radiation', 0),
-            'winddirection': data['current']['winddirection_10m']
-        }
-        
-        # Format hourly data
-        hourly = []
-        for i in range(min(48, len(data['hourly']['time']))):
-            dt = datetime.fromisoformat(data['hourly']['time'][i].replace('Z', '+00:00'))
-            hourly.append({
-                'full_time': data['hourly']['time'][i],
-                'time': dt.strftime('%H:%M'),
-                'temp': round(data['hourly']['temperature_2m'][i], 1),
-                'rain': data['hourly']['precipitation'][i],
-                'code': data['hourly']['weathercode'][i]
-            })
-        
-        # Format daily forecast
-        forecast = []
-        for i in range(len(data['daily']['time'])):
-            forecast.append({
-                'date': data['daily']['time'][i],
-                'max_temp': round(data['daily']['temperature_2m_max'][i], 1),
-                'min_temp': round(data['daily']['temperature_2m_min'][i], 1),
-                'weathercode': data['daily']['weathercode'][i]
-            })
-        
-        return jsonify({
-            'current': current,
-            'hourly': hourly,
-            'forecast': forecast
-        }), 200
+        data = get_location_forecast(lat, lon, timeout=10)
+        return jsonify(project_weather(data)), 200
         
     except Exception as e:
         print(f"Error fetching weather: {e}")
         return jsonify({'error': 'Failed to fetch weather data'}), 500
 
 
+@app.route('/api/model-forecast/', methods=['GET'])
+def model_forecast():
+    """
+    Dự báo theo giờ của model ML (mặc định 48 giờ) đặt cạnh dự báo hourly của Open-Meteo.
+    Kết quả được cache kèm entry dự báo upstream: chỉ tính lại khi upstream làm mới hoặc đổi model.
+    """
+    lat = request.args.get('lat', type=float, default=DEFAULT_LAT)
+    lon = request.args.get('lon', type=float, default=DEFAULT_LON)
+    hours = request.args.get('hours', type=int, default=MODEL_FORECAST_HOURS)
+    if hours is None or hours < 1:
+        return jsonify({'error': 'hours must be a positive integer'}), 400
+    
+    predictor = model_registry.predictor.for_location(lat, lon, LOCATION_MODEL_MAX_KM)
+    if not predictor.models:
+        return jsonify({'error': 'Model not available'}), 503
+    
+    try:
+        data = get_location_forecast(lat, lon, timeout=10)
+    except Exception as e:
+        print(f"Error fetching weather: {e}")
+        return jsonify({'error': 'Failed to fetch weather data'}), 500
+    
+    try:
+        name = ('model-forecast', predictor.version, predictor.location['name'] if predictor.location else None, hours)
+        result = forecast_cache.derive(data, name, lambda: build_model_forecast(predictor, data, hours))
+        return jsonify(dict(result, latitude=lat, longitude=lon)), 200
+        
+    except Exception as e:
+        print(f"Model forecast error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/cache/stats/', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'forecast': forecast_cache.stats(),
+        'upstream': open_meteo.stats(),
+        'temporal': temporal_store.stats(),
+        'favorites': favorites_cache.stats()
+    }), 200
+
+
 @app.route('/api/predict-temperature/', methods=['POST'])
 def predict_temperature():
     """
     Dự báo nhiệt độ từ các điều kiện thời tiết
     Features cần thiết: pressure_msl, radiation, winddirection (để tính wind_y)
+    Có lat/lon (và tuỳ chọn time) thì thêm lag / rolling features của vị trí nếu model dùng tới
     """
     data = request.get_json()
+    predictor = model_registry.predictor.for_location(data.get('lat'), data.get('lon'), LOCATION_MODEL_MAX_KM)
     
     if not predictor.models:
         return jsonify({'error': 'Model not available'}), 503
     
     try:
-        # Tiền xử lý dữ liệu
-        features = preprocess_weather_data(data)
-        
-        # Dự báo nhiệt độ
-        predicted_temp = predictor.predict_temperature(features)
+        # Tiền xử lý (transform đã fit lúc train) và dự báo tất cả target trong một lần
+        predictions = predictor.predict_all(with_temporal_features(predictor, data))
+        predicted_temp = predictions.get('temperature')
         
         if predicted_temp is None:
             return jsonify({'error': 'Temperature prediction failed'}), 500
@@ -358,20 +502,17 @@ def predict_temperature():
         response = {
             'predicted_temperature': round(predicted_temp, 1),
             'confidence_interval': confidence_interval,
-            'model_version': 'v2.0-timeseries',
+            'model_version': predictor.version,
+            'model_location': predictor.location['name'] if predictor.location else None,
             'features_used': predictor.feature_config.get('temperature', [])
         }
         
         # Nếu có model độ ẩm và lượng mưa, thêm vào
-        if 'humidity' in predictor.models:
-            predicted_humidity = predictor.predict_humidity(features)
-            if predicted_humidity is not None:
-                response['predicted_humidity'] = round(predicted_humidity, 1)
+        if 'humidity' in predictions:
+            response['predicted_humidity'] = round(predictions['humidity'], 1)
         
-        if 'precipitation' in predictor.models:
-            predicted_precip = predictor.predict_precipitation(features)
-            if predicted_precip is not None:
-                response['predicted_precipitation'] = round(predicted_precip, 2)
+        if 'precipitation' in predictions:
+            response['predicted_precipitation'] = round(predictions['precipitation'], 2)
         
         return jsonify(response), 200
         
@@ -379,63 +520,142 @@ def predict_temperature():
         print(f"Prediction error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/model-performance/', methods=['GET'])
-def model_performance():
+def parse_batch_payload(data):
+    """
+    Nhận batch dạng mảng JSON các object, {'rows': [...]} hoặc dạng cột {'columns': {name: [...]}}
+    Trả về dict cột -> mảng float; trường thiếu trong một dòng là NaN (transform điền mean
+    như khi dự báo một dòng thiếu trường đó). Giá trị không phải số -> ValueError.
+    """
+    if isinstance(data, dict) and 'columns' in data:
+        columns = data['columns']
+        if not isinstance(columns, dict) or not columns or not all(isinstance(v, list) for v in columns.values()):
+            raise ValueError('columns must be a non-empty object of arrays')
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError('All columns must have the same length')
+        return numeric_columns(columns)
+    
+    rows = data.get('rows') if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        raise ValueError('Expected a non-empty array of observations')
+    
+    names = set()
+    for row in rows:
+        names.update(row.keys())
+    return numeric_columns({name: [row.get(name) for row in rows] for name in names})
+
+def is_number(value):
+    # bool là int trong Python nhưng không phải giá trị đo hợp lệ
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def numeric_columns(columns):
+    """
+    Mỗi cột -> mảng float 1 chiều, null là NaN. Giá trị không phải số vô hướng
+    (chuỗi, true/false, mảng lồng, object) -> ValueError
     """
-    Trả về thông tin hiệu suất của các mô hình
+    converted = {}
+    for name, values in columns.items():
+        if not all(value is None or is_number(value) for value in values):
+            raise ValueError(f"Field '{name}' must be numeric")
+        converted[name] = np.array([np.nan if value is None else value for value in values], dtype=float)
+    return converted
+
+
+@app.route('/api/predict/batch/', methods=['POST'])
+def predict_batch():
+    """
+    Dự báo nhiệt độ, độ ẩm, lượng mưa cho nhiều quan sát trong một request
+    Có thể truyền ?lat=&lon= để dùng model của vị trí gần nhất
     """
+    predictor = model_registry.predictor.for_location(
+        request.args.get('lat', type=float),
+        request.args.get('lon', type=float),
+        LOCATION_MODEL_MAX_KM
+    )
     if not predictor.models:
         return jsonify({'error': 'Model not available'}), 503
     
-    performance = {
-        'model_version': 'v2.0-timeseries',
-        'validation_method': 'TimeSeriesSplit (5 folds)',
-        'models': {}
-    }
+    try:
+        columns = parse_batch_payload(request.get_json())
+    except (ValueError, AttributeError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Temperature model
-    if 'temperature' in predictor.models:
-        performance['models']['temperature'] = {
-            'features': predictor.feature_config.get('temperature', []),
-            'description': 'Focuses on pressure_msl, radiation, wind_y',
-            'metrics': {
-                'r2_score': 0.82,  # Cập nhật từ kết quả training thực tế
-                'mae': 1.2,
-                'rmse': 1.8
-            }
-        }
+    n_rows = len(next(iter(columns.values())))
+    if n_rows > PREDICT_BATCH_MAX_ROWS:
+        return jsonify({'error': f'Batch too large (max {PREDICT_BATCH_MAX_ROWS} rows)'}), 413
     
-    # Humidity model
-    if 'humidity' in predictor.models:
-        performance['models']['humidity'] = {
-            'features': predictor.feature_config.get('humidity', []),
-            'description': 'Focuses on radiation (negative), weather codes (positive)',
-            'metrics': {
-                'r2_score': 0.75,  # Ước tính
-                'mae': 5.0,
-                'rmse': 7.0
-            }
+    try:
+        predictions = predictor.predict_batch(columns)
+        
+        response = {
+            'count': n_rows,
+            'model_version': predictor.version,
+            'model_location': predictor.location['name'] if predictor.location else None
         }
+        if 'temperature' in predictions:
+            response['predicted_temperature'] = np.round(predictions['temperature'], 1).tolist()
+        if 'humidity' in predictions:
+            response['predicted_humidity'] = np.round(predictions['humidity'], 1).tolist()
+        if 'precipitation' in predictions:
+            response['predicted_precipitation'] = np.round(predictions['precipitation'], 2).tolist()
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        print(f"Batch prediction error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/model-performance/', methods=['GET'])
+def model_performance():
+    """
+    Trả về thông tin hiệu suất của các mô hình (metrics lúc train của model đang phục vụ).
+    Body được tính sẵn mỗi lần load / hoán đổi model; client gửi If-None-Match hoặc
+    If-Modified-Since sẽ nhận 304 nếu model chưa đổi.
+    """
+    document = model_registry.performance
+    if document is None or not model_registry.predictor.models:
+        return jsonify({'error': 'Model not available'}), 503
     
-    # Precipitation model
-    if 'precipitation' in predictor.models:
-        performance['models']['precipitation'] = {
-            'features': predictor.feature_config.get('precipitation', []),
-            'description': 'Requires weather codes w_63, w_65, w_61',
-            'metrics': {
-                'r2_score': 0.65,  # Ước tính
-                'mae': 0.5,
-                'rmse': 1.2
-            }
-        }
+    response = app.response_class(document['body'], mimetype='application/json')
+    response.set_etag(document['etag'])
+    response.last_modified = document['last_modified']
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def admin_authorized():
+    return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+@app.route('/api/admin/models/', methods=['GET'])
+def model_status():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(model_registry.status()), 200
+
+@app.route('/api/admin/models/reload/', methods=['POST'])
+def reload_models():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
     
-    performance['notes'] = [
-        'Models trained on time-series data with proper temporal validation',
-        'Features selected based on correlation analysis from research',
-        'Weather code encoding critical for humidity and precipitation'
-    ]
+    force = bool((request.get_json(silent=True) or {}).get('force', False))
+    swapped, message = model_registry.reload(force=force)
+    return jsonify({
+        'swapped': swapped,
+        'message': message,
+        'active_version': model_registry.predictor.version
+    }), 200
+
+@app.route('/api/admin/models/rollback/', methods=['POST'])
+def rollback_models():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
     
-    return jsonify(performance), 200
+    swapped, message = model_registry.rollback()
+    return jsonify({
+        'swapped': swapped,
+        'message': message,
+        'active_version': model_registry.predictor.version
+    }), 200 if swapped else 409
 
 
 @app.route('/api/chatbot/', methods=['POST'])
@@ -447,38 +667,28 @@ def chatbot():
     city = data.get('city', DEFAULT_CITY)
     
     try:
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "current": "temperature_2m,weathercode,precipitation,windspeed_10m,relative_humidity_2m",
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode",
-            "timezone": "auto",
-            "forecast_days": 3
-        }
-        
-        response = requests.get(OPEN_METEO_API, params=params, timeout=5)
-        weather_data = response.json()
+        weather_data = project_chatbot(get_location_forecast(lat, lon, timeout=5))
         
-        current_temp = weather_data['current']['temperature_2m']
-        current_weather = get_weather_status(weather_data['current']['weathercode'])
+        current_temp = weather_data['current_temp']
+        current_weather = get_weather_status(weather_data['current_code'])
         
         reply = ""
         
         if 'rain' in question or 'mưa' in question:
-            tomorrow_rain = weather_data['daily']['precipitation_sum'][1]
+            tomorrow_rain = weather_data['tomorrow_rain']
             if tomorrow_rain > 0:
                 reply = f"Yes, there's a chance of rain tomorrow in {city}. Expected rainfall: {tomorrow_rain}mm. Don't forget your umbrella! ☔"
             else:
                 reply = f"Good news! No rain expected tomorrow in {city}. It should be a dry day! ☀️"
         
         elif 'temperature' in question or 'nhiệt độ' in question or 'hot' in question or 'cold' in question:
-            tomorrow_max = weather_data['daily']['temperature_2m_max'][1]
-            tomorrow_min = weather_data['daily']['temperature_2m_min'][1]
+            tomorrow_max = weather_data['tomorrow_max']
+            tomorrow_min = weather_data['tomorrow_min']
             reply = f"Tomorrow in {city}, temperature will range from {tomorrow_min}°C to {tomorrow_max}°C. Currently it's {current_temp}°C. 🌡️"
         
         elif 'weather' in question or 'thời tiết' in question:
             reply = f"Current weather in {city}: {current_weather}, {current_temp}°C. "
-            tomorrow_code = weather_data['daily']['weathercode'][1]
+            tomorrow_code = weather_data['tomorrow_code']
             tomorrow_weather = get_weather_status(tomorrow_code)
             reply += f"Tomorrow: {tomorrow_weather}. 🌤️"
         
@@ -503,24 +713,86 @@ def chatbot():
         return jsonify({'reply': "Sorry, I'm having trouble connecting to weather services right now. Please try again later."}), 500
 
 
+def serialize_favorite(fav):
+    return {
+        'id': fav.id,
+        'city_name': fav.city_name,
+        'latitude': fav.latitude,
+        'longitude': fav.longitude,
+        'created_at': fav.created_at.isoformat()
+    }
+
+def user_favorites(user_id):
+    """
+    Document danh sách yêu thích của user (items, body JSON, etag) qua favorites cache
+    """
+    return favorites_cache.get_or_load(user_id, lambda: [
+        serialize_favorite(fav)
+        for fav in Favorite.query.filter_by(user_id=user_id).order_by(Favorite.created_at, Favorite.id).all()
+    ])
+
+def nearest_favorite(user_id, lat, lon, max_km=None):
+    """
+    Vị trí yêu thích gần (lat, lon) nhất của user trong bán kính max_km (mặc định FAVORITE_MATCH_KM).
+    Đọc thẳng database (không qua favorites cache) vì dùng để kiểm tra trùng trước khi ghi
+    """
+    favorites = [serialize_favorite(fav) for fav in Favorite.query.filter_by(user_id=user_id).all()]
+    # Mỗi user chỉ có vài chục vị trí: quét haversine (numpy) là đủ, không cần dựng chỉ mục
+    return nearest_location(favorites, lat, lon, FAVORITE_MATCH_KM if max_km is None else max_km)
+
 @app.route('/api/favorites/', methods=['GET'])
 @jwt_required()
 def get_favorites():
+    """
+    Danh sách yêu thích từ cache theo user; client gửi If-None-Match nhận 304 nếu danh sách chưa đổi
+    """
     user_id = get_jwt_identity()
-    favorites = Favorite.query.filter_by(user_id=user_id).all()
+    document = user_favorites(user_id)
+    
+    response = app.response_class(document['body'], mimetype='application/json')
+    response.set_etag(document['etag'])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Authorization')
+    return response.make_conditional(request)
+
+@app.route('/api/favorites/conditions/', methods=['GET'])
+@jwt_required()
+def get_favorites_conditions():
+    """
+    Danh sách yêu thích kèm nhiệt độ / mã thời tiết hiện tại. Mọi vị trí đi qua forecast cache
+    và một request Open-Meteo nhiều toạ độ, thay vì mỗi vị trí một request từ trình duyệt.
+    """
+    user_id = get_jwt_identity()
+    favorites = user_favorites(user_id)['items']
+    
+    conditions = get_forecasts([(fav['latitude'], fav['longitude']) for fav in favorites], CONDITIONS_PARAMS)
     
     result = []
-    for fav in favorites:
-        result.append({
-            'id': fav.id,
-            'city_name': fav.city_name,
-            'latitude': fav.latitude,
-            'longitude': fav.longitude,
-            'created_at': fav.created_at.isoformat()
-        })
+    for fav, data in zip(favorites, conditions):
+        current = (data or {}).get('current') or {}
+        item = dict(fav)
+        item['current_temp'] = current.get('temperature_2m')
+        item['weathercode'] = current.get('weathercode')
+        result.append(item)
     
     return jsonify(result), 200
 
+@app.route('/api/favorites/nearest/', methods=['GET'])
+@jwt_required()
+def get_nearest_favorite():
+    user_id = get_jwt_identity()
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius_km', type=float, default=FAVORITE_MATCH_KM)
+    if lat is None or lon is None:
+        return jsonify({'error': 'lat and lon are required'}), 400
+    
+    fav, distance = nearest_favorite(user_id, lat, lon, radius)
+    if fav is None:
+        return jsonify({'error': 'No favorite within radius'}), 404
+    return jsonify(dict(fav, distance_km=round(distance, 3))), 200
+
 @app.route('/api/favorites/', methods=['POST'])
 @jwt_required()
 def add_favorite():
@@ -533,15 +805,14 @@ def add_favorite():
     
     if not all([city_name, latitude, longitude]):
         return jsonify({'error': 'Missing required fields'}), 400
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid coordinates'}), 400
     
-    existing = Favorite.query.filter_by(
-        user_id=user_id,
-        latitude=latitude,
-        longitude=longitude
-    ).first()
-    
+    existing, _ = nearest_favorite(user_id, latitude, longitude)
     if existing:
-        return jsonify({'error': 'Location already in favorites'}), 400
+        return jsonify({'error': 'Location already in favorites', 'id': existing['id']}), 400
     
     new_fav = Favorite(
         user_id=user_id,
@@ -551,7 +822,13 @@ def add_favorite():
     )
     
     db.session.add(new_fav)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Request song song (worker khác) vừa thêm đúng toạ độ này
+        db.session.rollback()
+        return jsonify({'error': 'Location already in favorites'}), 400
+    favorites_cache.invalidate(user_id)
     
     return jsonify({'message': 'Added to favorites', 'id': new_fav.id}), 201
 
@@ -566,17 +843,20 @@ def delete_favorite(fav_id):
     
     db.session.delete(fav)
     db.session.commit()
+    favorites_cache.invalidate(user_id)
     
     return jsonify({'message': 'Deleted successfully'}), 200
 
 
 with app.app_context():
+    configure_sqlite(db.engine)
     db.create_all()
+    apply_migrations(db.engine)
     print("  Database initialized")
     print(f"  Default location: {DEFAULT_CITY}, {DEFAULT_COUNTRY}")
     print(f"  Coordinates: {DEFAULT_LAT}, {DEFAULT_LON}")
-    if predictor.models:
-        print(f"  Models loaded: {list(predictor.models.keys())}")
+    if model_registry.predictor.models:
+        print(f"  Models loaded: {list(model_registry.predictor.models.keys())}")
 
 
 if __name__ == '__main__':
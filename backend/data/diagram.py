@@ -12,6 +12,11 @@ from scipy import stats
 from statsmodels.graphics.tsaplots import plot_acf
 from mpl_toolkits.mplot3d import Axes3D
 import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weather_store import read_weather
 
 # Thiết lập cảnh báo
 warnings.filterwarnings('ignore')
@@ -59,9 +64,11 @@ def load_and_preprocess_data(filepath='weather_preprocessed.csv'):
     logger.info(f"Đang đọc dữ liệu từ {filepath}...")
     
     try:
-        df = pd.read_csv(filepath)
+        # Đọc CSV hoặc dataset Parquet phân vùng (data/preprocessed)
+        df = read_weather(filepath)
         
         # Chuyển đổi cột time sang datetime
+        df = df.rename(columns={'timestamp': 'time'})
         df['time'] = pd.to_datetime(df['time'])
         
         # Tạo các biến đặc trưng từ thời gian
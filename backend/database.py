@@ -0,0 +1,112 @@
+import os
+
+from sqlalchemy import event, exc, inspect, text
+
+
+# Migration theo phiên bản: (version, mô tả, các câu lệnh SQL chạy được trên cả SQLite và Postgres).
+# Chỉ thêm vào cuối danh sách, không sửa migration đã phát hành.
+MIGRATIONS = [
+    (1, 'favorite (user_id, created_at) index', [
+        "CREATE INDEX IF NOT EXISTS ix_favorite_user_created ON favorite (user_id, created_at)",
+    ]),
+]
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+
+
+def is_sqlite(database_uri):
+    return database_uri.startswith('sqlite')
+
+
+def resolve_database_uri(database_uri=None):
+    """
+    DATABASE_URI cho script chạy ngoài Flask: Flask-SQLAlchemy đặt file sqlite tương đối
+    trong thư mục instance/
+    """
+    database_uri = database_uri or os.getenv('DATABASE_URI', 'sqlite:///weather.db')
+    if database_uri.startswith('sqlite:///') and not database_uri.startswith('sqlite:////'):
+        path = database_uri[len('sqlite:///'):]
+        if not os.path.exists(path) and os.path.exists(os.path.join('instance', path)):
+            database_uri = f"sqlite:///{os.path.join('instance', path)}"
+    return database_uri
+
+
+def engine_options(database_uri):
+    """
+    Tham số create_engine theo loại database:
+    SQLite dùng busy timeout (chờ lock thay vì lỗi "database is locked" ngay),
+    Postgres / MySQL dùng pool có thể chỉnh qua env
+    """
+    if is_sqlite(database_uri):
+        busy_timeout_ms = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+        return {'connect_args': {'timeout': busy_timeout_ms / 1000, 'check_same_thread': False}}
+
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        # Bỏ connection đã bị server đóng (restart, idle timeout) trước khi dùng
+        'pool_pre_ping': True
+    }
+
+
+def configure_sqlite(engine):
+    """
+    PRAGMA cho mỗi connection SQLite: WAL để request đọc không bị chặn bởi request ghi,
+    busy_timeout, synchronous=NORMAL (an toàn với WAL) và bật foreign key
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    wal = os.getenv('SQLITE_WAL', 'True').lower() == 'true'
+    busy_timeout_ms = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def schema_version(engine):
+    if not inspect(engine).has_table(SCHEMA_VERSION_TABLE):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")).scalar() or 0
+
+
+def apply_migrations(engine):
+    """
+    Chạy các migration chưa áp dụng (ghi lại trong bảng schema_version). Gọi sau db.create_all():
+    create_all chỉ tạo bảng mới, không thêm index cho bảng đã có từ trước.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} "
+            "(version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL)"
+        ))
+
+    current = schema_version(engine)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            with engine.begin() as conn:
+                for statement in statements:
+                    conn.execute(text(statement))
+                conn.execute(
+                    text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (:version, :description)"),
+                    {'version': version, 'description': description}
+                )
+        except exc.IntegrityError:
+            # Worker khác vừa áp dụng cùng migration
+            continue
+        applied.append(version)
+        print(f"  Migration {version} applied: {description}")
+    return applied
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # redis là tuỳ chọn, không có thì chỉ dùng LRU trong process
+    redis = None
+
+
+def favorites_document(items):
+    """
+    Danh sách yêu thích đã serialize sẵn một lần kèm ETag (hash nội dung)
+    """
+    body = json.dumps(items, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return {
+        'items': items,
+        'body': body,
+        'etag': hashlib.sha256(body).hexdigest()[:32]
+    }
+
+
+class FavoritesCache:
+    """
+    Cache danh sách yêu thích theo user. Mặc định là LRU trong process: invalidation chỉ có hiệu lực
+    trong process đó, nên khi chạy nhiều worker (gunicorn) không có Redis, worker khác có thể trả
+    danh sách cũ tối đa ttl giây. Với redis_url thì dùng Redis (hoặc server tương thích) để các worker
+    dùng chung và cùng thấy invalidation. Cả hai backend đều hết hạn entry sau ttl giây.
+    Mỗi lần ghi (thêm / xoá) tăng generation của user, document được lưu theo generation
+    lúc bắt đầu đọc database, nên một lần đọc chạy song song với lần ghi không để lại bản cũ.
+    Trong process, generation lấy từ một bộ đếm chung (không lặp lại) và chỉ giữ cho max_size user
+    ghi gần nhất; user bị đẩy ra dùng generation sàn (lớn nhất đã đẩy ra), nên bộ nhớ có giới hạn
+    mà lần đọc xen với lần ghi vẫn không được lưu.
+    """
+    def __init__(self, max_size=1024, redis_url=None, ttl=3600, prefix='favorites'):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+        self.redis = None
+        if redis_url:
+            if redis is None:
+                print("⚠ REDIS_URL is set but redis is not installed, using in-process favorites cache")
+            else:
+                self.redis = redis.Redis.from_url(redis_url)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.backend_errors = 0
+
+    def _key(self, user_id, generation):
+        return f"{self.prefix}:{user_id}:{generation}"
+
+    def _generation_key(self, user_id):
+        return f"{self.prefix}:gen:{user_id}"
+
+    def _generation(self, user_id):
+        if self.redis is not None:
+            return int(self.redis.get(self._generation_key(user_id)) or 0)
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def _get(self, user_id, generation):
+        if self.redis is not None:
+            cached = self.redis.hmget(self._key(user_id, generation), 'body', 'etag')
+            if cached[0] is None:
+                return None
+            return {'items': json.loads(cached[0]), 'body': cached[0], 'etag': cached[1].decode()}
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != generation:
+                return None
+            if time.monotonic() >= entry[2]:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def _set(self, user_id, generation, document):
+        if self.redis is not None:
+            key = self._key(user_id, generation)
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping={'body': document['body'], 'etag': document['etag']})
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+            return
+
+        with self._lock:
+            # Có lần ghi xen vào trong lúc đọc database: bỏ kết quả cũ này
+            if self._generations.get(user_id, self._floor) != generation:
+                return
+            self._entries[user_id] = (generation, document, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, user_id, load):
+        """
+        Document của user từ cache, nếu chưa có thì load() -> list item đã serialize.
+        Backend Redis lỗi thì đọc thẳng database.
+        """
+        user_id = str(user_id)
+        try:
+            generation = self._generation(user_id)
+            document = self._get(user_id, generation)
+        except Exception as e:
+            self._count('backend_errors')
+            print(f"Favorites cache unavailable: {e}")
+            return favorites_document(load())
+
+        if document is not None:
+            self._count('hits')
+            return document
+
+        self._count('misses')
+        document = favorites_document(load())
+        try:
+            self._set(user_id, generation, document)
+        except Exception as e:
+            self._count('backend_errors')
+            print(f"Favorites cache write failed: {e}")
+        return document
+
+    def invalidate(self, user_id):
+        """
+        Gọi sau khi commit thay đổi yêu thích của user
+        """
+        user_id = str(user_id)
+        self._count('invalidations')
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.incr(self._generation_key(user_id))
+                pipe.expire(self._generation_key(user_id), self.ttl * 2)
+                pipe.execute()
+            except Exception as e:
+                self._count('backend_errors')
+                print(f"Favorites cache invalidation failed: {e}")
+            return
+
+        with self._lock:
+            self._counter += 1
+            self._generations[user_id] = self._counter
+            self._generations.move_to_end(user_id)
+            self._entries.pop(user_id, None)
+            while len(self._generations) > self.max_size:
+                _, generation = self._generations.popitem(last=False)
+                self._floor = max(self._floor, generation)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'redis' if self.redis is not None else 'memory',
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'generations': len(self._generations),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'backend_errors': self.backend_errors
+            }
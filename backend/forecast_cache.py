@@ -0,0 +1,301 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import SingleFlight
+from spatial_index import SpatialIndex
+
+
+# TTL mặc định (giây) theo chu kỳ cập nhật của Open-Meteo:
+# current cập nhật mỗi 15 phút, model hourly/daily chạy lại khoảng mỗi giờ
+DEFAULT_FIELD_TTL = {
+    'current': 15 * 60,
+    'hourly': 60 * 60,
+    'daily': 3 * 60 * 60,
+}
+
+
+def snap_to_grid(lat, lon, grid=0.01):
+    """
+    Làm tròn toạ độ về ô lưới gần nhất để các request gần nhau dùng chung cache
+    """
+    lat = round(round(float(lat) / grid) * grid, 6)
+    lon = round(round(float(lon) / grid) * grid, 6)
+    return lat, lon
+
+
+class ForecastCache:
+    """
+    LRU cache có TTL cho dữ liệu dự báo, key theo toạ độ đã snap vào lưới.
+    Khi entry hết hạn nhưng vẫn trong cửa sổ stale, trả dữ liệu cũ ngay
+    và làm mới ở background (stale-while-revalidate).
+    Các lần miss/refresh đồng thời cho cùng key được gộp qua SingleFlight.
+    Với snap_km > 0 (tuỳ chọn, mặc định tắt), toạ độ còn được snap về điểm lưới đã có trong cache
+    gần nhất trong bán kính snap_km (dữ liệu model của Open-Meteo thô hơn lưới cache). Khi đó key
+    phụ thuộc các điểm đang có trong cache (và thứ tự LRU đẩy ra) nên không còn tất định.
+    """
+    def __init__(self, max_size=512, grid=0.01, field_ttl=None, stale_ttl=600, refresh_workers=2, snap_km=0):
+        self.max_size = max_size
+        self.grid = grid
+        self.snap_km = snap_km
+        # Điểm lưới đang có entry trong cache: (lat, lon) -> số entry
+        self.points = SpatialIndex(cell_km=max(snap_km, 1))
+        self._point_refs = {}
+        self.field_ttl = dict(DEFAULT_FIELD_TTL)
+        if field_ttl:
+            self.field_ttl.update(field_ttl)
+        self.stale_ttl = stale_ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        # Kết quả tính từ entry (vd. model forecast): (id(value), name) -> (value, result)
+        self._derived = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='forecast-refresh')
+        self.flight = SingleFlight()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.served_on_error = 0
+        self.derived_hits = 0
+        self.derived_misses = 0
+        self.snapped = 0
+
+    def make_key(self, lat, lon, *extra):
+        lat, lon = snap_to_grid(lat, lon, self.grid)
+        if self.snap_km > 0:
+            point, _ = self.points.nearest(lat, lon, self.snap_km)
+            if point is not None and point != (lat, lon):
+                self._count('snapped')
+                lat, lon = point
+        return (lat, lon) + tuple(extra)
+
+    def ttl_for(self, fields):
+        """
+        TTL của một entry là TTL nhỏ nhất trong các trường (current/hourly/daily) được yêu cầu
+        """
+        ttls = [self.field_ttl[f] for f in fields if f in self.field_ttl]
+        return min(ttls) if ttls else min(self.field_ttl.values())
+
+    def get(self, key):
+        """
+        Trả về (value, state) với state là 'fresh', 'stale', 'expired' hoặc None nếu không có.
+        Entry 'expired' vẫn được giữ lại (tới khi bị LRU đẩy ra) để dùng khi upstream lỗi.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            value, expires_at = entry
+            self._entries.move_to_end(key)
+            if now < expires_at:
+                return value, 'fresh'
+            if now < expires_at + self.stale_ttl:
+                return value, 'stale'
+            return value, 'expired'
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if key not in self._entries:
+                self._add_point(key[:2])
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._release_point(evicted[:2])
+                self.evictions += 1
+
+    def _add_point(self, point):
+        refs = self._point_refs.get(point, 0)
+        if refs == 0:
+            self.points.insert(point, *point)
+        self._point_refs[point] = refs + 1
+
+    def _release_point(self, point):
+        refs = self._point_refs.pop(point, 1) - 1
+        if refs > 0:
+            self._point_refs[point] = refs
+        else:
+            self.points.remove(point)
+
+    def get_or_fetch(self, key, fetch, fields=()):
+        """
+        Lấy từ cache, nếu miss thì gọi fetch() đồng bộ.
+        Entry stale được trả về ngay và chỉ một refresh chạy nền cho mỗi key.
+        Nếu fetch lỗi (upstream chậm, circuit mở) thì trả entry đã hết hạn nếu còn.
+        """
+        value, state = self.get(key)
+        if state == 'fresh':
+            self._count('hits')
+            return value
+        if state == 'stale':
+            self._count('stale_hits')
+            self._schedule_refresh(key, fetch, fields)
+            return value
+
+        self._count('misses')
+        try:
+            return self.flight.do(key, lambda: self._load(key, fetch, fields))
+        except Exception:
+            if state == 'expired':
+                self._count('served_on_error')
+                return value
+            raise
+
+    def get_many_or_fetch(self, keys, fetch_many, fields=()):
+        """
+        get_or_fetch cho nhiều key: mọi key miss / hết hạn được lấy trong một lần
+        fetch_many(missing_keys) -> list giá trị cùng thứ tự (vd. một request nhiều toạ độ).
+        Key stale được trả ngay và làm mới cùng lô đó; nếu không có miss thì một lô làm mới chạy nền.
+        Trả về dict key -> value; key không lấy được (upstream lỗi, không có bản cũ) thì vắng mặt.
+        """
+        results = {}
+        missing = []
+        expired = {}
+        stale = []
+        for key in dict.fromkeys(keys):
+            value, state = self.get(key)
+            if state == 'fresh':
+                self._count('hits')
+                results[key] = value
+            elif state == 'stale':
+                self._count('stale_hits')
+                results[key] = value
+                stale.append(key)
+            else:
+                self._count('misses')
+                missing.append(key)
+                if state == 'expired':
+                    expired[key] = value
+
+        if not missing:
+            if stale:
+                self._schedule_refresh_many(stale, fetch_many, fields)
+            return results
+
+        batch = missing + stale
+        try:
+            values = self.flight.do(('batch',) + tuple(batch), lambda: self._load_many(batch, fetch_many, fields))
+            results.update(zip(batch, values))
+        except Exception as e:
+            print(f"Batch fetch failed for {len(batch)} keys: {e}")
+            for key, value in expired.items():
+                self._count('served_on_error')
+                results[key] = value
+        return results
+
+    def _load_many(self, keys, fetch_many, fields):
+        values = fetch_many(keys)
+        if len(values) != len(keys):
+            raise ValueError(f"Expected {len(keys)} values, got {len(values)}")
+        ttl = self.ttl_for(fields)
+        for key, value in zip(keys, values):
+            self.set(key, value, ttl)
+        return values
+
+    def _schedule_refresh_many(self, keys, fetch_many, fields):
+        with self._lock:
+            keys = [key for key in keys if key not in self._refreshing]
+            if not keys:
+                return
+            self._refreshing.update(keys)
+        self._executor.submit(self._refresh_many, keys, fetch_many, fields)
+
+    def _refresh_many(self, keys, fetch_many, fields):
+        try:
+            self._load_many(keys, fetch_many, fields)
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            print(f"Background refresh failed for {len(keys)} keys: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keys)
+
+    def _load(self, key, fetch, fields):
+        value = fetch()
+        self.set(key, value, self.ttl_for(fields))
+        return value
+
+    def _schedule_refresh(self, key, fetch, fields):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._executor.submit(self._refresh, key, fetch, fields)
+
+    def _refresh(self, key, fetch, fields):
+        try:
+            self.flight.do(key, lambda: self._load(key, fetch, fields))
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            print(f"Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def derive(self, value, name, compute):
+        """
+        Kết quả compute() tính từ một giá trị đã cache, lưu kèm theo giá trị đó:
+        khi entry được làm mới (object mới) thì lần gọi sau tính lại.
+        name phân biệt các phép tính trên cùng entry (nên gồm cả phiên bản model).
+        """
+        key = (id(value), name)
+        with self._lock:
+            cached = self._derived.get(key)
+            if cached is not None and cached[0] is value:
+                self._derived.move_to_end(key)
+                self.derived_hits += 1
+                return cached[1]
+            self.derived_misses += 1
+
+        result = compute()
+        with self._lock:
+            self._derived[key] = (value, result)
+            self._derived.move_to_end(key)
+            while len(self._derived) > self.max_size:
+                self._derived.popitem(last=False)
+        return result
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._derived.clear()
+            self._point_refs.clear()
+            self.points.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'grid': self.grid,
+                'snap_km': self.snap_km,
+                'points': len(self.points),
+                'snapped': self.snapped,
+                'field_ttl': dict(self.field_ttl),
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'served_on_error': self.served_on_error,
+                'refreshing': len(self._refreshing),
+                'single_flight': self.flight.stats(),
+                'derived': {'size': len(self._derived), 'hits': self.derived_hits, 'misses': self.derived_misses},
+                'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,179 @@
+import csv
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+
+
+DEFAULT_GAZETTEER_FILE = 'data/gazetteer.csv'
+
+# Prefix khớp nhiều hơn HEAVY_RANGE key thì tính sẵn top PRECOMPUTED_TOP kết quả,
+# nên mỗi lần tìm hoặc tra bảng hoặc chỉ duyệt tối đa HEAVY_RANGE key
+HEAVY_RANGE = 256
+PRECOMPUTED_TOP = 50
+
+# Mức khớp: đầu tên chính, đầu tên khác, đầu một từ bên trong tên
+TIER_NAME, TIER_ALTERNATE, TIER_WORD = 0, 1, 2
+
+# Alternate names trong file CSV phân tách bởi dấu |
+ALTERNATE_SEPARATOR = '|'
+
+# Cột của file GeoNames cities*.txt (phân tách bằng tab, không có header)
+GEONAMES_COLUMNS = [
+    'geonameid', 'name', 'asciiname', 'alternatenames', 'latitude', 'longitude',
+    'feature_class', 'feature_code', 'country_code', 'cc2', 'admin1_code', 'admin2_code',
+    'admin3_code', 'admin4_code', 'population', 'elevation', 'dem', 'timezone', 'modification_date'
+]
+
+
+def normalize_name(text):
+    """
+    Chuẩn hoá để so khớp không dấu: bỏ dấu (NFD), đ -> d, chữ thường,
+    ký tự không phải chữ / số thành một khoảng trắng ("Thành phố Hồ Chí Minh" -> "thanh pho ho chi minh")
+    """
+    text = unicodedata.normalize('NFD', str(text))
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    text = text.replace('đ', 'd').replace('Đ', 'D').lower()
+    return ' '.join(re.sub(r'[\W_]+', ' ', text).split())
+
+
+def index_keys(name):
+    """
+    Các key của một tên: tên đã chuẩn hoá và phần đuôi bắt đầu từ mỗi từ,
+    để "minh" hay "chi minh" cũng tìm thấy "Hồ Chí Minh". Phần tử đầu là cả tên.
+    """
+    words = normalize_name(name).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class Gazetteer:
+    """
+    Chỉ mục tìm thành phố trong bộ nhớ: mảng key (tên không dấu) đã sắp xếp, tìm prefix
+    bằng binary search rồi xếp theo mức khớp (đầu tên chính > đầu tên khác > từ bên trong)
+    và dân số. Không gọi geocoder bên ngoài.
+    """
+
+    def __init__(self, entries):
+        self.entries = [dict(entry) for entry in entries]
+        self.population = [int(entry.get('population') or 0) for entry in self.entries]
+
+        pairs = set()
+        for i, entry in enumerate(self.entries):
+            names = [(entry['name'], TIER_NAME)] + [(name, TIER_ALTERNATE) for name in entry.get('alternate_names', [])]
+            for name, tier in names:
+                for k, key in enumerate(index_keys(name)):
+                    pairs.add((key, tier if k == 0 else TIER_WORD, i))
+        pairs = sorted(pairs)
+        self.keys = [key for key, _, _ in pairs]
+        self.tiers = [tier for _, tier, _ in pairs]
+        self.ids = [i for _, _, i in pairs]
+
+        # Response của mỗi entry được dựng sẵn một lần
+        self.results = [{
+            'name': entry['name'],
+            'admin1': entry.get('admin1') or None,
+            'country': entry.get('country') or None,
+            'country_code': entry.get('country_code') or None,
+            'latitude': float(entry['latitude']),
+            'longitude': float(entry['longitude']),
+            'population': self.population[i]
+        } for i, entry in enumerate(self.entries)]
+
+        self.top_prefixes = self._precompute_heavy_prefixes()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _range(self, prefix, lo=0, hi=None):
+        hi = len(self.keys) if hi is None else hi
+        lo = bisect_left(self.keys, prefix, lo, hi)
+        return lo, bisect_left(self.keys, prefix + '\uffff', lo, hi)
+
+    def _top_range(self, lo, hi, limit):
+        best = {}
+        for pos in range(lo, hi):
+            i = self.ids[pos]
+            best[i] = min(best.get(i, TIER_WORD), self.tiers[pos])
+        return heapq.nlargest(limit, best, key=lambda i: (-best[i], self.population[i], -i))
+
+    def _precompute_heavy_prefixes(self):
+        """
+        Duyệt các prefix theo độ dài tăng dần, chỉ đi sâu vào prefix khớp hơn HEAVY_RANGE key
+        """
+        top = {}
+        stack = [(0, len(self.keys), 0)]
+        while stack:
+            lo, hi, n = stack.pop()
+            pos = lo
+            while pos < hi:
+                if len(self.keys[pos]) <= n:
+                    pos += 1
+                    continue
+                prefix = self.keys[pos][:n + 1]
+                start, end = self._range(prefix, pos, hi)
+                if end - start > HEAVY_RANGE:
+                    top[prefix] = self._top_range(start, end, PRECOMPUTED_TOP)
+                    stack.append((start, end, n + 1))
+                pos = end
+        return top
+
+    def search(self, query, limit=10):
+        """
+        Top `limit` thành phố có tên / tên khác khớp prefix với query, không phân biệt dấu
+        """
+        prefix = normalize_name(query)
+        if not prefix or limit <= 0:
+            return []
+
+        if prefix in self.top_prefixes and limit <= PRECOMPUTED_TOP:
+            ids = self.top_prefixes[prefix][:limit]
+        else:
+            ids = self._top_range(*self._range(prefix), limit)
+        return [self.results[i] for i in ids]
+
+    @classmethod
+    def load(cls, path=DEFAULT_GAZETTEER_FILE):
+        """
+        Đọc file CSV có header: name, admin1, country, country_code, latitude, longitude, population,
+        alternate_names; hoặc file .txt của GeoNames (cities15000.txt, ...) qua read_geonames.
+        Trả về chỉ mục rỗng nếu không có file.
+        """
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                if path.endswith('.txt'):
+                    return cls(read_geonames(f))
+                rows = list(csv.DictReader(f))
+        except FileNotFoundError:
+            print(f"⚠ Gazetteer file not found: {path}")
+            return cls([])
+
+        for row in rows:
+            alternates = row.get('alternate_names') or ''
+            row['alternate_names'] = [name for name in alternates.split(ALTERNATE_SEPARATOR) if name]
+        return cls(rows)
+
+
+def read_geonames(lines):
+    """
+    Entry từ dump GeoNames (tab, không header, cột theo GEONAMES_COLUMNS). File không có tên tỉnh / nước,
+    nên admin1 và country là mã (admin1 code, ISO country code); alternate names phân tách bởi dấu phẩy.
+    """
+    entries = []
+    for values in csv.reader(lines, delimiter='\t', quoting=csv.QUOTE_NONE):
+        if len(values) < len(GEONAMES_COLUMNS):
+            continue
+        row = dict(zip(GEONAMES_COLUMNS, values))
+        alternates = [name for name in row['alternatenames'].split(',') if name and name != row['name']]
+        if row['asciiname'] and row['asciiname'] != row['name']:
+            alternates.insert(0, row['asciiname'])
+        entries.append({
+            'name': row['name'],
+            'admin1': row['admin1_code'],
+            'country': row['country_code'],
+            'country_code': row['country_code'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            'population': row['population'],
+            'alternate_names': alternates
+        })
+    return entries
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+
+DEFAULT_LOCATIONS_FILE = 'data/locations.json'
+LOCATION_INDEX_FILE = 'locations.json'
+
+
+def location_id(latitude, longitude):
+    """
+    Id ổn định cho một vị trí (dùng làm tên thư mục dữ liệu / model)
+    """
+    return f"{float(latitude):.2f}_{float(longitude):.2f}"
+
+
+def load_locations(path=DEFAULT_LOCATIONS_FILE):
+    """
+    Đọc danh sách vị trí từ file JSON: [{"name": ..., "latitude": ..., "longitude": ...}, ...]
+    """
+    with open(path, encoding='utf-8') as f:
+        locations = json.load(f)
+    return [normalize_location(loc) for loc in locations]
+
+
+def favorite_locations(database_uri=None):
+    """
+    Các toạ độ (không trùng lặp) trong bảng Favorite
+    """
+    from sqlalchemy import create_engine, text
+    from database import resolve_database_uri
+
+    engine = create_engine(resolve_database_uri(database_uri))
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT MIN(city_name), latitude, longitude FROM favorite GROUP BY latitude, longitude"
+        )).fetchall()
+    engine.dispose()
+
+    locations = {}
+    for name, latitude, longitude in rows:
+        loc = normalize_location({'name': name, 'latitude': latitude, 'longitude': longitude})
+        locations.setdefault(loc['id'], loc)
+    return list(locations.values())
+
+
+def normalize_location(loc):
+    latitude = float(loc['latitude'])
+    longitude = float(loc['longitude'])
+    return {
+        'id': loc.get('id') or location_id(latitude, longitude),
+        'name': loc.get('name') or location_id(latitude, longitude),
+        'latitude': latitude,
+        'longitude': longitude
+    }
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Khoảng cách đường tròn lớn (km), hỗ trợ numpy array
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def nearest_location(locations, latitude, longitude, max_km=None):
+    """
+    Vị trí gần nhất trong danh sách (và khoảng cách km), hoặc (None, None) nếu vượt quá max_km
+    """
+    if not locations:
+        return None, None
+    lats = np.array([loc['latitude'] for loc in locations])
+    lons = np.array([loc['longitude'] for loc in locations])
+    distances = haversine_km(float(latitude), float(longitude), lats, lons)
+    i = int(np.argmin(distances))
+    if max_km is not None and distances[i] > max_km:
+        return None, None
+    return locations[i], float(distances[i])
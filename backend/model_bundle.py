@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import pickle
+from datetime import datetime
+
+import numpy as np
+
+
+BUNDLE_FORMAT = 'weather-model-bundle'
+BUNDLE_FORMAT_VERSION = 2
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+BUNDLE_DATA_FILE = 'weather_bundle.bin'
+BUNDLE_MANIFEST_FILE = 'weather_bundle.json'
+# Model không tuyến tính (cây, boosting...) không biểu diễn được bằng mảng phẳng: pickle riêng
+BUNDLE_ESTIMATORS_FILE = 'weather_bundle_models.pkl'
+BUNDLE_DTYPE = '<f8'
+
+
+def is_linear(model, scaler):
+    return hasattr(model, 'coef_') and np.ndim(model.coef_) == 1 and hasattr(scaler, 'scale_')
+
+
+def fuse_linear_models(models, scalers, feature_config):
+    """
+    Gộp StandardScaler vào hệ số LinearRegression của từng target thành một ma trận W
+    (n_features x n_targets) trên hợp các features:
+        predict = ((x - mean) / scale) @ coef + intercept = x @ W + b
+    Trả về (targets, features, W, b); raise ValueError nếu có model không tuyến tính.
+    """
+    targets = list(models.keys())
+    features = []
+    for target in targets:
+        if not is_linear(models[target], scalers.get(target)):
+            raise ValueError(f"{target} model is not scaler + linear")
+        for col in feature_config[target]:
+            if col not in features:
+                features.append(col)
+
+    index = {col: i for i, col in enumerate(features)}
+    W = np.zeros((len(features), len(targets)))
+    b = np.zeros(len(targets))
+
+    for j, target in enumerate(targets):
+        cols = feature_config[target]
+        scaler = scalers[target]
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(len(cols))
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(len(cols))
+
+        coef = np.asarray(models[target].coef_, dtype=float) / scale
+        for col, c in zip(cols, coef):
+            W[index[col], j] += c
+        b[j] = float(models[target].intercept_) - float(np.dot(coef, mean))
+
+    return targets, features, W, b
+
+
+def save_bundle(model_dir, models, scalers, feature_config, model_version='unknown', metrics=None):
+    """
+    Ghi model thành một bundle gồm file nhị phân phẳng (float64, little-endian) chứa hệ số,
+    tham số scaler và kernel gộp, kèm manifest JSON (offset/shape từng mảng + sha256).
+    Target có model không tuyến tính được pickle vào weather_bundle_models.pkl và khi đó
+    không có kernel gộp (fused_features = null).
+    Manifest được ghi sau cùng nên chỉ xuất hiện khi file dữ liệu đã hoàn chỉnh.
+    metrics (kết quả đánh giá lúc train) được lưu nguyên vào manifest để serving đọc cùng model.
+    """
+    targets = list(models.keys())
+    kinds = {target: 'linear' if is_linear(models[target], scalers[target]) else 'pickle' for target in targets}
+
+    arrays = {}
+    estimators = {}
+    for target in targets:
+        scaler = scalers[target]
+        n_features = len(feature_config[target])
+        if kinds[target] == 'linear':
+            arrays[f'{target}/coef'] = np.asarray(models[target].coef_, dtype=float)
+            arrays[f'{target}/intercept'] = np.array([float(models[target].intercept_)])
+        else:
+            estimators[target] = models[target]
+        arrays[f'{target}/mean'] = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+        arrays[f'{target}/scale'] = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+
+    features = None
+    if not estimators:
+        _, features, W, b = fuse_linear_models(models, scalers, feature_config)
+        arrays['fused/W'] = W
+        arrays['fused/b'] = b
+
+    layout = {}
+    chunks = []
+    offset = 0
+    for name, array in arrays.items():
+        data = np.ascontiguousarray(array, dtype=BUNDLE_DTYPE)
+        layout[name] = {'offset': offset, 'shape': list(data.shape)}
+        chunks.append(data.tobytes())
+        offset += data.nbytes
+    payload = b''.join(chunks)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': model_version,
+        'created_at': datetime.now().isoformat(),
+        'dtype': BUNDLE_DTYPE,
+        'data_file': BUNDLE_DATA_FILE,
+        'size': len(payload),
+        'content_hash': hashlib.sha256(payload).hexdigest(),
+        'targets': targets,
+        'kinds': kinds,
+        'features': {target: list(feature_config[target]) for target in targets},
+        'fused_features': features,
+        'metrics': metrics,
+        'arrays': layout
+    }
+
+    os.makedirs(model_dir, exist_ok=True)
+    data_path = os.path.join(model_dir, BUNDLE_DATA_FILE)
+    manifest_path = os.path.join(model_dir, BUNDLE_MANIFEST_FILE)
+    estimators_path = os.path.join(model_dir, BUNDLE_ESTIMATORS_FILE)
+    with open(data_path + '.tmp', 'wb') as f:
+        f.write(payload)
+    os.replace(data_path + '.tmp', data_path)
+    if estimators:
+        estimators_payload = pickle.dumps(estimators)
+        with open(estimators_path + '.tmp', 'wb') as f:
+            f.write(estimators_payload)
+        os.replace(estimators_path + '.tmp', estimators_path)
+        manifest['estimators_file'] = BUNDLE_ESTIMATORS_FILE
+        manifest['estimators_hash'] = hashlib.sha256(estimators_payload).hexdigest()
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    if not estimators and os.path.exists(estimators_path):
+        os.remove(estimators_path)
+
+    return manifest
+
+
+def load_bundle(model_dir, verify=False):
+    """
+    Đọc manifest và memory-map file dữ liệu (read-only, dùng chung page cache giữa các worker).
+    Trả về (manifest, arrays) với arrays là các view trên memmap.
+    Raise FileNotFoundError nếu không có bundle, ValueError nếu bundle không hợp lệ.
+    """
+    with open(os.path.join(model_dir, BUNDLE_MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != BUNDLE_FORMAT or manifest.get('format_version') not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(f"Unsupported bundle format: {manifest.get('format')} v{manifest.get('format_version')}")
+
+    data_path = os.path.join(model_dir, manifest['data_file'])
+    if os.path.getsize(data_path) != manifest['size']:
+        raise ValueError('Bundle data size does not match manifest')
+
+    if verify:
+        with open(data_path, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != manifest['content_hash']:
+                raise ValueError('Bundle content hash mismatch')
+        if manifest.get('estimators_file'):
+            with open(os.path.join(model_dir, manifest['estimators_file']), 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() != manifest['estimators_hash']:
+                    raise ValueError('Bundle estimators hash mismatch')
+
+    dtype = np.dtype(manifest['dtype'])
+    data = np.memmap(data_path, dtype=dtype, mode='r')
+
+    arrays = {}
+    for name, spec in manifest['arrays'].items():
+        start = spec['offset'] // dtype.itemsize
+        count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+        arrays[name] = data[start:start + count].reshape(spec['shape'])
+
+    return manifest, arrays
+
+
+def bundle_to_estimators(manifest, arrays, model_dir='.'):
+    """
+    Dựng lại LinearRegression + StandardScaler (đã fit) từ tham số trong bundle
+    để đường sklearn vẫn dùng được như khi load từ pickle; model không tuyến tính đọc từ pickle đi kèm
+    """
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import StandardScaler
+
+    estimators = {}
+    if manifest.get('estimators_file'):
+        with open(os.path.join(model_dir, manifest['estimators_file']), 'rb') as f:
+            estimators = pickle.load(f)
+
+    models = {}
+    scalers = {}
+    for target in manifest['targets']:
+        n_features = len(manifest['features'][target])
+
+        if manifest.get('kinds', {}).get(target, 'linear') == 'linear':
+            model = LinearRegression()
+            model.coef_ = np.asarray(arrays[f'{target}/coef'])
+            model.intercept_ = float(arrays[f'{target}/intercept'][0])
+            model.n_features_in_ = n_features
+        else:
+            model = estimators[target]
+
+        scaler = StandardScaler()
+        scaler.mean_ = np.asarray(arrays[f'{target}/mean'])
+        scaler.scale_ = np.asarray(arrays[f'{target}/scale'])
+        scaler.var_ = scaler.scale_ ** 2
+        scaler.n_features_in_ = n_features
+        scaler.n_samples_seen_ = 0
+
+        models[target] = model
+        scalers[target] = scaler
+
+    return models, scalers, dict(manifest['features'])
+
+
+if __name__ == "__main__":
+    # Chuyển các pickle hiện có trong model/ sang bundle
+    import pickle
+    import sys
+
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else 'model'
+    with open(os.path.join(model_dir, 'all_models.pkl'), 'rb') as f:
+        models = pickle.load(f)
+    with open(os.path.join(model_dir, 'all_scalers.pkl'), 'rb') as f:
+        scalers = pickle.load(f)
+    with open(os.path.join(model_dir, 'feature_config.pkl'), 'rb') as f:
+        feature_config = pickle.load(f)
+
+    model_version = 'unknown'
+    results_file = os.path.join(model_dir, 'training_results.json')
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            model_version = json.load(f).get('model_version', 'unknown')
+
+    manifest = save_bundle(model_dir, models, scalers, feature_config, model_version)
+    print(f"Bundle written: {manifest['size']} bytes, sha256 {manifest['content_hash'][:12]}")
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from predictor import WeatherPredictor
+
+
+# Các file artifact tạo nên một phiên bản model
+ARTIFACT_FILES = [
+    'weather_model.pkl',
+    'scaler.pkl',
+    'all_models.pkl',
+    'all_scalers.pkl',
+    'feature_config.pkl',
+    'preprocessing.json',
+    'preprocessing_scaler.pkl',
+    'training_results.json',
+    'weather_bundle.bin',
+    'weather_bundle.json',
+    'weather_bundle_models.pkl',
+    'locations.json'
+]
+
+# Quan sát mẫu dùng để kiểm tra model mới trước khi đưa vào phục vụ
+VALIDATION_SAMPLE = {
+    'pressure_msl': 1012.0,
+    'radiation': 350.0,
+    'wind_x': 0.5,
+    'wind_y': 0.5,
+    'weathercode': 61
+}
+
+
+def artifact_signature(model_dir):
+    """
+    (mtime, size) của các artifact, dùng để phát hiện thay đổi mà không cần đọc nội dung
+    """
+    signature = []
+    for name in ARTIFACT_FILES:
+        path = os.path.join(model_dir, name)
+        try:
+            stat = os.stat(path)
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((name, None, None))
+    return tuple(signature)
+
+
+def artifact_hash(model_dir):
+    digest = hashlib.sha256()
+    for name in ARTIFACT_FILES:
+        path = os.path.join(model_dir, name)
+        if not os.path.exists(path):
+            continue
+        digest.update(name.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_model_version(model_dir):
+    try:
+        with open(os.path.join(model_dir, 'training_results.json')) as f:
+            return json.load(f).get('model_version', 'unknown')
+    except (FileNotFoundError, ValueError):
+        return 'unknown'
+
+
+def performance_document(predictor):
+    """
+    Body JSON của /api/model-performance/ cho một predictor, serialize sẵn một lần
+    kèm ETag (hash nội dung) và Last-Modified (thời điểm đưa vào phục vụ)
+    """
+    body = json.dumps(predictor.performance_report(), ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return {
+        'body': body,
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+        'last_modified': datetime.utcnow().replace(microsecond=0)
+    }
+
+
+class ModelRegistry:
+    """
+    Giữ predictor đang phục vụ và hoán đổi nó khi artifact trong model_dir thay đổi.
+    Model mới được load và kiểm tra trong background, sau đó thay tham chiếu một cách nguyên tử;
+    request đang chạy vẫn dùng predictor cũ cho tới khi xong.
+    """
+    def __init__(self, model_dir='model', watch_interval=30, history_size=20):
+        self.model_dir = model_dir
+        self.watch_interval = watch_interval
+        self.history_size = history_size
+
+        self._reload_lock = threading.Lock()
+        self._predictor = None
+        self._previous = None
+        self._signature = None
+        self._pending_signature = None
+        self.loaded_at = None
+        self.performance = None
+        self.history = []
+
+        self.reload(force=True)
+
+        if watch_interval > 0:
+            thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            thread.start()
+
+    @property
+    def predictor(self):
+        return self._predictor
+
+    def reload(self, force=False):
+        """
+        Load lại artifact nếu nội dung đã đổi (hoặc force). Trả về (swapped, message).
+        """
+        with self._reload_lock:
+            signature = artifact_signature(self.model_dir)
+            content_hash = artifact_hash(self.model_dir)
+            current = self._predictor
+            if not force and current is not None and current.content_hash == content_hash:
+                self._signature = signature
+                return False, 'Artifacts unchanged'
+
+            candidate = WeatherPredictor(self.model_dir)
+            candidate.content_hash = content_hash
+            candidate.version = f"{read_model_version(self.model_dir)}+{content_hash[:8]}"
+            for location_id, child in candidate.location_predictors.items():
+                child.version = f"{candidate.version}@{location_id}"
+
+            error = self.validate(candidate)
+            if error and current is not None:
+                # Ghi nhận signature để watcher không thử lại cùng artifact lỗi
+                self._signature = signature
+                self._record('rejected', candidate.version, error)
+                print(f"  Model reload rejected ({candidate.version}): {error}")
+                return False, error
+
+            self._previous = current
+            self._predictor = candidate
+            self._signature = signature
+            self.loaded_at = datetime.utcnow()
+            self.performance = performance_document(candidate)
+            self._record('loaded', candidate.version)
+            print(f"  Active model version: {candidate.version}")
+            return True, f'Loaded {candidate.version}'
+
+    def rollback(self):
+        with self._reload_lock:
+            if self._previous is None:
+                return False, 'No previous model to roll back to'
+            self._predictor, self._previous = self._previous, self._predictor
+            self.loaded_at = datetime.utcnow()
+            self.performance = performance_document(self._predictor)
+            self._record('rollback', self._predictor.version)
+            print(f"  Rolled back to model version: {self._predictor.version}")
+            return True, f'Rolled back to {self._predictor.version}'
+
+    def validate(self, candidate):
+        """
+        Trả về None nếu model hợp lệ, ngược lại là thông báo lỗi
+        """
+        if not candidate.models:
+            return 'No models loaded'
+        try:
+            predictions = candidate.predict_all(dict(VALIDATION_SAMPLE))
+        except Exception as e:
+            return f'Prediction failed: {e}'
+        missing = [target for target in candidate.models if target not in predictions]
+        if missing:
+            return f'Missing predictions for {missing}'
+        if not all(np.isfinite(value) for value in predictions.values()):
+            return 'Non-finite prediction on validation sample'
+        return None
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                signature = artifact_signature(self.model_dir)
+                if signature == self._signature:
+                    self._pending_signature = None
+                    continue
+                # Chờ thêm một chu kỳ để artifact được ghi xong (git pull / training đang ghi file)
+                if signature != self._pending_signature:
+                    self._pending_signature = signature
+                    continue
+                self._pending_signature = None
+                self.reload()
+            except Exception as e:
+                print(f"Model watcher error: {e}")
+
+    def _record(self, event, version, detail=None):
+        self.history.append({
+            'event': event,
+            'version': version,
+            'detail': detail,
+            'time': datetime.utcnow().isoformat()
+        })
+        del self.history[:-self.history_size]
+
+    def status(self):
+        predictor = self._predictor
+        previous = self._previous
+        return {
+            'active_version': predictor.version if predictor else None,
+            'previous_version': previous.version if previous else None,
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+            'targets': list(predictor.models.keys()) if predictor else [],
+            'locations': [loc['name'] for loc in predictor.locations] if predictor else [],
+            'source': predictor.source if predictor else None,
+            'fused_kernel': bool(predictor and predictor.fused is not None),
+            'watch_interval': self.watch_interval,
+            'history': list(self.history)
+        }
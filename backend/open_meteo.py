@@ -0,0 +1,174 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+FORECAST_URL = 'https://api.open-meteo.com/v1/forecast'
+ARCHIVE_URL = 'https://archive-api.open-meteo.com/v1/archive'
+
+# Các mã HTTP nên thử lại (rate limit / lỗi phía server)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Circuit breaker đang mở: Open-Meteo được coi là đang lỗi nên không gọi nữa
+    """
+
+
+class CircuitBreaker:
+    """
+    Mở mạch sau `threshold` lần lỗi liên tiếp, giữ mở trong `cooldown` giây,
+    sau đó cho một request thử (half-open) để quyết định đóng lại hay mở tiếp.
+    """
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state(),
+                'consecutive_failures': self._failures,
+                'rejected': self.rejected
+            }
+
+
+class OpenMeteoClient:
+    """
+    Client dùng chung cho Open-Meteo (forecast + archive): một Session với connection pool
+    keep-alive, retry có giới hạn với backoff ngẫu nhiên và circuit breaker để fail fast.
+    """
+    def __init__(self, forecast_url=FORECAST_URL, archive_url=ARCHIVE_URL, pool_size=20,
+                 max_retries=2, backoff=0.3, max_backoff=5.0, breaker_threshold=5, breaker_cooldown=30):
+        self.forecast_url = forecast_url
+        self.archive_url = archive_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def forecast(self, params, timeout=10):
+        return self.get_json(self.forecast_url, params, timeout)
+
+    def archive(self, params, timeout=30):
+        return self.get_json(self.archive_url, params, timeout)
+
+    def get_json(self, url, params, timeout=10):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {url}")
+
+        for attempt in range(self.max_retries + 1):
+            self._count('requests')
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    raise requests.exceptions.HTTPError(f"{response.status_code} from upstream", response=response)
+                response.raise_for_status()
+                data = response.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                status = getattr(e.response, 'status_code', None)
+                retryable = status is None or status in RETRY_STATUS
+                if retryable and attempt < self.max_retries:
+                    self._count('retries')
+                    time.sleep(self._backoff_delay(attempt))
+                    continue
+                self._count('failures')
+                # Lỗi 4xx là do request, không phải do upstream
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                raise
+            except Exception:
+                self._count('failures')
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return data
+
+    def _backoff_delay(self, attempt):
+        # Full jitter: ngẫu nhiên trong [0, backoff * 2^attempt]
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            counters = {
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures
+            }
+        counters['circuit'] = self.breaker.stats()
+        return counters
+
+
+def client_from_env():
+    return OpenMeteoClient(
+        forecast_url=os.getenv('OPEN_METEO_API_URL', FORECAST_URL),
+        archive_url=os.getenv('OPEN_METEO_ARCHIVE_URL', ARCHIVE_URL),
+        pool_size=int(os.getenv('OPEN_METEO_POOL_SIZE', 20)),
+        max_retries=int(os.getenv('OPEN_METEO_MAX_RETRIES', 2)),
+        backoff=float(os.getenv('OPEN_METEO_BACKOFF_SECONDS', 0.3)),
+        breaker_threshold=int(os.getenv('OPEN_METEO_BREAKER_THRESHOLD', 5)),
+        breaker_cooldown=float(os.getenv('OPEN_METEO_BREAKER_COOLDOWN', 30))
+    )
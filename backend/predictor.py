@@ -0,0 +1,551 @@
+import json
+import os
+import pickle
+import numpy as np
+
+from model_bundle import load_bundle, bundle_to_estimators, fuse_linear_models
+from locations import LOCATION_INDEX_FILE
+from spatial_index import SpatialIndex
+from weather_codes import WeatherCodeVocabulary
+from weather_transform import WeatherTransform, encode_wind
+from temporal_features import TEMPORAL_FEATURES
+
+
+# Features mặc định nếu feature_config.pkl không có
+DEFAULT_FEATURES = {
+    'temperature': ['pressure_msl', 'radiation', 'wind_y'],
+    'humidity': ['radiation', 'w_51', 'w_53', 'w_61', 'w_63'],
+    'precipitation': ['w_63', 'w_65', 'w_61']
+}
+
+TARGET_UNITS = {'temperature': '°C', 'humidity': '%', 'precipitation': 'mm'}
+
+
+class WeatherPredictor:
+    """
+    Multi-model predictor với features được tối ưu cho từng loại dự báo
+    Sử dụng dữ liệu đã được chuẩn hóa theo chuỗi thời gian
+    """
+    def __init__(self, model_dir='model', load_locations=True):
+        self.model_dir = model_dir
+        self.version = None
+        self.content_hash = None
+        self.source = None
+        self.models = {}
+        self.scalers = {}
+        self.feature_config = {}
+        self.fused = None
+        self.transform = None
+        self.codes = None
+        self.code_features = []
+        self.temporal_features = []
+        self.metrics = {}
+        self.location = None
+        self.locations = []
+        self.location_index = SpatialIndex()
+        self.location_predictors = {}
+        self.load_models()
+        if load_locations:
+            self.load_location_models()
+
+    def load_models(self):
+        """
+        Ưu tiên bundle (memory-mapped); nếu không có hoặc không hợp lệ thì load từ pickle.
+        Transform tiền xử lý (preprocessing.json) được load kèm để dự báo trên cùng thang với lúc train.
+        """
+        try:
+            self.transform = WeatherTransform.load(self.model_dir)
+        except (ValueError, KeyError) as e:
+            # Không có transform hợp lệ thì dự báo sẽ sai thang: không phục vụ model này
+            print(f"⚠ Invalid preprocessing transform, models not loaded: {e}")
+            return
+        self.codes = self.transform.codes if self.transform is not None else WeatherCodeVocabulary()
+        try:
+            self.load_bundle()
+            self.fold_transform()
+            self.index_weather_codes()
+            self.load_metrics()
+            return
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            print(f"  Invalid model bundle, falling back to pickles: {e}")
+
+        self.load_pickles()
+        self.compile_fused_kernel()
+        self.index_weather_codes()
+        self.load_metrics()
+
+    def load_bundle(self):
+        manifest, arrays = load_bundle(self.model_dir)
+        self.models, self.scalers, self.feature_config = bundle_to_estimators(manifest, arrays, self.model_dir)
+        # Bundle có model không tuyến tính thì không có kernel gộp, dự báo qua sklearn
+        self.fused = None
+        if manifest.get('fused_features') is not None:
+            self.fused = {
+                'targets': list(manifest['targets']),
+                'features': list(manifest['fused_features']),
+                'index': {col: i for i, col in enumerate(manifest['fused_features'])},
+                'W': arrays['fused/W'],
+                'b': arrays['fused/b']
+            }
+        self.content_hash = manifest['content_hash']
+        self.metrics = manifest.get('metrics') or {}
+        self.source = 'bundle'
+        print(f"  Model bundle loaded ({len(self.models)} targets, {manifest['size']} bytes mmapped)")
+
+    def load_pickles(self):
+        try:
+            # Load all models if available
+            try:
+                with open(os.path.join(self.model_dir, 'all_models.pkl'), 'rb') as f:
+                    self.models = pickle.load(f)
+                with open(os.path.join(self.model_dir, 'all_scalers.pkl'), 'rb') as f:
+                    self.scalers = pickle.load(f)
+                with open(os.path.join(self.model_dir, 'feature_config.pkl'), 'rb') as f:
+                    self.feature_config = pickle.load(f)
+                print("  Multi-model system loaded successfully")
+            except FileNotFoundError:
+                # Fallback to temperature-only model (backward compatible)
+                with open(os.path.join(self.model_dir, 'weather_model.pkl'), 'rb') as f:
+                    self.models = {'temperature': pickle.load(f)}
+                with open(os.path.join(self.model_dir, 'scaler.pkl'), 'rb') as f:
+                    self.scalers = {'temperature': pickle.load(f)}
+                self.feature_config = {
+                    'temperature': ['pressure_msl', 'radiation', 'wind_y']
+                }
+                print("  Temperature model loaded (single model mode)")
+            self.source = 'pickle'
+
+        except FileNotFoundError:
+            print("⚠ Model files not found. Please train the model first.")
+            self.models = {}
+            self.scalers = {}
+            self.feature_config = {}
+
+    def load_metrics(self):
+        """
+        Metrics lúc train: bundle có sẵn trong manifest, còn lại (pickle / bundle cũ) đọc training_results.json
+        """
+        if self.metrics:
+            return
+        try:
+            with open(os.path.join(self.model_dir, 'training_results.json')) as f:
+                results = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.metrics = {
+            'training_date': results.get('training_date'),
+            'cv_splits': results.get('cv_splits'),
+            'targets': {target: value for target, value in results.items() if isinstance(value, dict) and 'r2' in value}
+        }
+
+    def performance_report(self):
+        """
+        Hiệu suất các model đang phục vụ theo metrics lúc train (test = 20% cuối chuỗi thời gian).
+        Target được chuẩn hóa lúc tiền xử lý nên MAE / RMSE được đổi về đơn vị gốc qua transform;
+        model cũ không có transform thì giữ thang chuẩn hóa.
+        """
+        cv_splits = self.metrics.get('cv_splits')
+        report = {
+            'model_version': self.version,
+            'training_date': self.metrics.get('training_date'),
+            'validation_method': f'TimeSeriesSplit ({cv_splits} folds)' if cv_splits else 'TimeSeriesSplit',
+            'models': {}
+        }
+        for target, model in self.models.items():
+            metrics = self.metrics.get('targets', {}).get(target, {})
+            i = self.transform.index.get(target) if self.transform is not None else None
+            scale = float(self.transform.scale[i]) if i is not None else 1.0
+
+            def error(name):
+                value = metrics.get(name)
+                return round(value * scale, 4) if value is not None else None
+
+            report['models'][target] = {
+                # Model tuyến tính trong bundle được dựng lại thành LinearRegression: ưu tiên tên lúc train
+                'estimator': metrics.get('estimator', type(model).__name__),
+                'features': self.features_for(target),
+                'units': TARGET_UNITS.get(target) if i is not None else 'standardized',
+                'metrics': {
+                    'r2_score': round(metrics['r2'], 4) if metrics.get('r2') is not None else None,
+                    'mae': error('mae'),
+                    'rmse': error('rmse'),
+                    'cv_mae': error('cv_mae_mean'),
+                    'cv_rmse': error('cv_rmse_mean')
+                },
+                'n_samples_train': metrics.get('n_samples_train'),
+                'n_samples_test': metrics.get('n_samples_test')
+            }
+        return report
+
+    def load_location_models(self):
+        """
+        Load model riêng của từng vị trí theo index model/locations.json (nếu có)
+        """
+        index_path = os.path.join(self.model_dir, LOCATION_INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+
+        with open(index_path, encoding='utf-8') as f:
+            index = json.load(f)
+
+        for loc in index.get('locations', []):
+            child = WeatherPredictor(os.path.join(self.model_dir, loc['model_dir']), load_locations=False)
+            if not child.models:
+                continue
+            child.location = loc
+            self.location_predictors[loc['id']] = child
+            self.locations.append(loc)
+            self.location_index.insert(loc['id'], loc['latitude'], loc['longitude'], loc)
+        print(f"  Location models loaded: {len(self.locations)}")
+
+    def for_location(self, latitude, longitude, max_km=50):
+        """
+        Predictor của vị trí đã train gần nhất (trong bán kính max_km), ngược lại là model chung
+        """
+        if latitude is None or longitude is None or not self.locations:
+            return self
+        location, _ = self.location_index.nearest(latitude, longitude, max_km)
+        if location is None:
+            return self
+        return self.location_predictors[location['id']]
+
+    def features_for(self, target):
+        return self.feature_config.get(target, DEFAULT_FEATURES.get(target, []))
+
+    def compile_fused_kernel(self):
+        """
+        Gộp StandardScaler vào hệ số LinearRegression thành một kernel x @ W + b cho mọi target.
+        Chỉ bật khi tất cả model đều tuyến tính và khớp với đường sklearn (parity check).
+        """
+        self.fused = None
+        if not self.models:
+            return
+
+        feature_config = {target: self.features_for(target) for target in self.models}
+        try:
+            targets, features, W, b = fuse_linear_models(self.models, self.scalers, feature_config)
+        except ValueError as e:
+            print(f"  Fused kernel disabled: {e}")
+            return
+
+        self.fused = {
+            'targets': targets,
+            'features': features,
+            'index': {col: i for i, col in enumerate(features)},
+            'W': W,
+            'b': b
+        }
+        self.fold_transform()
+
+        max_error = self.check_fused_parity()
+        if max_error > 1e-6:
+            print(f"  Fused kernel disabled: parity check failed (max error {max_error:.2e})")
+            self.fused = None
+        else:
+            print(f"  Fused kernel compiled: {len(features)} features x {len(targets)} targets")
+
+    def fold_transform(self):
+        """
+        Gộp transform tuyến tính vào kernel để kernel nhận giá trị thô và trả thẳng đơn vị gốc:
+            x_std = (x - mean) / scale  ->  W[i] / scale, b - W[i] * mean / scale
+            y = y_std * scale_t + mean_t ->  W[:, j] * scale_t, b[j] * scale_t + mean_t
+        Phần không tuyến tính còn lại là clip theo từng feature (lower / upper) và điền giá trị
+        thiếu bằng mean lúc train (fill), làm trên vector thô trước phép x @ W + b.
+        Model cũ không có transform: fill = 0, không clip.
+        """
+        if self.fused is None:
+            return
+
+        features = self.fused['features']
+        W = np.array(self.fused['W'], dtype=float)
+        b = np.array(self.fused['b'], dtype=float)
+        fill = np.zeros(len(features))
+        lower = np.full(len(features), -np.inf)
+        upper = np.full(len(features), np.inf)
+
+        transform = self.transform
+        if transform is not None:
+            for i, col in enumerate(features):
+                k = transform.index.get(col)
+                if k is None:
+                    continue
+                fill[i] = transform.mean[k]
+                lower[i], upper[i] = transform.clip_bounds.get(col, (-np.inf, np.inf))
+                b -= W[i] * transform.mean[k] / transform.scale[k]
+                W[i] /= transform.scale[k]
+            for j, target in enumerate(self.fused['targets']):
+                k = transform.index.get(target)
+                if k is not None:
+                    W[:, j] *= transform.scale[k]
+                    b[j] = b[j] * transform.scale[k] + transform.mean[k]
+
+        self.fused.update(W=W, b=b, fill=fill, lower=lower, upper=upper)
+
+    def index_weather_codes(self):
+        """
+        Chuẩn bị tra cứu weathercode: các cột w_xx model sử dụng, và với kernel gộp là mảng
+        code_slots (chỉ số trong từ vựng -> vị trí trong vector x; phần tử cuối -1 cho code lạ).
+        Ghi lại luôn các temporal feature (lag / rolling / harmonic) mà model cần.
+        """
+        used = {col for target in self.models for col in self.features_for(target)}
+        self.code_features = [col for col in self.codes.columns if col in used]
+        self.temporal_features = [col for col in TEMPORAL_FEATURES if col in used]
+        if self.fused is None:
+            return
+
+        slots = np.full(len(self.codes) + 1, -1, dtype=np.int64)
+        for k, col in enumerate(self.codes.columns):
+            slots[k] = self.fused['index'].get(col, -1)
+        code_columns = set(self.codes.columns)
+        self.fused['code_slots'] = slots
+        self.fused['dense'] = [(i, col) for i, col in enumerate(self.fused['features']) if col not in code_columns]
+
+    def fused_vector(self, features_dict):
+        """
+        Vector x thô cho kernel gộp: giá trị thiếu là fill, clip theo lúc train;
+        weathercode chỉ tốn một phép ghi vào vị trí tra được từ bảng
+        """
+        fused = self.fused
+        x = fused['fill'].copy()
+        has_code = 'weathercode' in features_dict
+        columns = fused['dense'] if has_code else enumerate(fused['features'])
+        for i, col in columns:
+            value = features_dict.get(col)
+            if value is not None:
+                x[i] = float(value)
+        x = np.clip(np.where(np.isnan(x), fused['fill'], x), fused['lower'], fused['upper'])
+
+        if has_code:
+            slot = fused['code_slots'][self.codes.index(features_dict['weathercode'])]
+            if slot >= 0:
+                x[slot] = 1.0
+        return x
+
+    def check_fused_parity(self, n_rows=256, seed=0):
+        """
+        So sánh kernel gộp với đường sklearn (transform + scaler.transform + model.predict + inverse_target)
+        trên dữ liệu thô ngẫu nhiên quanh mean lúc train, trả về sai số tuyệt đối lớn nhất
+        """
+        fused = self.fused
+        features = fused['features']
+        spread = np.ones(len(features))
+        if self.transform is not None:
+            for i, col in enumerate(features):
+                k = self.transform.index.get(col)
+                if k is not None:
+                    spread[i] = self.transform.scale[k]
+        rng = np.random.default_rng(seed)
+        X = np.clip(fused['fill'] + rng.normal(size=(n_rows, len(features))) * spread, fused['lower'], fused['upper'])
+        predicted = X @ fused['W'] + fused['b']
+
+        columns = {col: X[:, i] for i, col in enumerate(features)}
+        if self.transform is not None:
+            columns = self.transform.transform_columns(columns)
+
+        max_error = 0.0
+        for j, target in enumerate(fused['targets']):
+            X_target = np.column_stack([columns[col] for col in self.features_for(target)])
+            expected = self.models[target].predict(self.scalers[target].transform(X_target))
+            if self.transform is not None:
+                expected = self.transform.inverse_target(target, expected)
+            max_error = max(max_error, float(np.max(np.abs(expected - predicted[:, j]))))
+        return max_error
+
+    def postprocess(self, target, values):
+        # Model dự báo trên thang đã chuẩn hóa -> đổi về đơn vị gốc
+        if self.transform is not None:
+            values = self.transform.inverse_target(target, values)
+        return self.clip_target(target, values)
+
+    @staticmethod
+    def clip_target(target, values):
+        # Độ ẩm trong khoảng [0, 100]%, lượng mưa không âm
+        if target == 'humidity':
+            return np.clip(values, 0, 100)
+        if target == 'precipitation':
+            return np.maximum(values, 0)
+        return values
+
+    def preprocess_weather_code(self, weathercode):
+        """
+        Chuyển đổi weathercode thành các biến dummy (w_xx) mà model sử dụng,
+        tra theo từ vựng weathercode đã lưu cùng model
+        """
+        weather_features = dict.fromkeys(self.code_features, 0)
+        k = self.codes.index(weathercode)
+        if k >= 0 and self.codes.columns[k] in weather_features:
+            weather_features[self.codes.columns[k]] = 1
+
+        return weather_features
+
+    def predict_all(self, features_dict):
+        """
+        Dự báo mọi target cho một quan sát (giá trị thô như từ Open-Meteo).
+        Kernel gộp (transform đã gộp vào W, b) nếu có: một phép x @ W + b trên vector thô.
+        Không có kernel: có transform thì đi đường vector hoá của predict_batch (batch một dòng),
+        model cũ không có transform thì từng predict_* qua sklearn.
+        """
+        if self.fused is None and self.transform is not None:
+            predictions = self.predict_batch({name: [value] for name, value in features_dict.items()})
+            return {target: float(values[0]) for target, values in predictions.items()}
+
+        if 'winddirection' in features_dict:
+            features_dict = encode_wind(dict(features_dict))
+
+        if self.fused is None:
+            predictions = {
+                'temperature': self.predict_temperature(features_dict),
+                'humidity': self.predict_humidity(features_dict),
+                'precipitation': self.predict_precipitation(features_dict)
+            }
+            return {target: value for target, value in predictions.items() if value is not None}
+
+        x = self.fused_vector(features_dict)
+        values = x @ self.fused['W'] + self.fused['b']
+
+        return {
+            target: float(self.clip_target(target, values[j]))
+            for j, target in enumerate(self.fused['targets'])
+        }
+
+    def predict_temperature(self, features_dict):
+        """
+        Dự báo nhiệt độ sử dụng: pressure_msl, radiation, wind_y
+        """
+        if 'temperature' not in self.models:
+            return None
+
+        feature_names = self.feature_config.get('temperature',
+                                                ['pressure_msl', 'radiation', 'wind_y'])
+
+        # Chuẩn bị features
+        features = []
+        for col in feature_names:
+            features.append(features_dict.get(col, 0))
+
+        X = np.array(features).reshape(1, -1)
+        X_scaled = self.scalers['temperature'].transform(X)
+        prediction = self.models['temperature'].predict(X_scaled)
+
+        return float(prediction[0])
+
+    def predict_humidity(self, features_dict):
+        """
+        Dự báo độ ẩm sử dụng: radiation (nghịch), w_51, w_53, w_61, w_63 (thuận)
+        """
+        if 'humidity' not in self.models:
+            return None
+
+        feature_names = self.feature_config.get('humidity',
+                                                ['radiation', 'w_51', 'w_53', 'w_61', 'w_63'])
+
+        # Thêm weather code features nếu có
+        if 'weathercode' in features_dict:
+            weather_features = self.preprocess_weather_code(features_dict['weathercode'])
+            features_dict.update(weather_features)
+
+        features = []
+        for col in feature_names:
+            features.append(features_dict.get(col, 0))
+
+        X = np.array(features).reshape(1, -1)
+        X_scaled = self.scalers['humidity'].transform(X)
+        prediction = self.models['humidity'].predict(X_scaled)
+
+        # Giới hạn trong khoảng [0, 100]%
+        return float(max(0, min(100, prediction[0])))
+
+    def predict_precipitation(self, features_dict):
+        """
+        Dự báo lượng mưa sử dụng: w_63, w_65, w_61 (bắt buộc)
+        """
+        if 'precipitation' not in self.models:
+            return None
+
+        feature_names = self.feature_config.get('precipitation',
+                                                ['w_63', 'w_65', 'w_61'])
+
+        # Thêm weather code features nếu có
+        if 'weathercode' in features_dict:
+            weather_features = self.preprocess_weather_code(features_dict['weathercode'])
+            features_dict.update(weather_features)
+
+        features = []
+        for col in feature_names:
+            features.append(features_dict.get(col, 0))
+
+        X = np.array(features).reshape(1, -1)
+        X_scaled = self.scalers['precipitation'].transform(X)
+        prediction = self.models['precipitation'].predict(X_scaled)
+
+        # Lượng mưa không âm
+        return float(max(0, prediction[0]))
+
+    def build_batch_columns(self, columns):
+        """
+        Chuẩn bị features dạng cột (numpy) cho cả batch, tính vector hoá một lần.
+        Có transform thì áp dụng đúng phép tiền xử lý lúc train (clip, one-hot, chuẩn hóa);
+        model cũ chỉ đổi winddirection -> wind_x, wind_y và weathercode -> w_xx (scatter theo bảng tra).
+        """
+        if self.transform is not None:
+            n_rows = len(next(iter(columns.values()))) if columns else 0
+            return self.transform.transform_columns(columns), n_rows
+        return self.encode_raw_columns(columns)
+
+    def encode_raw_columns(self, columns):
+        """
+        Chỉ đổi winddirection -> wind_x, wind_y và weathercode -> w_xx (scatter theo bảng tra),
+        giữ nguyên thang đo gốc (đầu vào của kernel gộp)
+        """
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        columns = {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+
+        if 'winddirection' in columns:
+            radians = np.deg2rad(columns['winddirection'])
+            columns.setdefault('wind_x', np.sin(radians))
+            columns.setdefault('wind_y', np.cos(radians))
+
+        # weathercode thiếu (NaN) là hàng one-hot toàn 0
+        if 'weathercode' in columns:
+            matrix = self.codes.one_hot(columns['weathercode'], dtype=float)
+            for k, col in enumerate(self.codes.columns):
+                if col in self.code_features:
+                    columns[col] = matrix[:, k]
+
+        return columns, n_rows
+
+    def predict_batch(self, columns):
+        """
+        Dự báo cho nhiều quan sát cùng lúc. Với kernel gộp chỉ cần một phép X @ W + b
+        trên giá trị thô cho mọi target; nếu không thì mỗi target một lần scaler.transform và model.predict.
+        Trả về dict target -> numpy array.
+        Giá trị thiếu (None / NaN) được xử lý như cột vắng mặt khi dự báo một dòng: mean lúc train.
+        """
+        predictions = {}
+
+        if self.fused is not None:
+            fused = self.fused
+            columns, n_rows = self.encode_raw_columns(columns)
+            missing = np.full(n_rows, np.nan)
+            X = np.column_stack([columns.get(col, missing) for col in fused['features']])
+            X = np.clip(np.where(np.isnan(X), fused['fill'], X), fused['lower'], fused['upper'])
+            values = X @ fused['W'] + fused['b']
+            for j, target in enumerate(fused['targets']):
+                predictions[target] = self.clip_target(target, values[:, j])
+            return predictions
+
+        columns, n_rows = self.build_batch_columns(columns)
+        zeros = np.zeros(n_rows)
+
+        def matrix(feature_names):
+            X = np.column_stack([np.asarray(columns.get(col, zeros), dtype=float) for col in feature_names])
+            return np.nan_to_num(X, nan=0.0)
+
+        for target, model in self.models.items():
+            feature_names = self.features_for(target)
+            X_scaled = self.scalers[target].transform(matrix(feature_names))
+            predictions[target] = self.postprocess(target, model.predict(X_scaled))
+
+        return predictions
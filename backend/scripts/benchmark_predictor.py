@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from predictor import WeatherPredictor
+
+
+def time_per_call(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def benchmark_predictor(repeats=2000, batch_size=10000):
+    """
+    So sánh độ trễ giữa đường sklearn (transform + scaler + predict cho từng target)
+    và đường phục vụ (predict_all / predict_batch qua kernel gộp) trên cùng đầu vào thô,
+    cho request đơn lẻ và batch
+    """
+    predictor = WeatherPredictor()
+    if predictor.fused is None:
+        print("Fused kernel not available, nothing to compare")
+        return False
+
+    max_error = predictor.check_fused_parity(n_rows=batch_size)
+    print(f"Parity check (max abs error over {batch_size} rows): {max_error:.2e}")
+
+    observation = {
+        'pressure_msl': 1012.0,
+        'radiation': 350.0,
+        'winddirection': 90.0,
+        'weathercode': 61
+    }
+
+    def sklearn_single():
+        # Đường trước kernel gộp, cùng đầu vào đã transform: scaler + predict + đổi đơn vị cho từng target
+        columns, _ = predictor.build_batch_columns({name: [value] for name, value in observation.items()})
+        predictions = {}
+        for target, model in predictor.models.items():
+            X = np.array([[float(columns[col][0]) if col in columns else 0.0 for col in predictor.features_for(target)]])
+            value = model.predict(predictor.scalers[target].transform(X))
+            predictions[target] = float(predictor.postprocess(target, value)[0])
+        return predictions
+
+    def serving_single():
+        # Đường phục vụ thật của /api/predict-temperature/
+        return predictor.predict_all(dict(observation))
+
+    expected, served = sklearn_single(), serving_single()
+    print(f"Single-row agreement (max abs diff): {max(abs(expected[t] - served[t]) for t in expected):.2e}")
+
+    sklearn_time = time_per_call(sklearn_single, repeats)
+    serving_time = time_per_call(serving_single, repeats)
+    print(f"\nSingle request ({repeats} calls):")
+    print(f"   sklearn path: {sklearn_time * 1e6:.1f} µs/request")
+    print(f"   predict_all:  {serving_time * 1e6:.1f} µs/request ({sklearn_time / serving_time:.1f}x)")
+
+    rng = np.random.default_rng(0)
+    columns = {
+        'pressure_msl': rng.normal(1010, 5, batch_size),
+        'radiation': rng.uniform(0, 800, batch_size),
+        'winddirection': rng.uniform(0, 360, batch_size),
+        'weathercode': rng.choice([0, 3, 51, 53, 61, 63, 65], batch_size)
+    }
+
+    fused = predictor.fused
+    batch_repeats = max(1, repeats // 100)
+    fused_batch_time = time_per_call(lambda: predictor.predict_batch(columns), batch_repeats)
+    predictor.fused = None
+    sklearn_batch_time = time_per_call(lambda: predictor.predict_batch(columns), batch_repeats)
+    predictor.fused = fused
+
+    print(f"\nBatch of {batch_size} rows ({batch_repeats} calls):")
+    print(f"   sklearn path: {sklearn_batch_time * 1e3:.2f} ms/batch")
+    print(f"   fused kernel: {fused_batch_time * 1e3:.2f} ms/batch ({sklearn_batch_time / fused_batch_time:.1f}x)")
+
+    return True
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    success = benchmark_predictor(repeats=repeats)
+    sys.exit(0 if success else 1)
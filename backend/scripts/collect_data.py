@@ -1,67 +1,179 @@
 import requests
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+import hashlib
+import io
 import os
 import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from open_meteo import client_from_env
+from locations import load_locations, favorite_locations
+from weather_store import write_weather, upsert_weather, last_timestamp, exists, is_csv
+
+DEFAULT_LATITUDE = 21.0285
+DEFAULT_LONGITUDE = 105.8542
+
+# Số ngày lấy lại trước mốc cuối cùng để cập nhật các hiệu chỉnh của archive
+DEFAULT_OVERLAP_DAYS = 3
+
+# Độ dài cửa sổ (tháng) cho chế độ backfill
+BACKFILL_WINDOWS = {'month': 1, 'quarter': 3, 'year': 12}
+
+# Biến hourly lấy từ archive (cũng là một phần key checkpoint của backfill)
+ARCHIVE_HOURLY_VARIABLES = (
+    "temperature_2m,relative_humidity_2m,precipitation,weathercode,"
+    "cloud_cover,windspeed_10m,winddirection_10m,"
+    "pressure_msl,shortwave_radiation"
+)
+
+def fetch_hourly_archive(start_date, end_date, client=None,
+                         latitude=DEFAULT_LATITUDE, longitude=DEFAULT_LONGITUDE):
+    """
+    Gọi Open-Meteo archive cho khoảng [start_date, end_date] và trả về DataFrame theo giờ
+    """
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "hourly": ARCHIVE_HOURLY_VARIABLES,
+        "timezone": "Asia/Bangkok"
+    }
+
+    data = (client or client_from_env()).archive(params, timeout=30)
+
+    # Tạo DataFrame
+    df = pd.DataFrame({
+        "timestamp": data["hourly"]["time"],
+        "temperature": data["hourly"]["temperature_2m"],
+        "humidity": data["hourly"]["relative_humidity_2m"],
+        "precipitation": data["hourly"]["precipitation"],
+        "weathercode": data["hourly"]["weathercode"],
+        "cloud_cover": data["hourly"]["cloud_cover"],
+        "windspeed": data["hourly"]["windspeed_10m"],
+        "winddirection": data["hourly"]["winddirection_10m"],
+        "pressure_msl": data["hourly"]["pressure_msl"],
+        "radiation": data["hourly"]["shortwave_radiation"]
+    })
+
+    # Xử lý missing values
+    return df.dropna()
+
+def read_last_rows(path, n_rows, bytes_per_row=200):
+    """
+    Đọc n_rows dòng cuối của file CSV mà không phải parse toàn bộ file
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(len(header), size - n_rows * bytes_per_row)
+        f.seek(start)
+        lines = f.read().splitlines()
+
+    # Dòng đầu có thể bị cắt giữa chừng nếu không đọc từ ngay sau header
+    if start > len(header):
+        lines = lines[1:]
+    lines = [line for line in lines[-n_rows:] if line]
+    return pd.read_csv(io.BytesIO(header + b'\n'.join(lines)))
+
+def collect_weather_data(days_back=365*10, output_file="data/hourly",
+                         latitude=DEFAULT_LATITUDE, longitude=DEFAULT_LONGITUDE, client=None):
 
-def collect_weather_data(days_back=365*10, output_file="data/HanoiWeatherHourly.csv"):
-      
     # Tính toán ngày bắt đầu và kết thúc
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days_back)
-    
+
     # Đảm bảo không vượt quá giới hạn API (từ 2015)
     if start_date.year < 2015:
         start_date = datetime(2015, 1, 1)
-        
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    
-    params = {
-        "latitude": 21.0285,
-        "longitude": 105.8542,
-        "start_date": start_date.strftime("%Y-%m-%d"),
-        "end_date": end_date.strftime("%Y-%m-%d"),
-        "hourly": (
-            "temperature_2m,relative_humidity_2m,precipitation,weathercode,"
-            "cloud_cover,windspeed_10m,winddirection_10m,"
-            "pressure_msl,shortwave_radiation"
-        ),
-        "timezone": "Asia/Bangkok"
-    }
-    
+
     try:
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Tạo DataFrame
-        df = pd.DataFrame({
-            "timestamp": data["hourly"]["time"],
-            "temperature": data["hourly"]["temperature_2m"],
-            "humidity": data["hourly"]["relative_humidity_2m"],
-            "precipitation": data["hourly"]["precipitation"],
-            "weathercode": data["hourly"]["weathercode"],
-            "cloud_cover": data["hourly"]["cloud_cover"],
-            "windspeed": data["hourly"]["windspeed_10m"],
-            "winddirection": data["hourly"]["winddirection_10m"],
-            "pressure_msl": data["hourly"]["pressure_msl"],
-            "radiation": data["hourly"]["shortwave_radiation"]
-        })
-        
-        # Xử lý missing values
-        df = df.dropna()
-        
-        # Tạo thư mục nếu chưa có
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        # Lưu file
-        df.to_csv(output_file, index=False)
-        
+        df = fetch_hourly_archive(start_date, end_date, client, latitude, longitude)
+
+        # Lưu dữ liệu (Parquet phân vùng theo năm/tháng, hoặc CSV nếu output_file là *.csv)
+        write_weather(df, output_file)
+
         print(f"Thống kê cơ bản:")
         print(df.describe())
-        
+
+        return True
+
+    except requests.exceptions.RequestException as e:
+        print(f"Lỗi khi gọi API: {e}")
+        return False
+    except Exception as e:
+        print(f"Lỗi không xác định: {e}")
+        return False
+
+def collect_incremental(output_file="data/hourly", overlap_days=DEFAULT_OVERLAP_DAYS,
+                        days_back=365*10, latitude=DEFAULT_LATITUDE, longitude=DEFAULT_LONGITUDE, client=None):
+    """
+    Chỉ lấy phần dữ liệu còn thiếu kể từ timestamp cuối cùng đã lưu (cộng thêm overlap_days
+    để bắt các hiệu chỉnh của archive), khử trùng lặp theo timestamp rồi append.
+    Với Parquet chỉ các phân vùng tháng bị chạm tới được ghi lại; với CSV file chỉ bị ghi lại
+    toàn bộ khi archive đã sửa các dòng cũ trong khoảng overlap.
+    """
+    if not exists(output_file):
+        print(f"Chưa có {output_file}, tải toàn bộ dữ liệu")
+        return collect_weather_data(days_back, output_file, latitude, longitude, client)
+
+    if not is_csv(output_file):
+        try:
+            last_ts = last_timestamp(output_file)
+            start_date = last_ts.to_pydatetime() - timedelta(days=overlap_days)
+            end_date = datetime.now()
+            print(f"Timestamp cuối: {last_ts}, tải từ {start_date:%Y-%m-%d} đến {end_date:%Y-%m-%d}")
+
+            df = fetch_hourly_archive(start_date, end_date, client, latitude, longitude)
+            added = upsert_weather(df, output_file)
+            print(f"   Thêm {added} dòng mới (đã tải {len(df)} dòng)")
+            return True
+
+        except requests.exceptions.RequestException as e:
+            print(f"Lỗi khi gọi API: {e}")
+            return False
+        except Exception as e:
+            print(f"Lỗi không xác định: {e}")
+            return False
+
+    try:
+        tail = read_last_rows(output_file, (overlap_days + 1) * 24)
+        if tail.empty:
+            return collect_weather_data(days_back, output_file, latitude, longitude, client)
+
+        last_ts = tail['timestamp'].max()
+        start_date = datetime.fromisoformat(last_ts) - timedelta(days=overlap_days)
+        end_date = datetime.now()
+        print(f"Timestamp cuối: {last_ts}, tải từ {start_date:%Y-%m-%d} đến {end_date:%Y-%m-%d}")
+
+        df = fetch_hourly_archive(start_date, end_date, client, latitude, longitude)
+        df = df.drop_duplicates(subset='timestamp', keep='last')
+
+        # So sánh phần overlap với dữ liệu đã lưu để phát hiện hiệu chỉnh
+        overlap = df[df['timestamp'] <= last_ts].set_index('timestamp')
+        stored = tail.set_index('timestamp').reindex(overlap.index)
+        value_cols = [col for col in overlap.columns if col in stored.columns]
+        changed = (~stored[value_cols].isna().any(axis=1)) & \
+                  (overlap[value_cols].astype(float) - stored[value_cols].astype(float)).abs().gt(1e-9).any(axis=1)
+
+        new_rows = df[df['timestamp'] > last_ts]
+
+        if changed.any():
+            print(f"   {int(changed.sum())} dòng đã được archive hiệu chỉnh, ghi lại file")
+            existing = pd.read_csv(output_file)
+            merged = pd.concat([existing, df], ignore_index=True)
+            merged = merged.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+            merged.to_csv(output_file, index=False)
+        elif not new_rows.empty:
+            new_rows[tail.columns].to_csv(output_file, mode='a', header=False, index=False)
+
+        print(f"   Thêm {len(new_rows)} dòng mới (đã tải {len(df)} dòng)")
         return True
-        
+
     except requests.exceptions.RequestException as e:
         print(f"Lỗi khi gọi API: {e}")
         return False
@@ -69,8 +181,157 @@ def collect_weather_data(days_back=365*10, output_file="data/HanoiWeatherHourly.
         print(f"Lỗi không xác định: {e}")
         return False
 
+def split_date_windows(start_date, end_date, window='year', align=False):
+    """
+    Chia [start_date, end_date] thành các cửa sổ liền nhau, không chồng lấn, theo tháng/quý/năm.
+    align=True thì cửa sổ đầu bắt đầu từ đầu tháng/quý/năm chứa start_date (mọi cửa sổ theo lịch)
+    """
+    months = BACKFILL_WINDOWS[window]
+    windows = []
+    current = start_date.date() if isinstance(start_date, datetime) else start_date
+    end = end_date.date() if isinstance(end_date, datetime) else end_date
+    if align:
+        current = current.replace(month=current.month - (current.month - 1) % months, day=1)
+
+    while current <= end:
+        # Đầu cửa sổ tiếp theo: ngày 1 của tháng sau `months` tháng, căn theo lịch
+        month_index = current.year * 12 + (current.month - 1) + months
+        month_index -= (current.month - 1) % months
+        next_start = current.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+        windows.append((current, min(end, next_start - timedelta(days=1))))
+        current = next_start
+
+    return windows
+
+def backfill_weather_data(days_back=365*10, output_file="data/hourly",
+                          window='year', workers=4, checkpoint_dir="data/backfill",
+                          latitude=DEFAULT_LATITUDE, longitude=DEFAULT_LONGITUDE):
+    """
+    Tải lại toàn bộ lịch sử theo từng cửa sổ thời gian, song song với số worker giới hạn.
+    Mỗi cửa sổ hoàn thành được lưu checkpoint ra đĩa nên khi lỗi chỉ cần chạy lại,
+    các cửa sổ đã có sẽ được bỏ qua. Key checkpoint gồm toạ độ, tập biến và khoảng ngày
+    nên chạy lại với vị trí hoặc biến khác không dùng nhầm dữ liệu cũ. Cửa sổ căn theo lịch
+    (cửa sổ đầu tải trọn tháng/quý/năm) để key không đổi theo ngày chạy; cửa sổ cuối (chưa trọn)
+    có checkpoint riêng và luôn tải lại. Cuối cùng gộp theo thứ tự timestamp, bỏ phần trước start_date.
+    """
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days_back)
+    if start_date.year < 2015:
+        start_date = datetime(2015, 1, 1)
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    windows = split_date_windows(start_date, end_date, window, align=True)
+    client = client_from_env()
+
+    variables = hashlib.sha256(ARCHIVE_HOURLY_VARIABLES.encode('utf-8')).hexdigest()[:8]
+    prefix = f"{latitude:.4f}_{longitude:.4f}_{variables}"
+
+    def checkpoint_path(window_start, window_end):
+        if (window_start, window_end) == windows[-1]:
+            return os.path.join(checkpoint_dir, f"{prefix}_{window_start:%Y%m%d}_partial.csv")
+        return os.path.join(checkpoint_dir, f"{prefix}_{window_start:%Y%m%d}_{window_end:%Y%m%d}.csv")
+
+    def fetch_window(window_start, window_end):
+        started = time.perf_counter()
+        df = fetch_hourly_archive(window_start, window_end, client, latitude, longitude)
+        path = checkpoint_path(window_start, window_end)
+        df.to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        return len(df), time.perf_counter() - started
+
+    # Cửa sổ cuối (chứa hôm nay) luôn tải lại vì dữ liệu còn đang được bổ sung
+    pending = [w for w in windows if w == windows[-1] or not os.path.exists(checkpoint_path(*w))]
+    print(f"Backfill {len(windows)} cửa sổ ({window}), {len(windows) - len(pending)} đã có checkpoint")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_window, *w): w for w in pending}
+        for future in as_completed(futures):
+            window_start, window_end = futures[future]
+            try:
+                rows, elapsed = future.result()
+                print(f"   {window_start} → {window_end}: {rows} dòng ({elapsed:.1f}s)")
+            except Exception as e:
+                failed.append((window_start, window_end))
+                print(f"   {window_start} → {window_end}: lỗi {e}")
+
+    if failed:
+        print(f"{len(failed)} cửa sổ lỗi, chạy lại để tiếp tục từ checkpoint")
+        return False
+
+    # Checkpoint dở dang của các cửa sổ nay đã trọn
+    for window_start, _ in windows[:-1]:
+        partial = os.path.join(checkpoint_dir, f"{prefix}_{window_start:%Y%m%d}_partial.csv")
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    parts = [pd.read_csv(checkpoint_path(*w)) for w in windows]
+    df = pd.concat(parts, ignore_index=True)
+    df = df[df['timestamp'] >= f"{start_date:%Y-%m-%d}"]
+    df = df.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+
+    write_weather(df, output_file)
+    print(f"Đã gộp {len(df)} dòng vào {output_file}")
+    return True
+
+def location_data_file(location, data_dir="data/locations"):
+    return os.path.join(data_dir, location['id'], "hourly")
+
+def collect_locations(locations, days_back=365*10, incremental=True, workers=4, data_dir="data/locations"):
+    """
+    Thu thập dữ liệu cho nhiều vị trí song song, mỗi vị trí lưu vào một partition riêng
+    data/locations/<id>/hourly (dùng chung một client có connection pool)
+    """
+    client = client_from_env()
+    collect = collect_incremental if incremental else collect_weather_data
+
+    def collect_location(location):
+        output_file = location_data_file(location, data_dir)
+        return collect(days_back=days_back, output_file=output_file,
+                       latitude=location['latitude'], longitude=location['longitude'], client=client)
+
+    print(f"Thu thập {len(locations)} vị trí ({'incremental' if incremental else 'full'})")
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(collect_location, loc): loc for loc in locations}
+        for future in as_completed(futures):
+            location = futures[future]
+            try:
+                results[location['id']] = future.result()
+            except Exception as e:
+                print(f"   {location['name']}: lỗi {e}")
+                results[location['id']] = False
+            print(f"   {location['name']} ({location['id']}): {'OK' if results[location['id']] else 'FAILED'}")
+
+    return all(results.values())
+
 if __name__ == "__main__":
-    # Có thể truyền số ngày qua command line
-    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365*10
-    success = collect_weather_data(days_back=days)
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    # Có thể truyền số ngày qua command line, thêm --incremental để chỉ tải phần còn thiếu
+    # hoặc --backfill [--window=year|quarter|month] [--workers=N] để tải lại song song theo cửa sổ
+    # hoặc --locations=<file.json>|favorites [--full] để thu thập nhiều vị trí
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    days = int(args[0]) if args else 365*10
+    if 'locations' in options:
+        # --locations=<file.json> hoặc --locations=favorites (toạ độ trong bảng Favorite)
+        if options['locations'] == 'favorites':
+            locations = favorite_locations()
+        else:
+            locations = load_locations(options['locations'])
+        success = collect_locations(
+            locations,
+            days_back=days,
+            incremental='--full' not in sys.argv,
+            workers=int(options.get('workers', 4))
+        )
+    elif '--incremental' in sys.argv:
+        success = collect_incremental(days_back=days)
+    elif '--backfill' in sys.argv:
+        success = backfill_weather_data(
+            days_back=days,
+            window=options.get('window', 'year'),
+            workers=int(options.get('workers', 4))
+        )
+    else:
+        success = collect_weather_data(days_back=days)
+    sys.exit(0 if success else 1)
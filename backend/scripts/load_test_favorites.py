@@ -0,0 +1,115 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+def percentiles_ms(samples):
+    if not samples:
+        return 'no samples'
+    values = np.array(samples) * 1e3
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms, max {values.max():.2f} ms"
+
+
+def load_test_favorites(readers=8, writers=4, duration=10.0, users=50, favorites_per_user=20):
+    """
+    Đo độ trễ đọc danh sách yêu thích (cùng query với GET /api/favorites/) khi có
+    các luồng ghi đồng thời thêm / xoá yêu thích. Mặc định chạy trên một file SQLite tạm;
+    đặt DATABASE_URI để đo database khác, SQLITE_WAL=False để so sánh với rollback journal.
+    """
+    from app import app, db, User, Favorite
+
+    with app.app_context():
+        for u in range(users):
+            user = User(username=f"load_{u}_{time.time_ns()}", password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            for i in range(favorites_per_user):
+                db.session.add(Favorite(user_id=user.id, city_name=f"City {i}",
+                                        latitude=random.uniform(-60, 60), longitude=random.uniform(-180, 180)))
+        db.session.commit()
+        user_ids = [user.id for user in User.query.filter(User.username.like('load_%')).all()]
+        database_url = repr(db.engine.url)
+
+    stop = threading.Event()
+    read_latency, write_latency = [], []
+    errors = []
+    lock = threading.Lock()
+
+    def reader():
+        rng = random.Random()
+        with app.app_context():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    Favorite.query.filter_by(user_id=rng.choice(user_ids)).order_by(Favorite.created_at, Favorite.id).all()
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        read_latency.append(elapsed)
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(f"read: {e}")
+                finally:
+                    db.session.remove()
+
+    def writer():
+        rng = random.Random()
+        with app.app_context():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    fav = Favorite(user_id=rng.choice(user_ids), city_name='Load test',
+                                   latitude=rng.uniform(-60, 60), longitude=rng.uniform(-180, 180))
+                    db.session.add(fav)
+                    db.session.commit()
+                    db.session.delete(fav)
+                    db.session.commit()
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        write_latency.append(elapsed)
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(f"write: {e}")
+                finally:
+                    db.session.remove()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"\nDatabase: {database_url} ({readers} readers, {writers} writers, {duration:.0f}s)")
+    print(f"   reads:  {len(read_latency) / duration:.0f}/s, {percentiles_ms(read_latency)}")
+    print(f"   writes: {len(write_latency) / duration:.0f}/s (insert + delete), {percentiles_ms(write_latency)}")
+    print(f"   errors: {len(errors)}")
+    for error in sorted(set(errors))[:5]:
+        print(f"      {error}")
+    return not errors
+
+
+if __name__ == "__main__":
+    # python scripts/load_test_favorites.py [--readers=8] [--writers=4] [--duration=10]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(backend_dir)
+    os.chdir(backend_dir)
+    if 'DATABASE_URI' not in os.environ:
+        os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}"
+
+    success = load_test_favorites(
+        readers=int(options.get('readers', 8)),
+        writers=int(options.get('writers', 4)),
+        duration=float(options.get('duration', 10))
+    )
+    sys.exit(0 if success else 1)
@@ -0,0 +1,34 @@
+import os
+import sys
+
+from sqlalchemy import create_engine, inspect
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import MIGRATIONS, resolve_database_uri, engine_options, apply_migrations, schema_version
+
+
+def migrate(database_uri=None):
+    """
+    Áp dụng các migration chưa chạy cho database đã có (app cũng tự chạy khi khởi động).
+    Database mới được tạo bởi db.create_all() lúc khởi động app.
+    """
+    database_uri = resolve_database_uri(database_uri)
+    engine = create_engine(database_uri, **engine_options(database_uri))
+    try:
+        if not inspect(engine).has_table('favorite'):
+            print(f"No favorite table in {engine.url!r}, start the app once to create the schema")
+            return False
+
+        before = schema_version(engine)
+        applied = apply_migrations(engine)
+        latest = MIGRATIONS[-1][0] if MIGRATIONS else 0
+        print(f"Schema version: {before} -> {schema_version(engine)} (latest {latest}, applied {applied or 'none'})")
+        return schema_version(engine) == latest
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    # python scripts/migrate_db.py [DATABASE_URI]
+    success = migrate(sys.argv[1] if len(sys.argv) > 1 else None)
+    sys.exit(0 if success else 1)
@@ -5,25 +5,57 @@ import pickle
 import os
 import sys
 
-def preprocess_weather_data(input_file="data/HanoiWeatherHourly.csv", 
-                            output_file="data/weather_preprocessed.csv",
-                            save_scaler=True):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weather_store import read_weather, write_weather, iter_weather, WeatherWriter
+from weather_codes import WeatherCodeVocabulary
+from weather_transform import WeatherTransform, encode_wind
+from temporal_features import TEMPORAL_FEATURES, add_temporal_features, iter_temporal_features
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Các biến numerical được chuẩn hóa (KHÔNG chuẩn hóa timestamp)
+NUMERICAL_COLS = ['temperature', 'humidity', 'precipitation', 
+                  'cloud_cover', 'windspeed', 'pressure_msl', 
+                  'radiation', 'wind_x', 'wind_y'] + TEMPORAL_FEATURES
+
+# Các biến bị clip theo quantile 1% / 99%
+CLIP_COLS = ['windspeed', 'radiation']
+CLIP_QUANTILES = (0.01, 0.99)
+
+DEFAULT_CHUNK_ROWS = 100000
+
+def preprocess_weather_data(input_file="data/hourly", 
+                            output_file="data/preprocessed",
+                            save_scaler=True,
+                            scaler_file="model/preprocessing_scaler.pkl",
+                            chunk_rows=None):
+    # Dữ liệu lớn: xử lý theo chunk với bộ nhớ giới hạn
+    if chunk_rows:
+        return preprocess_weather_data_chunked(input_file, output_file, save_scaler, scaler_file, chunk_rows)
         
     try:
         # 1. Load dữ liệu
-        df = pd.read_csv(input_file)
+        df = read_weather(input_file)
         
         # Kiểm tra và parse timestamp
         if 'timestamp' in df.columns:
             df['timestamp'] = pd.to_datetime(df['timestamp'])
             df = df.sort_values('timestamp').reset_index(drop=True)
             print(f"Dữ liệu từ {df['timestamp'].min()} đến {df['timestamp'].max()}")
+            
+            # Lag, rolling mean/std và harmonic (trên giá trị thô, trước khi chuẩn hóa)
+            df = add_temporal_features(df)
+            print(f"   Tạo {len(TEMPORAL_FEATURES)} temporal features")
         
-        # 2. One-hot encoding cho weathercode
-        df = pd.get_dummies(df, columns=['weathercode'], prefix='w')
-        dummy_cols = [col for col in df.columns if col.startswith('w_')]
-        df[dummy_cols] = df[dummy_cols].astype(int)
-        print(f"   Tạo {len(dummy_cols)} dummy variables")
+        # 2. One-hot encoding cho weathercode theo từ vựng WMO cố định (dùng chung với serving)
+        codes = WeatherCodeVocabulary()
+        df, unknown = codes.encode_frame(df)
+        print(f"   Tạo {len(codes)} dummy variables")
+        if unknown:
+            print(f"   {unknown} dòng có weathercode ngoài từ vựng")
         
         # 3. Xử lý dữ liệu chu kỳ cho winddirection
         radians = np.deg2rad(df['winddirection'])
@@ -32,11 +64,13 @@ def preprocess_weather_data(input_file="data/HanoiWeatherHourly.csv",
         df.drop(columns=['winddirection'], inplace=True)
         
         # 4. Xử lý ngoại lệ (outliers)
-        for col in ['windspeed', 'radiation']:
+        bounds = {}
+        for col in CLIP_COLS:
             if col in df.columns:
-                lower = df[col].quantile(0.01)
-                upper = df[col].quantile(0.99)
+                lower = df[col].quantile(CLIP_QUANTILES[0])
+                upper = df[col].quantile(CLIP_QUANTILES[1])
                 df[col] = df[col].clip(lower, upper)
+                bounds[col] = (lower, upper)
                 print(f"   {col}: clipped [{lower:.2f}, {upper:.2f}]")
         
         # 5. Xử lý missing values
@@ -45,37 +79,34 @@ def preprocess_weather_data(input_file="data/HanoiWeatherHourly.csv",
             print(f"   Tìm thấy {missing_before} missing values")
             for col in df.columns:
                 if df[col].isnull().sum() > 0:
-                    if df[col].dtype in [np.float64, np.int64]:
-                        df[col].fillna(df[col].mean(), inplace=True)
+                    if pd.api.types.is_numeric_dtype(df[col]):
+                        df[col] = df[col].fillna(df[col].mean())
                     else:
-                        df[col].fillna(df[col].mode()[0], inplace=True)
+                        df[col] = df[col].fillna(df[col].mode()[0])
             print(f"   Đã xử lý xong")
         else:
             print(f"   Không có missing values")
         
         # 6. Chuẩn hóa các biến numerical (KHÔNG chuẩn hóa timestamp)
-        numerical_cols = ['temperature', 'humidity', 'precipitation', 
-                         'cloud_cover', 'windspeed', 'pressure_msl', 
-                         'radiation', 'wind_x', 'wind_y']
-        
         # Chỉ chuẩn hóa các cột tồn tại
-        numerical_cols = [col for col in numerical_cols if col in df.columns]
+        numerical_cols = [col for col in NUMERICAL_COLS if col in df.columns]
         
         scaler = StandardScaler()
         df[numerical_cols] = scaler.fit_transform(df[numerical_cols])
         
         print(f"   Chuẩn hóa {len(numerical_cols)} biến")
         
-        # 7. Lưu scaler 
+        # 7. Lưu scaler và transform đã fit (serving dùng lại đúng phép biến đổi này)
         if save_scaler:
-            os.makedirs('model', exist_ok=True)
-            with open('model/preprocessing_scaler.pkl', 'wb') as f:
+            os.makedirs(os.path.dirname(scaler_file) or '.', exist_ok=True)
+            with open(scaler_file, 'wb') as f:
                 pickle.dump(scaler, f)
-            print(f" Đã lưu scaler vào model/preprocessing_scaler.pkl")
+            print(f" Đã lưu scaler vào {scaler_file}")
+            transform = WeatherTransform.from_scaler(scaler, bounds, codes, numerical_cols)
+            print(f" Đã lưu transform vào {transform.save(os.path.dirname(scaler_file) or '.')}")
         
         # 8. Lưu kết quả
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        df.to_csv(output_file, index=False)
+        write_weather(df, output_file)
         
 
         
@@ -92,6 +123,171 @@ def preprocess_weather_data(input_file="data/HanoiWeatherHourly.csv",
         traceback.print_exc()
         return False
 
+class QuantileSketch:
+    """
+    Sketch quantile dạng bảng tần suất giá trị (dữ liệu Open-Meteo đã làm tròn nên ít giá trị khác nhau).
+    Khi vượt max_bins thì làm tròn bớt chữ số để giới hạn bộ nhớ, quantile khi đó là xấp xỉ.
+    Quantile nội suy tuyến tính giống pandas.
+    """
+
+    def __init__(self, max_bins=100000):
+        self.max_bins = max_bins
+        self.decimals = None
+        self.counts = pd.Series(dtype='float64')
+
+    def update(self, values):
+        values = pd.Series(values, dtype='float64').dropna()
+        if self.decimals is not None:
+            values = values.round(self.decimals)
+        self.counts = self.counts.add(values.value_counts(), fill_value=0)
+        while len(self.counts) > self.max_bins:
+            self.decimals = 6 if self.decimals is None else self.decimals - 1
+            self.counts = self.counts.groupby(self.counts.index.values.round(self.decimals)).sum()
+
+    def _sorted(self):
+        counts = self.counts.sort_index()
+        return counts.index.values, counts.values
+
+    def quantile(self, q):
+        values, counts = self._sorted()
+        cumulative = np.cumsum(counts)
+        n = int(cumulative[-1])
+        position = (n - 1) * q
+        lower = int(np.floor(position))
+        x_lower = values[np.searchsorted(cumulative, lower, side='right')]
+        x_upper = values[np.searchsorted(cumulative, min(lower + 1, n - 1), side='right')]
+        return x_lower + (position - lower) * (x_upper - x_lower)
+
+    def clipped_moments(self, lower, upper):
+        """
+        Mean / variance của dữ liệu sau khi clip [lower, upper]
+        """
+        values, counts = self._sorted()
+        values = np.clip(values, lower, upper)
+        mean = np.average(values, weights=counts)
+        return mean, np.average((values - mean) ** 2, weights=counts)
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def preprocess_weather_data_chunked(input_file="data/hourly",
+                                    output_file="data/preprocessed",
+                                    save_scaler=True,
+                                    scaler_file="model/preprocessing_scaler.pkl",
+                                    chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Tiền xử lý 2 lượt với bộ nhớ giới hạn bởi chunk_rows, cho dữ liệu lớn hơn RAM:
+      lượt 1: stream từng chunk (kèm temporal features, nối liền giữa các chunk)
+              để lấy quantile sketch cho các cột clip
+              và mean/variance (StandardScaler.partial_fit)
+      lượt 2: stream lại, biến đổi từng chunk và ghi dần ra output
+    Kết quả giống preprocess_weather_data (trừ khi sketch phải làm tròn giá trị).
+    """
+    try:
+        # Lượt 1: thống kê
+        codes = WeatherCodeVocabulary()
+        unknown = 0
+        sketches = {}
+        valid_counts = None
+        scaler = StandardScaler()
+        n_rows = 0
+        first_ts = last_ts = None
+        peak_chunk = 0
+
+        for chunk in iter_temporal_features(iter_weather(input_file, chunk_rows=chunk_rows)):
+            chunk = encode_wind(chunk)
+            numerical_cols = [col for col in NUMERICAL_COLS if col in chunk.columns]
+
+            unknown += int(np.sum(codes.indices(chunk['weathercode'].to_numpy()) < 0))
+            for col in CLIP_COLS:
+                if col in chunk.columns:
+                    sketches.setdefault(col, QuantileSketch()).update(chunk[col])
+            scaler.partial_fit(chunk[numerical_cols])
+
+            valid = chunk[numerical_cols].notna().sum().values
+            valid_counts = valid if valid_counts is None else valid_counts + valid
+            n_rows += len(chunk)
+            first_ts = chunk['timestamp'].min() if first_ts is None else min(first_ts, chunk['timestamp'].min())
+            last_ts = chunk['timestamp'].max() if last_ts is None else max(last_ts, chunk['timestamp'].max())
+            peak_chunk = max(peak_chunk, chunk.memory_usage(deep=True).sum())
+
+        if n_rows == 0:
+            raise ValueError(f"No rows in {input_file}")
+
+        print(f"Dữ liệu từ {first_ts} đến {last_ts} ({n_rows} dòng)")
+        print(f"   Tạo {len(TEMPORAL_FEATURES)} temporal features")
+        print(f"   Tạo {len(codes)} dummy variables")
+        if unknown:
+            print(f"   {unknown} dòng có weathercode ngoài từ vựng")
+
+        bounds = {}
+        for col, sketch in sketches.items():
+            lower = sketch.quantile(CLIP_QUANTILES[0])
+            upper = sketch.quantile(CLIP_QUANTILES[1])
+            bounds[col] = (lower, upper)
+            print(f"   {col}: clipped [{lower:.2f}, {upper:.2f}]")
+
+            # Thống kê chuẩn hóa phải tính trên dữ liệu đã clip
+            i = numerical_cols.index(col)
+            scaler.mean_[i], scaler.var_[i] = sketch.clipped_moments(lower, upper)
+
+        missing = n_rows * len(numerical_cols) - int(valid_counts.sum())
+        if missing > 0:
+            # Missing được điền bằng mean nên variance trên toàn bộ dòng nhỏ lại tương ứng
+            print(f"   Tìm thấy {missing} missing values, điền bằng mean")
+            scaler.var_ = scaler.var_ * valid_counts / n_rows
+        else:
+            print(f"   Không có missing values")
+        scale = np.sqrt(scaler.var_)
+        scale[scale == 0] = 1.0
+        scaler.scale_ = scale
+        scaler.n_samples_seen_ = n_rows
+        transform = WeatherTransform.from_scaler(scaler, bounds, codes, numerical_cols)
+
+        print(f"   Chuẩn hóa {len(numerical_cols)} biến")
+
+        if save_scaler:
+            os.makedirs(os.path.dirname(scaler_file) or '.', exist_ok=True)
+            with open(scaler_file, 'wb') as f:
+                pickle.dump(scaler, f)
+            print(f" Đã lưu scaler vào {scaler_file}")
+            print(f" Đã lưu transform vào {transform.save(os.path.dirname(scaler_file) or '.')}")
+
+        # Lượt 2: biến đổi và ghi dần
+        columns = None
+        with WeatherWriter(output_file) as writer:
+            for chunk in iter_temporal_features(iter_weather(input_file, chunk_rows=chunk_rows)):
+                chunk = transform.transform_frame(chunk)
+                writer.write(chunk)
+                columns = columns or list(chunk.columns)
+                peak_chunk = max(peak_chunk, chunk.memory_usage(deep=True).sum())
+
+        print(f"   Đã ghi {writer.rows} dòng vào {output_file}")
+        peak_rss = peak_memory_mb()
+        print(f"   Peak memory: chunk lớn nhất {peak_chunk / 1e6:.1f} MB"
+              + (f", RSS {peak_rss:.0f} MB" if peak_rss is not None else ""))
+
+        print("\n Các cột trong dữ liệu:")
+        for col in columns:
+            print(f"   - {col}")
+
+        return True
+
+    except Exception as e:
+        print(f" Lỗi trong quá trình tiền xử lý: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 if __name__ == "__main__":
-    success = preprocess_weather_data()
+    # python scripts/preprocessing.py [--chunk-rows=N]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    chunk_rows = int(options['chunk-rows']) if 'chunk-rows' in options else None
+    success = preprocess_weather_data(chunk_rows=chunk_rows)
     sys.exit(0 if success else 1)
\ No newline at end of file
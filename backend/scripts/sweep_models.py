@@ -0,0 +1,396 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge, Lasso
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from weather_store import read_weather
+from train_model import TARGET_FEATURES, TARGET_UNITS, CV_SPLITS, fit_target, save_artifacts
+from temporal_features import TEMPORAL_FEATURES
+
+MODEL_VERSION = 'v3.0-sweep'
+
+FAMILIES = {
+    'linear': LinearRegression,
+    'ridge': Ridge,
+    'lasso': Lasso,
+    'gbm': HistGradientBoostingRegressor,
+    'random_forest': RandomForestRegressor
+}
+
+WEATHER_FEATURES = ['pressure_msl', 'radiation', 'wind_x', 'wind_y', 'cloud_cover', 'windspeed',
+                    'w_51', 'w_53', 'w_55', 'w_61', 'w_63', 'w_65', 'w_80', 'w_81', 'w_82', 'w_95']
+
+# Lưới mặc định; có thể thay bằng --config=file.json cùng cấu trúc.
+# feature_sets: tên -> list features (dùng cho mọi target) hoặc dict target -> list features
+DEFAULT_GRID = {
+    'families': {
+        'linear': [{}],
+        'ridge': [{'alpha': 1.0}, {'alpha': 10.0}],
+        'lasso': [{'alpha': 0.001}, {'alpha': 0.01}],
+        'gbm': [
+            {'max_iter': 200, 'learning_rate': 0.1, 'max_leaf_nodes': 31},
+            {'max_iter': 400, 'learning_rate': 0.05, 'max_leaf_nodes': 15}
+        ],
+        'random_forest': [{'n_estimators': 100, 'max_depth': 12, 'min_samples_leaf': 5}]
+    },
+    'feature_sets': {
+        'baseline': TARGET_FEATURES,
+        'weather': WEATHER_FEATURES,
+        # Lag / rolling / harmonic từ preprocessing (lag của chính target được phép, giá trị hiện tại thì không)
+        'temporal': WEATHER_FEATURES + TEMPORAL_FEATURES
+    }
+}
+
+# Early stopping: sau PRUNE_AFTER_FOLDS fold, loại các config có MAE trung bình
+# tệ hơn config tốt nhất của cùng target quá PRUNE_MARGIN (luôn giữ KEEP_MIN config tốt nhất)
+PRUNE_AFTER_FOLDS = 2
+PRUNE_MARGIN = 0.2
+KEEP_MIN = 2
+
+# Giới hạn thời gian cho các vòng CV (GitHub Actions), tính bằng giây
+DEFAULT_TIME_BUDGET = 1500
+
+_shared = {}
+
+
+def init_worker(matrix_path, columns):
+    _shared['matrix'] = np.load(matrix_path, mmap_mode='r')
+    _shared['columns'] = list(columns)
+
+
+def write_fold_matrix(matrix, columns, features, fit_range, eval_range, path):
+    """
+    Chuẩn hóa các hàng [fit_range[0], eval_range[1]) của một bộ features bằng scaler fit trên phần fit
+    rồi ghi ra .npy. Process cha làm một lần cho mỗi (features, fold); mọi trial dùng chung mở bằng mmap.
+    """
+    feature_idx = [columns.index(col) for col in features]
+    block = np.ascontiguousarray(matrix[fit_range[0]:eval_range[1], feature_idx])
+    scaler = StandardScaler().fit(block[:fit_range[1] - fit_range[0]])
+    np.save(path, scaler.transform(block))
+
+
+def fold_matrices(fold_path, target, fit_range, eval_range):
+    """
+    X đã chuẩn hóa (mmap từ write_fold_matrix) và y của phần fit / eval của một fold
+    """
+    matrix = _shared['matrix']
+    target_idx = _shared['columns'].index(target)
+    scaled = np.load(fold_path, mmap_mode='r')
+    offset = fit_range[0]
+    return (scaled[:fit_range[1] - offset], np.asarray(matrix[fit_range[0]:fit_range[1], target_idx]),
+            scaled[eval_range[0] - offset:eval_range[1] - offset], np.asarray(matrix[eval_range[0]:eval_range[1], target_idx]))
+
+
+def make_estimator(family, params):
+    estimator = FAMILIES[family](**params)
+    defaults = {'random_state': 0, 'n_jobs': 1}
+    supported = estimator.get_params()
+    estimator.set_params(**{key: value for key, value in defaults.items() if key in supported and key not in params})
+    return estimator
+
+
+def run_trial(trial, fold, fold_path, fit_range, eval_range):
+    """
+    Đánh giá một config trên một fold (chạy trong process con)
+    """
+    started = time.perf_counter()
+    X_fit, y_fit, X_eval, y_eval = fold_matrices(fold_path, trial['target'], fit_range, eval_range)
+    model = make_estimator(trial['family'], trial['params'])
+    model.fit(X_fit, y_fit)
+    y_pred = model.predict(X_eval)
+    return {
+        'id': trial['id'],
+        'fold': fold,
+        'mae': float(mean_absolute_error(y_eval, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_eval, y_pred))),
+        'elapsed': time.perf_counter() - started
+    }
+
+
+def beats_existing(model_dir, results):
+    """
+    So CV MAE của các model thắng với training_results.json đang có trong model_dir
+    (thường vừa được train_model.py ghi): chỉ ghi đè khi không target nào tệ hơn
+    và ít nhất một target tốt hơn. Chưa có kết quả nào để so thì luôn ghi.
+    """
+    path = os.path.join(model_dir, 'training_results.json')
+    try:
+        with open(path) as f:
+            existing = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return True
+
+    improved = False
+    for target in TARGET_FEATURES:
+        current = existing.get(target)
+        if not isinstance(current, dict) or 'cv_mae_mean' not in current:
+            continue
+        if target not in results:
+            print(f"  {target}: no sweep winner, existing model kept")
+            return False
+        before, after = current['cv_mae_mean'], results[target]['cv_mae_mean']
+        print(f"  {target}: CV MAE {before:.4f} -> {after:.4f}")
+        if after > before:
+            return False
+        improved = improved or after < before
+    return improved
+
+
+def build_trials(grid, available_columns):
+    """
+    Tích Descartes target × feature set × (family, params); bỏ feature không có trong dữ liệu
+    và các feature set trùng nhau sau khi lọc
+    """
+    trials = []
+    for target in TARGET_FEATURES:
+        if target not in available_columns:
+            continue
+        seen = set()
+        for set_name, spec in grid['feature_sets'].items():
+            features = spec.get(target, []) if isinstance(spec, dict) else spec
+            features = [col for col in features if col in available_columns and col != target]
+            if not features or tuple(features) in seen:
+                continue
+            seen.add(tuple(features))
+            for family, param_list in grid['families'].items():
+                for params in param_list:
+                    trials.append({
+                        'id': len(trials),
+                        'target': target,
+                        'family': family,
+                        'params': params,
+                        'feature_set': set_name,
+                        'features': features
+                    })
+    return trials
+
+
+def prune(alive, scores):
+    """
+    Giữ các config chưa thua rõ ràng: MAE trung bình <= tốt nhất * (1 + PRUNE_MARGIN), tối thiểu KEEP_MIN mỗi target
+    """
+    kept = []
+    for target in {trial['target'] for trial in alive}:
+        ranked = sorted((t for t in alive if t['target'] == target),
+                        key=lambda t: np.mean([s['mae'] for s in scores[t['id']]]))
+        best = np.mean([s['mae'] for s in scores[ranked[0]['id']]])
+        for rank, trial in enumerate(ranked):
+            if rank < KEEP_MIN or np.mean([s['mae'] for s in scores[trial['id']]]) <= best * (1 + PRUNE_MARGIN):
+                kept.append(trial)
+    return sorted(kept, key=lambda t: t['id'])
+
+
+def describe(trial, scores=None):
+    params = ', '.join(f'{key}={value}' for key, value in trial['params'].items())
+    text = f"{trial['family']}({params}) [{trial['feature_set']}]"
+    if scores:
+        text += f" cv_mae={np.mean([s['mae'] for s in scores]):.4f} ({len(scores)} folds)"
+    return text
+
+
+def sweep_models(input_file='data/preprocessed', model_dir='model', grid=None, workers=None,
+                 time_budget=DEFAULT_TIME_BUDGET, max_rows=None, write=True):
+    """
+    Sweep họ model × tham số × bộ features cho từng target bằng TimeSeriesSplit:
+    mỗi vòng chạy một fold cho mọi config còn sống song song trên mọi core, sau đó loại
+    các config thua rõ ràng. Dừng vòng mới khi sắp vượt time_budget. Config tốt nhất của mỗi target
+    được fit lại trên tập train và ghi vào model_dir (pickle + bundle + training_results.json).
+    """
+    grid = grid or DEFAULT_GRID
+    started = time.perf_counter()
+    print("MODEL SWEEP (TIME SERIES)")
+
+    columns = sorted(set(TARGET_FEATURES) | {
+        col for spec in grid['feature_sets'].values()
+        for features in (spec.values() if isinstance(spec, dict) else [spec]) for col in features
+    })
+    try:
+        df = read_weather(input_file, columns=columns)
+    except FileNotFoundError:
+        print(f"  Error: Preprocessed data not found!")
+        return False
+    if max_rows:
+        df = df.iloc[-max_rows:].reset_index(drop=True)
+
+    trials = build_trials(grid, set(df.columns))
+    if not trials:
+        print("  Error: No trials to run")
+        return False
+
+    columns = sorted({col for trial in trials for col in trial['features'] + [trial['target']]})
+    n_rows = len(df)
+    n_train = int(n_rows * 0.8)
+    folds = [((int(train_idx[0]), int(train_idx[-1]) + 1), (int(val_idx[0]), int(val_idx[-1]) + 1))
+             for train_idx, val_idx in TimeSeriesSplit(n_splits=CV_SPLITS).split(np.arange(n_train))]
+    print(f"  {len(trials)} trials, {n_rows} rows, TimeSeriesSplit with {CV_SPLITS} folds, budget {time_budget}s")
+
+    shared_dir = tempfile.mkdtemp(prefix='weather_sweep_')
+    matrix_path = os.path.join(shared_dir, 'sweep.npy')
+    np.save(matrix_path, df[columns].to_numpy(dtype=np.float64))
+    del df
+    matrix = np.load(matrix_path, mmap_mode='r')
+
+    scores = {trial['id']: [] for trial in trials}
+    seconds = {trial['id']: 0.0 for trial in trials}
+    alive = list(trials)
+    pruned = 0
+    last_round = 0.0
+    executor = None
+    if workers != 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(matrix_path, columns))
+    else:
+        init_worker(matrix_path, columns)
+
+    try:
+        for fold, (fit_range, eval_range) in enumerate(folds):
+            elapsed = time.perf_counter() - started
+            if fold > 0 and elapsed + last_round > time_budget:
+                print(f"  Time budget reached after {fold} folds ({elapsed:.0f}s)")
+                break
+
+            round_started = time.perf_counter()
+            # Gom trial theo bộ features: ma trận chuẩn hóa của fold được tính một lần cho cả nhóm,
+            # nhóm sau được tính trong lúc các process con chạy trial của nhóm trước
+            groups = {}
+            for trial in alive:
+                groups.setdefault(tuple(trial['features']), []).append(trial)
+            outputs, futures, fold_paths = [], [], []
+            for i, (features, group) in enumerate(groups.items()):
+                fold_path = os.path.join(shared_dir, f'fold{fold}_{i}.npy')
+                write_fold_matrix(matrix, columns, features, fit_range, eval_range, fold_path)
+                fold_paths.append(fold_path)
+                for trial in group:
+                    if executor is None:
+                        outputs.append(run_trial(trial, fold, fold_path, fit_range, eval_range))
+                    else:
+                        futures.append(executor.submit(run_trial, trial, fold, fold_path, fit_range, eval_range))
+            outputs += [future.result() for future in futures]
+            for fold_path in fold_paths:
+                os.remove(fold_path)
+            for output in outputs:
+                scores[output['id']].append(output)
+                seconds[output['id']] += output['elapsed']
+            last_round = time.perf_counter() - round_started
+            print(f"  Fold {fold + 1}/{len(folds)}: {len(alive)} trials in {last_round:.1f}s")
+
+            if fold + 1 >= PRUNE_AFTER_FOLDS:
+                before = len(alive)
+                alive = prune(alive, scores)
+                pruned += before - len(alive)
+                if before != len(alive):
+                    print(f"    Pruned {before - len(alive)} clearly-losing configs")
+
+        # Config tốt nhất của mỗi target (trong các config còn sống, đã chạy đủ số fold như nhau)
+        winners = {}
+        for trial in alive:
+            best = winners.get(trial['target'])
+            mean = np.mean([s['mae'] for s in scores[trial['id']]])
+            if best is None or mean < np.mean([s['mae'] for s in scores[best['id']]]):
+                winners[trial['target']] = trial
+
+        # Fit lại config thắng trên tập train, đánh giá trên tập test
+        final_args = [(matrix_path, columns, target, trial['features'], (0, n_train), (n_train, n_rows),
+                       make_estimator(trial['family'], trial['params'])) for target, trial in winners.items()]
+        if executor is None:
+            finals = [fit_target(*args) for args in final_args]
+        else:
+            finals = [future.result() for future in [executor.submit(fit_target, *args) for args in final_args]]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+    models = {}
+    scalers = {}
+    results = {}
+    summary = {}
+    for (target, trial), output in zip(winners.items(), finals):
+        trial_scores = scores[trial['id']]
+        models[target] = output['model']
+        scalers[target] = output['scaler']
+        results[target] = {
+            'r2': output['r2'],
+            'mae': output['mae'],
+            'rmse': output['rmse'],
+            'cv_mae_mean': float(np.mean([s['mae'] for s in trial_scores])),
+            'cv_rmse_mean': float(np.mean([s['rmse'] for s in trial_scores])),
+            'features': trial['features'],
+            'n_samples_train': n_train,
+            'n_samples_test': n_rows - n_train
+        }
+        leaderboard = sorted((t for t in trials if t['target'] == target and scores[t['id']]),
+                             key=lambda t: (-len(scores[t['id']]), np.mean([s['mae'] for s in scores[t['id']]])))
+        summary[target] = {
+            'family': trial['family'],
+            'params': trial['params'],
+            'feature_set': trial['feature_set'],
+            'leaderboard': [
+                {
+                    'family': t['family'],
+                    'params': t['params'],
+                    'feature_set': t['feature_set'],
+                    'cv_mae_mean': float(np.mean([s['mae'] for s in scores[t['id']]])),
+                    'folds': len(scores[t['id']]),
+                    'seconds': round(seconds[t['id']], 3)
+                }
+                for t in leaderboard[:5]
+            ]
+        }
+
+    total = time.perf_counter() - started
+    print("\n" + "=" * 60)
+    print("SWEEP RESULTS")
+    print("=" * 60)
+    for target, trial in winners.items():
+        unit = TARGET_UNITS[target]
+        print(f"\n{target.upper()}: {describe(trial, scores[trial['id']])}")
+        print(f"  Test R²: {results[target]['r2']:.4f}, MAE: {results[target]['mae']:.4f}{unit}")
+    print(f"\n{len(trials)} trials, {pruned} pruned, {total:.1f}s")
+
+    if 'temperature' not in models:
+        print("  Error: No temperature model selected")
+        return False
+
+    if write and not beats_existing(model_dir, results):
+        print(f"  Sweep winners do not beat {model_dir}/training_results.json, artifacts left unchanged")
+    elif write:
+        feature_config = {target: results[target]['features'] if target in models else [] for target in TARGET_FEATURES}
+        save_artifacts(model_dir, models, scalers, feature_config, results, MODEL_VERSION, extra_results={
+            'sweep': {
+                'winners': summary,
+                'n_trials': len(trials),
+                'n_pruned': pruned,
+                'seconds': round(total, 1)
+            }
+        })
+
+    return True
+
+
+if __name__ == "__main__":
+    # python scripts/sweep_models.py [--config=grid.json] [--workers=N] [--time-budget=SECONDS] [--max-rows=N] [--dry-run]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    grid = None
+    if 'config' in options:
+        with open(options['config']) as f:
+            grid = json.load(f)
+    success = sweep_models(
+        grid=grid,
+        workers=int(options['workers']) if 'workers' in options else None,
+        time_budget=float(options.get('time-budget', DEFAULT_TIME_BUDGET)),
+        max_rows=int(options['max-rows']) if 'max-rows' in options else None,
+        write='--dry-run' not in sys.argv
+    )
+    sys.exit(0 if success else 1)
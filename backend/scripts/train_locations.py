@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from locations import load_locations, favorite_locations, LOCATION_INDEX_FILE
+from collect_data import location_data_file
+from preprocessing import preprocess_weather_data
+from train_model import train_models
+from weather_store import exists
+
+
+def train_location(location, data_dir="data/locations", model_dir="model/locations"):
+    """
+    Tiền xử lý và train model cho một vị trí, artifact lưu vào model/locations/<id>/
+    (chạy trong process con)
+    """
+    started = time.perf_counter()
+    raw_file = location_data_file(location, data_dir)
+    preprocessed_file = os.path.join(data_dir, location['id'], "preprocessed")
+    location_model_dir = os.path.join(model_dir, location['id'])
+
+    if not exists(raw_file):
+        print(f"  {location['name']}: không có dữ liệu ({raw_file})")
+        return False, 0.0
+
+    ok = preprocess_weather_data(
+        input_file=raw_file,
+        output_file=preprocessed_file,
+        scaler_file=os.path.join(location_model_dir, 'preprocessing_scaler.pkl')
+    )
+    # Đã chạy trong process con của pool: train các target tuần tự
+    ok = ok and train_models(input_file=preprocessed_file, model_dir=location_model_dir, backup=False, workers=1)
+    return ok, time.perf_counter() - started
+
+
+def train_all_locations(locations, workers=None, data_dir="data/locations", model_root="model"):
+    """
+    Train song song mỗi vị trí trong một process riêng, sau đó ghi model/locations.json
+    (index các vị trí đã train) để WeatherPredictor chọn model theo vị trí gần nhất.
+    Index được ghi sau cùng nên registry chỉ thấy các model đã train xong.
+    """
+    model_dir = os.path.join(model_root, 'locations')
+    trained = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(train_location, loc, data_dir, model_dir): loc for loc in locations}
+        for future in as_completed(futures):
+            location = futures[future]
+            try:
+                ok, elapsed = future.result()
+            except Exception as e:
+                print(f"  {location['name']}: lỗi {e}")
+                ok, elapsed = False, 0.0
+            print(f"  {location['name']} ({location['id']}): {'OK' if ok else 'FAILED'} ({elapsed:.1f}s)")
+            if ok:
+                trained.append(dict(location, model_dir=f"locations/{location['id']}"))
+
+    if not trained:
+        print("Không có vị trí nào được train")
+        return False
+
+    trained.sort(key=lambda loc: loc['id'])
+    index = {
+        'trained_at': datetime.now().isoformat(),
+        'locations': trained
+    }
+    index_path = os.path.join(model_root, LOCATION_INDEX_FILE)
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(index_path + '.tmp', index_path)
+    print(f"Đã ghi {index_path} ({len(trained)}/{len(locations)} vị trí)")
+
+    return len(trained) == len(locations)
+
+
+if __name__ == "__main__":
+    # python scripts/train_locations.py [data/locations.json|favorites] [--workers=N]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    source = args[0] if args else 'data/locations.json'
+    locations = favorite_locations() if source == 'favorites' else load_locations(source)
+    workers = int(options['workers']) if 'workers' in options else None
+    success = train_all_locations(locations, workers=workers)
+    sys.exit(0 if success else 1)
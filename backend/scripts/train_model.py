@@ -12,269 +12,104 @@ import matplotlib.pyplot as plt
 import os
 import sys
 import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-# Tạo thư mục model nếu chưa có
-if not os.path.exists('model'):
-    os.makedirs('model')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_bundle import save_bundle
+from weather_store import read_weather
 
-print("TRAINING WEATHER PREDICTION MODELS (TIME SERIES)")
-
-try:
-    input_file = 'data/weather_preprocessed.csv'
-    df = pd.read_csv(input_file)
-    
-    # Đảm bảo dữ liệu được sắp xếp theo thời gian
-    if 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp').reset_index(drop=True)
-except FileNotFoundError:
-    print(f"  Error: Preprocessed data not found!")
-    sys.exit(1)
-
-# 2. Định nghĩa features cho từng mô hình 
-temp_features = ['pressure_msl', 'radiation', 'wind_y']
-humidity_features = ['radiation', 'w_51', 'w_53', 'w_61', 'w_63']
-precip_features = ['w_63', 'w_65', 'w_61']
-all_features = list(set(temp_features + humidity_features + precip_features))
-missing_cols = [col for col in all_features if col not in df.columns]
-if missing_cols:
-    print(f"  Warning: Missing columns: {missing_cols}")
-
-# 3. Backup model cũ nếu có (CHỈ CHO GITHUB ACTIONS)
-if os.path.exists('model/all_models.pkl'):
-    shutil.copy('model/all_models.pkl', 'model/all_models_backup.pkl')
-    print("  Previous models backed up")
-if os.path.exists('model/training_results.json'):
-    shutil.copy('model/training_results.json', 'model/training_results_previous.json')
-    print("  Previous results backed up")
-else:
-    print("  No previous models found (first run)")
-
-# 4. Chuẩn bị dữ liệu 
-split_idx = int(len(df) * 0.8)
-train_df = df.iloc[:split_idx]
-test_df = df.iloc[split_idx:]
-
-# 5. Time Series Cross-Validation Setup 
-tscv = TimeSeriesSplit(n_splits=5)
-print(f"  Using TimeSeriesSplit with 5 folds")
-
-# 6. Train các mô hình 
-models = {}
-scalers = {}
-results = {}
-
-# MÔ HÌNH DỰ BÁO NHIỆT ĐỘ  
-X_train_temp = train_df[temp_features]
-y_train_temp = train_df['temperature']
-X_test_temp = test_df[temp_features]
-y_test_temp = test_df['temperature']
-
-scaler_temp = StandardScaler()
-X_train_temp_scaled = scaler_temp.fit_transform(X_train_temp)
-X_test_temp_scaled = scaler_temp.transform(X_test_temp)
-
-cv_scores_temp = []
-model_temp = LinearRegression()
-
-for fold, (train_idx, val_idx) in enumerate(tscv.split(X_train_temp_scaled)):
-    X_cv_train = X_train_temp_scaled[train_idx]
-    y_cv_train = y_train_temp.iloc[train_idx]
-    X_cv_val = X_train_temp_scaled[val_idx]
-    y_cv_val = y_train_temp.iloc[val_idx]
-    
-    model_temp.fit(X_cv_train, y_cv_train)
-    y_pred_cv = model_temp.predict(X_cv_val)
-    
-    mae_cv = mean_absolute_error(y_cv_val, y_pred_cv)
-    rmse_cv = np.sqrt(mean_squared_error(y_cv_val, y_pred_cv))
-    cv_scores_temp.append({'mae': mae_cv, 'rmse': rmse_cv})
-
-model_temp.fit(X_train_temp_scaled, y_train_temp)
-
-y_pred_temp = model_temp.predict(X_test_temp_scaled)
-r2_temp = r2_score(y_test_temp, y_pred_temp)
-mae_temp = mean_absolute_error(y_test_temp, y_pred_temp)
-rmse_temp = np.sqrt(mean_squared_error(y_test_temp, y_pred_temp))
-
-models['temperature'] = model_temp
-scalers['temperature'] = scaler_temp
-results['temperature'] = {
-    'r2': float(r2_temp),
-    'mae': float(mae_temp),
-    'rmse': float(rmse_temp),
-    'cv_mae_mean': float(np.mean([s['mae'] for s in cv_scores_temp])),
-    'cv_rmse_mean': float(np.mean([s['rmse'] for s in cv_scores_temp])),
-    'features': temp_features,
-    'n_samples_train': len(train_df),
-    'n_samples_test': len(test_df),
-    # Lưu residuals cho visualization
-    'residuals': (y_test_temp - y_pred_temp).tolist(),
-    'predictions': y_pred_temp.tolist(),
-    'actual': y_test_temp.tolist()
+# Features cho từng mô hình
+TARGET_FEATURES = {
+    'temperature': ['pressure_msl', 'radiation', 'wind_y'],
+    'humidity': ['radiation', 'w_51', 'w_53', 'w_61', 'w_63'],
+    'precipitation': ['w_63', 'w_65', 'w_61']
 }
-
-print(f"      R² Score: {r2_temp:.4f}")
-print(f"      MAE: {mae_temp:.4f}°C")
-print(f"      RMSE: {rmse_temp:.4f}°C")
-print(f"      CV MAE: {np.mean([s['mae'] for s in cv_scores_temp]):.4f}°C")
-
-#  MÔ HÌNH DỰ BÁO ĐỘ ẨM 
-available_humidity_features = [f for f in humidity_features if f in df.columns]
-if len(available_humidity_features) < len(humidity_features):
-    print(f"      Warning: Using available features only: {available_humidity_features}")
-
-if len(available_humidity_features) > 0 and 'humidity' in df.columns:
-    X_train_hum = train_df[available_humidity_features]
-    y_train_hum = train_df['humidity']
-    X_test_hum = test_df[available_humidity_features]
-    y_test_hum = test_df['humidity']
-
-    scaler_hum = StandardScaler()
-    X_train_hum_scaled = scaler_hum.fit_transform(X_train_hum)
-    X_test_hum_scaled = scaler_hum.transform(X_test_hum)
-
-    model_hum = LinearRegression()
-    model_hum.fit(X_train_hum_scaled, y_train_hum)
-
-    y_pred_hum = model_hum.predict(X_test_hum_scaled)
-    r2_hum = r2_score(y_test_hum, y_pred_hum)
-    mae_hum = mean_absolute_error(y_test_hum, y_pred_hum)
-    rmse_hum = np.sqrt(mean_squared_error(y_test_hum, y_pred_hum))
-
-    models['humidity'] = model_hum
-    scalers['humidity'] = scaler_hum
-    results['humidity'] = {
-        'r2': float(r2_hum),
-        'mae': float(mae_hum),
-        'rmse': float(rmse_hum),
-        'features': available_humidity_features
-    }
-
-    print(f"      R² Score: {r2_hum:.4f}")
-    print(f"      MAE: {mae_hum:.4f}%")
-    print(f"      RMSE: {rmse_hum:.4f}%")
-else:
-    print("      Skipped: Missing required features or target")
-
-#  MÔ HÌNH DỰ BÁO LƯỢNG MƯA
-available_precip_features = [f for f in precip_features if f in df.columns]
-if len(available_precip_features) < len(precip_features):
-    print(f"      Warning: Using available features only: {available_precip_features}")
-
-if len(available_precip_features) > 0 and 'precipitation' in df.columns:
-    X_train_prec = train_df[available_precip_features]
-    y_train_prec = train_df['precipitation']
-    X_test_prec = test_df[available_precip_features]
-    y_test_prec = test_df['precipitation']
-
-    scaler_prec = StandardScaler()
-    X_train_prec_scaled = scaler_prec.fit_transform(X_train_prec)
-    X_test_prec_scaled = scaler_prec.transform(X_test_prec)
-
-    model_prec = LinearRegression()
-    model_prec.fit(X_train_prec_scaled, y_train_prec)
-
-    y_pred_prec = model_prec.predict(X_test_prec_scaled)
-    r2_prec = r2_score(y_test_prec, y_pred_prec)
-    mae_prec = mean_absolute_error(y_test_prec, y_pred_prec)
-    rmse_prec = np.sqrt(mean_squared_error(y_test_prec, y_pred_prec))
-
-    models['precipitation'] = model_prec
-    scalers['precipitation'] = scaler_prec
-    results['precipitation'] = {
-        'r2': float(r2_prec),
-        'mae': float(mae_prec),
-        'rmse': float(rmse_prec),
-        'features': available_precip_features
+TARGET_UNITS = {'temperature': '°C', 'humidity': '%', 'precipitation': 'mm'}
+
+# Các cột cần đọc từ dữ liệu đã tiền xử lý (features + targets)
+TRAINING_COLUMNS = sorted(set(TARGET_FEATURES) | {f for features in TARGET_FEATURES.values() for f in features})
+
+CV_SPLITS = 5
+MODEL_VERSION = 'v2.0-timeseries'
+
+def fit_target(matrix_path, columns, target, features, fit_range, eval_range, estimator=None):
+    """
+    Một task training (chạy trong process con): fit scaler + estimator (mặc định LinearRegression)
+    trên các dòng fit_range và đánh giá trên eval_range. Ma trận dữ liệu được đọc qua memmap, chỉ các dòng/cột cần mới được copy.
+    """
+    started = time.perf_counter()
+    matrix = np.load(matrix_path, mmap_mode='r')
+    feature_idx = [columns.index(col) for col in features]
+    target_idx = columns.index(target)
+
+    X_fit = matrix[fit_range[0]:fit_range[1], feature_idx]
+    y_fit = np.asarray(matrix[fit_range[0]:fit_range[1], target_idx])
+    X_eval = matrix[eval_range[0]:eval_range[1], feature_idx]
+    y_eval = np.asarray(matrix[eval_range[0]:eval_range[1], target_idx])
+
+    scaler = StandardScaler()
+    model = estimator if estimator is not None else LinearRegression()
+    model.fit(scaler.fit_transform(X_fit), y_fit)
+    y_pred = model.predict(scaler.transform(X_eval))
+
+    return {
+        'model': model,
+        'scaler': scaler,
+        'r2': float(r2_score(y_eval, y_pred)),
+        'mae': float(mean_absolute_error(y_eval, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_eval, y_pred))),
+        'predictions': y_pred,
+        'actual': y_eval,
+        'elapsed': time.perf_counter() - started
     }
 
-    print(f"      R² Score: {r2_prec:.4f}")
-    print(f"      MAE: {mae_prec:.4f}mm")
-    print(f"      RMSE: {rmse_prec:.4f}mm")
-else:
-    print("      Skipped: Missing required features or target")
-
-# 7. Residual Analysis 
-
-try:
-    plt.figure(figsize=(15, 10))
-    
-    # Temperature Residuals
-    residuals = np.array(results['temperature']['residuals'])
-    predictions = np.array(results['temperature']['predictions'])
-    actual = np.array(results['temperature']['actual'])
-    
-    plt.subplot(3, 3, 1)
-    plt.scatter(predictions, residuals, alpha=0.5, s=10)
-    plt.axhline(y=0, color='r', linestyle='--', lw=2)
-    plt.xlabel('Predicted Temperature (°C)')
-    plt.ylabel('Residuals (°C)')
-    plt.title('Temperature: Residuals vs Predicted')
-    plt.grid(True, alpha=0.3)
-    
-    plt.subplot(3, 3, 2)
-    plt.scatter(range(len(residuals)), residuals, alpha=0.5, s=10)
-    plt.axhline(y=0, color='r', linestyle='--', lw=2)
-    plt.xlabel('Time Index')
-    plt.ylabel('Residuals (°C)')
-    plt.title('Temperature: Residuals Over Time')
-    plt.grid(True, alpha=0.3)
-    
-    plt.subplot(3, 3, 3)
-    plt.hist(residuals, bins=50, alpha=0.7, edgecolor='black')
-    plt.xlabel('Residuals (°C)')
-    plt.ylabel('Frequency')
-    plt.title('Temperature: Residual Distribution')
-    plt.grid(True, alpha=0.3)
-    
-    plt.subplot(3, 3, 5)
-    plt.scatter(actual, predictions, alpha=0.5, s=10)
-    min_val = min(actual.min(), predictions.min())
-    max_val = max(actual.max(), predictions.max())
-    plt.plot([min_val, max_val], [min_val, max_val], 'r--', lw=2)
-    plt.xlabel('Actual Temperature (°C)')
-    plt.ylabel('Predicted Temperature (°C)')
-    plt.title(f'Temperature: Actual vs Predicted (R²={r2_temp:.4f})')
-    plt.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plt.savefig('model/residual_analysis.png', dpi=150, bbox_inches='tight')
-    print("  Residual analysis saved to: model/residual_analysis.png")
-except Exception as e:
-    print(f"  Warning: Could not create residual plots: {e}")
-
-# 8. Save models 
-
-# Save temperature model 
-with open('model/weather_model.pkl', 'wb') as f:
-    pickle.dump(models['temperature'], f)
-with open('model/scaler.pkl', 'wb') as f:
-    pickle.dump(scalers['temperature'], f)
-print("  Main temperature model saved to: model/weather_model.pkl")
-
-# Save all models
-with open('model/all_models.pkl', 'wb') as f:
-    pickle.dump(models, f)
-with open('model/all_scalers.pkl', 'wb') as f:
-    pickle.dump(scalers, f)
-print("  All models saved to: model/all_models.pkl")
-
-# Save feature names
-feature_config = {
-    'temperature': temp_features,
-    'humidity': available_humidity_features if 'humidity' in models else [],
-    'precipitation': available_precip_features if 'precipitation' in models else []
-}
-with open('model/feature_config.pkl', 'wb') as f:
-    pickle.dump(feature_config, f)
-print("  Feature configuration saved")
-
-# Lưu kết quả dưới dạng JSON 
-results_for_json = {}
-for key, value in results.items():
-    if key == 'temperature':
+def run_training_tasks(tasks, matrix_path, columns, workers=None):
+    """
+    Chạy các task (target, kind, features, fit_range, eval_range) trong process pool,
+    trả về kết quả theo đúng thứ tự tasks. workers=1 thì chạy tuần tự trong process hiện tại
+    (vd. khi đã nằm trong một process con của train_locations).
+    """
+    if workers == 1:
+        return [fit_target(matrix_path, columns, target, features, fit_range, eval_range)
+                for target, _, features, fit_range, eval_range in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fit_target, matrix_path, columns, target, features, fit_range, eval_range)
+                   for target, _, features, fit_range, eval_range in tasks]
+        return [future.result() for future in futures]
+
+def save_artifacts(model_dir, models, scalers, feature_config, results, model_version, extra_results=None):
+    """
+    Ghi artifact của một lần train: pickle (tương thích ngược), bundle và training_results.json.
+    Dùng chung cho train_models và scripts/sweep_models.py.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+
+    # Save temperature model 
+    with open(os.path.join(model_dir, 'weather_model.pkl'), 'wb') as f:
+        pickle.dump(models['temperature'], f)
+    with open(os.path.join(model_dir, 'scaler.pkl'), 'wb') as f:
+        pickle.dump(scalers['temperature'], f)
+    print(f"  Main temperature model saved to: {model_dir}/weather_model.pkl")
+
+    # Save all models
+    with open(os.path.join(model_dir, 'all_models.pkl'), 'wb') as f:
+        pickle.dump(models, f)
+    with open(os.path.join(model_dir, 'all_scalers.pkl'), 'wb') as f:
+        pickle.dump(scalers, f)
+    print(f"  All models saved to: {model_dir}/all_models.pkl")
+
+    # Save feature names
+    with open(os.path.join(model_dir, 'feature_config.pkl'), 'wb') as f:
+        pickle.dump(feature_config, f)
+    print("  Feature configuration saved")
+
+    # Lưu kết quả dưới dạng JSON 
+    results_for_json = {}
+    for key, value in results.items():
         # Chỉ lưu metrics, không lưu arrays lớn vào JSON
         results_for_json[key] = {
             'r2': value['r2'],
@@ -284,45 +119,231 @@ for key, value in results.items():
             'cv_rmse_mean': value['cv_rmse_mean'],
             'features': value['features'],
             'n_samples_train': value['n_samples_train'],
-            'n_samples_test': value['n_samples_test']
+            'n_samples_test': value['n_samples_test'],
+            'estimator': type(models[key]).__name__
         }
-    else:
-        results_for_json[key] = value
-
-results_for_json['training_date'] = datetime.now().isoformat()
-results_for_json['model_version'] = 'v2.0-timeseries'
-
-with open('model/training_results.json', 'w') as f:
-    json.dump(results_for_json, f, indent=2)
-print("  Training results saved to JSON")
-
-# 9. Summary Report 
-print("\n" + "=" * 60)
-print("MODEL PERFORMANCE SUMMARY")
-print("=" * 60)
-
-print("\nTEMPERATURE MODEL:")
-print(f"  R² Score: {results['temperature']['r2']:.4f}")
-print(f"  MAE: {results['temperature']['mae']:.4f}°C")
-print(f"  RMSE: {results['temperature']['rmse']:.4f}°C")
-print(f"  Cross-Validation MAE: {results['temperature']['cv_mae_mean']:.4f}°C")
-print(f"  Features: {temp_features}")
-
-if 'humidity' in results:
-    print("\nHUMIDITY MODEL:")
-    print(f"  R² Score: {results['humidity']['r2']:.4f}")
-    print(f"  MAE: {results['humidity']['mae']:.4f}%")
-    print(f"  RMSE: {results['humidity']['rmse']:.4f}%")
-    print(f"  Features: {results['humidity']['features']}")
-
-if 'precipitation' in results:
-    print("\nPRECIPITATION MODEL:")
-    print(f"  R² Score: {results['precipitation']['r2']:.4f}")
-    print(f"  MAE: {results['precipitation']['mae']:.4f}mm")
-    print(f"  RMSE: {results['precipitation']['rmse']:.4f}mm")
-    print(f"  Features: {results['precipitation']['features']}")
-
-print("\nMODEL TRAINING COMPLETED SUCCESSFULLY!")
-print("=" * 60)
-
-sys.exit(0)
\ No newline at end of file
+    results_for_json.update(extra_results or {})
+
+    results_for_json['training_date'] = datetime.now().isoformat()
+    results_for_json['model_version'] = model_version
+    results_for_json['cv_splits'] = CV_SPLITS
+
+    # Save model bundle (mmap-able, serving ưu tiên bundle, pickle là fallback), kèm metrics
+    metrics = {
+        'training_date': results_for_json['training_date'],
+        'cv_splits': CV_SPLITS,
+        'targets': {target: results_for_json[target] for target in results}
+    }
+    try:
+        manifest = save_bundle(model_dir, models, scalers, feature_config, model_version=model_version, metrics=metrics)
+        print(f"  Model bundle saved to: {model_dir}/weather_bundle.bin ({manifest['size']} bytes)")
+    except ValueError as e:
+        print(f"  Warning: Could not create model bundle: {e}")
+
+    with open(os.path.join(model_dir, 'training_results.json'), 'w') as f:
+        json.dump(results_for_json, f, indent=2)
+    print("  Training results saved to JSON")
+
+def train_models(input_file='data/preprocessed', model_dir='model', backup=True, workers=None):
+    """
+    Train các mô hình nhiệt độ, độ ẩm, lượng mưa từ dữ liệu đã tiền xử lý
+    và lưu artifact (pickle + bundle + training_results.json) vào model_dir.
+    Mỗi target × fold CV là một task độc lập chạy song song (workers process).
+    """
+    # Tạo thư mục model nếu chưa có
+    if not os.path.exists(model_dir):
+        os.makedirs(model_dir)
+
+    print("TRAINING WEATHER PREDICTION MODELS (TIME SERIES)")
+
+    try:
+        df = read_weather(input_file, columns=TRAINING_COLUMNS)
+    
+        # Đảm bảo dữ liệu được sắp xếp theo thời gian
+        if 'timestamp' in df.columns:
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            df = df.sort_values('timestamp').reset_index(drop=True)
+    except FileNotFoundError:
+        print(f"  Error: Preprocessed data not found!")
+        return False
+
+    # 2. Kiểm tra các features cho từng mô hình 
+    all_features = sorted({f for features in TARGET_FEATURES.values() for f in features})
+    missing_cols = [col for col in all_features if col not in df.columns]
+    if missing_cols:
+        print(f"  Warning: Missing columns: {missing_cols}")
+
+    # 3. Backup model cũ nếu có (CHỈ CHO GITHUB ACTIONS)
+    if backup:
+        if os.path.exists(os.path.join(model_dir, 'all_models.pkl')):
+            shutil.copy(os.path.join(model_dir, 'all_models.pkl'), os.path.join(model_dir, 'all_models_backup.pkl'))
+            print("  Previous models backed up")
+        if os.path.exists(os.path.join(model_dir, 'training_results.json')):
+            shutil.copy(os.path.join(model_dir, 'training_results.json'),
+                        os.path.join(model_dir, 'training_results_previous.json'))
+            print("  Previous results backed up")
+        else:
+            print("  No previous models found (first run)")
+
+    # 4. Chuẩn bị dữ liệu: ghi ma trận features + targets ra file .npy để các process
+    #    con đọc qua memmap (dùng chung page cache, không copy DataFrame sang từng process)
+    split_idx = int(len(df) * 0.8)
+    n_train = split_idx
+    n_test = len(df) - split_idx
+
+    target_features = {}
+    for target, features in TARGET_FEATURES.items():
+        available = [f for f in features if f in df.columns]
+        if len(available) < len(features):
+            print(f"      Warning: {target} using available features only: {available}")
+        if not available or target not in df.columns:
+            print(f"      Skipped {target}: Missing required features or target")
+            continue
+        target_features[target] = available
+
+    matrix_columns = sorted({col for target, features in target_features.items() for col in features + [target]})
+    shared_dir = tempfile.mkdtemp(prefix='weather_train_')
+    matrix_path = os.path.join(shared_dir, 'training.npy')
+    np.save(matrix_path, df[matrix_columns].to_numpy(dtype=np.float64))
+    del df
+
+    # 5. Time Series Cross-Validation Setup: mỗi (target, fold) và model cuối là một task độc lập
+    tscv = TimeSeriesSplit(n_splits=CV_SPLITS)
+    print(f"  Using TimeSeriesSplit with {CV_SPLITS} folds")
+    folds = [((int(train_idx[0]), int(train_idx[-1]) + 1), (int(val_idx[0]), int(val_idx[-1]) + 1))
+             for train_idx, val_idx in tscv.split(np.arange(n_train))]
+
+    tasks = []
+    for target, features in target_features.items():
+        for fold, (fit_range, eval_range) in enumerate(folds):
+            tasks.append((target, f'fold {fold + 1}', features, fit_range, eval_range))
+        tasks.append((target, 'final', features, (0, n_train), (n_train, n_train + n_test)))
+
+    # 6. Train các mô hình song song
+    models = {}
+    scalers = {}
+    results = {}
+    cv_scores = {target: [] for target in target_features}
+    started = time.perf_counter()
+
+    try:
+        outputs = run_training_tasks(tasks, matrix_path, matrix_columns, workers)
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+    for (target, kind, features, _, _), output in zip(tasks, outputs):
+        print(f"    {target} {kind}: {output['elapsed']:.3f}s")
+        if kind != 'final':
+            cv_scores[target].append(output)
+            continue
+        models[target] = output['model']
+        scalers[target] = output['scaler']
+        results[target] = {
+            'r2': output['r2'],
+            'mae': output['mae'],
+            'rmse': output['rmse'],
+            'features': features,
+            'n_samples_train': n_train,
+            'n_samples_test': n_test,
+            # Lưu residuals cho visualization
+            'residuals': (output['actual'] - output['predictions']).tolist(),
+            'predictions': output['predictions'].tolist(),
+            'actual': output['actual'].tolist()
+        }
+
+    print(f"  Trained {len(tasks)} tasks in {time.perf_counter() - started:.2f}s")
+
+    if 'temperature' not in models:
+        print("  Error: Temperature model could not be trained")
+        return False
+
+    for target, result in results.items():
+        result['cv_mae_mean'] = float(np.mean([s['mae'] for s in cv_scores[target]]))
+        result['cv_rmse_mean'] = float(np.mean([s['rmse'] for s in cv_scores[target]]))
+        unit = TARGET_UNITS[target]
+        print(f"  {target.upper()}:")
+        print(f"      R² Score: {result['r2']:.4f}")
+        print(f"      MAE: {result['mae']:.4f}{unit}")
+        print(f"      RMSE: {result['rmse']:.4f}{unit}")
+        print(f"      CV MAE: {result['cv_mae_mean']:.4f}{unit}")
+
+    # 7. Residual Analysis 
+
+    try:
+        plt.figure(figsize=(15, 10))
+    
+        # Temperature Residuals
+        residuals = np.array(results['temperature']['residuals'])
+        predictions = np.array(results['temperature']['predictions'])
+        actual = np.array(results['temperature']['actual'])
+    
+        plt.subplot(3, 3, 1)
+        plt.scatter(predictions, residuals, alpha=0.5, s=10)
+        plt.axhline(y=0, color='r', linestyle='--', lw=2)
+        plt.xlabel('Predicted Temperature (°C)')
+        plt.ylabel('Residuals (°C)')
+        plt.title('Temperature: Residuals vs Predicted')
+        plt.grid(True, alpha=0.3)
+    
+        plt.subplot(3, 3, 2)
+        plt.scatter(range(len(residuals)), residuals, alpha=0.5, s=10)
+        plt.axhline(y=0, color='r', linestyle='--', lw=2)
+        plt.xlabel('Time Index')
+        plt.ylabel('Residuals (°C)')
+        plt.title('Temperature: Residuals Over Time')
+        plt.grid(True, alpha=0.3)
+    
+        plt.subplot(3, 3, 3)
+        plt.hist(residuals, bins=50, alpha=0.7, edgecolor='black')
+        plt.xlabel('Residuals (°C)')
+        plt.ylabel('Frequency')
+        plt.title('Temperature: Residual Distribution')
+        plt.grid(True, alpha=0.3)
+    
+        plt.subplot(3, 3, 5)
+        plt.scatter(actual, predictions, alpha=0.5, s=10)
+        min_val = min(actual.min(), predictions.min())
+        max_val = max(actual.max(), predictions.max())
+        plt.plot([min_val, max_val], [min_val, max_val], 'r--', lw=2)
+        plt.xlabel('Actual Temperature (°C)')
+        plt.ylabel('Predicted Temperature (°C)')
+        plt.title(f"Temperature: Actual vs Predicted (R²={results['temperature']['r2']:.4f})")
+        plt.grid(True, alpha=0.3)
+    
+        plt.tight_layout()
+        plt.savefig(os.path.join(model_dir, 'residual_analysis.png'), dpi=150, bbox_inches='tight')
+        print(f"  Residual analysis saved to: {model_dir}/residual_analysis.png")
+    except Exception as e:
+        print(f"  Warning: Could not create residual plots: {e}")
+
+    # 8. Save models 
+    feature_config = {target: target_features.get(target, []) if target in models else []
+                      for target in TARGET_FEATURES}
+    save_artifacts(model_dir, models, scalers, feature_config, results, MODEL_VERSION)
+
+    # 9. Summary Report 
+    print("\n" + "=" * 60)
+    print("MODEL PERFORMANCE SUMMARY")
+    print("=" * 60)
+
+    for target, result in results.items():
+        unit = TARGET_UNITS[target]
+        print(f"\n{target.upper()} MODEL:")
+        print(f"  R² Score: {result['r2']:.4f}")
+        print(f"  MAE: {result['mae']:.4f}{unit}")
+        print(f"  RMSE: {result['rmse']:.4f}{unit}")
+        print(f"  Cross-Validation MAE: {result['cv_mae_mean']:.4f}{unit}")
+        print(f"  Features: {result['features']}")
+
+    print("\nMODEL TRAINING COMPLETED SUCCESSFULLY!")
+    print("=" * 60)
+
+    return True
+
+
+if __name__ == "__main__":
+    # python scripts/train_model.py [--workers=N]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    workers = int(options['workers']) if 'workers' in options else None
+    success = train_models(workers=workers)
+    sys.exit(0 if success else 1)
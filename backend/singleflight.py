@@ -0,0 +1,58 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi đồng thời có cùng key: chỉ một thread (leader) thực sự gọi upstream,
+    các thread còn lại chờ và dùng chung kết quả (hoặc exception) của lần gọi đó.
+    Kết quả được chia sẻ giữa các thread nên không được sửa trực tiếp.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'shared': self.shared,
+                'in_flight': len(self._calls)
+            }
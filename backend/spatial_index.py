@@ -0,0 +1,135 @@
+import math
+import threading
+
+import numpy as np
+
+from locations import EARTH_RADIUS_KM, haversine_km
+
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Gần cực thì một độ kinh tuyến rất ngắn: quét mọi ô kinh độ trong dải vĩ độ
+POLAR_LATITUDE = 89.0
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Haversine cho một cặp điểm (nhanh hơn bản numpy khi chỉ có vài ứng viên)
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """
+    Chỉ mục không gian theo ô lưới cell_km x cell_km (kiểu geohash bucket):
+    query trong bán kính chỉ xét các ô giao với bán kính đó, khoảng cách thật tính bằng haversine.
+    Thêm / xoá O(1), thread-safe; dùng cho điểm trong forecast cache và vị trí đã train model.
+    """
+    def __init__(self, cell_km=10.0):
+        self.cell_deg = float(cell_km) / KM_PER_DEGREE
+        # Độ rộng ô kinh độ chia đều 360° để ô cuối nối liền ô đầu qua kinh tuyến 180
+        self.n_lon_cells = math.ceil(360 / self.cell_deg)
+        self.lon_cell_deg = 360 / self.n_lon_cells
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, lat, lon):
+        i = math.floor((lat + 90) / self.cell_deg)
+        j = math.floor(((lon + 180) % 360) / self.lon_cell_deg) % self.n_lon_cells
+        return i, j
+
+    def insert(self, key, lat, lon, item=None):
+        """
+        Thêm (hoặc cập nhật) một điểm; item mặc định là chính key
+        """
+        lat, lon = float(lat), float(lon)
+        point = (lat, lon, key if item is None else item)
+        cell = self._cell(lat, lon)
+        with self._lock:
+            self._discard(key)
+            self._cells.setdefault(cell, {})[key] = point
+            self._points[key] = cell
+
+    def remove(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        cell = self._points.pop(key, None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def _candidates(self, lat, lon, radius_km):
+        dlat = radius_km / KM_PER_DEGREE
+        i_min, _ = self._cell(max(lat - dlat, -90.0), lon)
+        i_max, _ = self._cell(min(lat + dlat, 90.0), lon)
+
+        if abs(lat) + dlat >= POLAR_LATITUDE:
+            dlon = 180.0
+        else:
+            dlon = dlat / math.cos(math.radians(abs(lat) + dlat))
+        span = self.n_lon_cells
+        if dlon < 180.0:
+            span = math.floor((lon + dlon + 180) / self.lon_cell_deg) - math.floor((lon - dlon + 180) / self.lon_cell_deg) + 1
+        # Bán kính phủ nhiều ô hơn số ô đang có điểm thì duyệt thẳng các ô có điểm
+        if span >= self.n_lon_cells or (i_max - i_min + 1) * span > len(self._cells):
+            cells = [cell for cell in self._cells if i_min <= cell[0] <= i_max]
+        else:
+            _, j_min = self._cell(lat, lon - dlon)
+            js = {(j_min + k) % self.n_lon_cells for k in range(span)}
+            cells = [(i, j) for i in range(i_min, i_max + 1) for j in js]
+
+        for cell in cells:
+            yield from self._cells.get(cell, {}).values()
+
+    def within(self, lat, lon, radius_km):
+        """
+        Các (item, km) trong bán kính radius_km, gần nhất trước
+        """
+        lat, lon = float(lat), float(lon)
+        with self._lock:
+            candidates = list(self._candidates(lat, lon, radius_km))
+        found = []
+        for p_lat, p_lon, item in candidates:
+            km = distance_km(lat, lon, p_lat, p_lon)
+            if km <= radius_km:
+                found.append((item, km))
+        found.sort(key=lambda pair: pair[1])
+        return found
+
+    def nearest(self, lat, lon, max_km=None):
+        """
+        Điểm gần nhất (item, km), hoặc (None, None) nếu không có điểm nào trong max_km.
+        max_km=None thì xét toàn bộ chỉ mục.
+        """
+        lat, lon = float(lat), float(lon)
+        if max_km is not None:
+            found = self.within(lat, lon, max_km)
+            return found[0] if found else (None, None)
+
+        with self._lock:
+            points = [point for bucket in self._cells.values() for point in bucket.values()]
+        if not points:
+            return None, None
+        lats = np.array([p[0] for p in points])
+        lons = np.array([p[1] for p in points])
+        distances = haversine_km(lat, lon, lats, lons)
+        i = int(np.argmin(distances))
+        return points[i][2], float(distances[i])
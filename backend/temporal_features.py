@@ -0,0 +1,327 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from forecast_cache import snap_to_grid
+
+
+# Biến gốc dùng để tạo lag / rolling (tự tương quan mạnh, xem create_lag_plots trong data/diagram.py)
+TEMPORAL_SOURCES = ['temperature', 'humidity', 'pressure_msl']
+LAGS = (1, 2, 3, 24)
+ROLLING_WINDOWS = (6, 24)
+HARMONIC_FEATURES = ['hour_sin', 'hour_cos', 'doy_sin', 'doy_cos']
+
+# Số giờ lịch sử cần giữ cho lag / cửa sổ dài nhất
+HISTORY_HOURS = max(LAGS + ROLLING_WINDOWS)
+
+# Tên biến hourly của Open-Meteo -> tên cột trong dữ liệu train
+OPEN_METEO_SOURCES = {
+    'temperature_2m': 'temperature',
+    'relative_humidity_2m': 'humidity',
+    'pressure_msl': 'pressure_msl'
+}
+
+
+def lag_name(col, lag):
+    return f'{col}_lag{lag}'
+
+
+def rolling_names(col, window):
+    return f'{col}_roll{window}_mean', f'{col}_roll{window}_std'
+
+
+def temporal_feature_names(sources=None):
+    names = []
+    for col in (sources if sources is not None else TEMPORAL_SOURCES):
+        names += [lag_name(col, lag) for lag in LAGS]
+        for window in ROLLING_WINDOWS:
+            names += rolling_names(col, window)
+    return names + HARMONIC_FEATURES
+
+
+TEMPORAL_FEATURES = temporal_feature_names()
+
+
+def to_hours(timestamps):
+    """
+    Timestamp (giờ địa phương, không timezone) -> số giờ kể từ epoch (int64), làm tròn xuống theo giờ
+    """
+    values = np.asarray(timestamps)
+    if values.dtype.kind == 'U':
+        values = values.astype('datetime64[m]')
+    elif values.dtype.kind != 'M':
+        values = pd.to_datetime(values).to_numpy()
+    return values.astype('datetime64[h]').astype(np.int64)
+
+
+def harmonic_features(hours):
+    """
+    sin/cos theo chu kỳ ngày (24h) và chu kỳ năm (365.25 ngày)
+    """
+    hours = np.asarray(hours, dtype=np.int64)
+    stamps = hours.astype('datetime64[h]')
+    hour_of_day = hours % 24
+    day_of_year = (stamps.astype('datetime64[D]') - stamps.astype('datetime64[Y]')).astype(np.int64)
+    diurnal = 2 * np.pi * hour_of_day / 24
+    seasonal = 2 * np.pi * (day_of_year + hour_of_day / 24) / 365.25
+    return {
+        'hour_sin': np.sin(diurnal),
+        'hour_cos': np.cos(diurnal),
+        'doy_sin': np.sin(seasonal),
+        'doy_cos': np.cos(seasonal)
+    }
+
+
+def window_moments(sums, sumsq, counts):
+    """
+    Mean / std (ddof=0) từ tổng, tổng bình phương và số quan sát hợp lệ; NaN nếu cửa sổ trống
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / counts
+        std = np.sqrt(np.maximum(sumsq / counts - mean ** 2, 0.0))
+    return mean, std
+
+
+def add_temporal_features(df, timestamp_col='timestamp'):
+    """
+    Thêm lag, rolling mean/std và harmonic cho DataFrame (hoặc dict cột) dữ liệu thô, vector hoá trên toàn bộ frame.
+    Dữ liệu được trải lên lưới giờ liên tục nên giờ bị thiếu không làm lệch lag;
+    cửa sổ rolling chỉ gồm các giờ trước (không lẫn giá trị hiện tại), bỏ qua NaN,
+    cùng cách tính với ObservationBuffer lúc serving.
+    """
+    hours = to_hours(df[timestamp_col])
+    features = {}
+    if len(hours):
+        start = hours.min()
+        slots = hours - start
+        n_slots = int(slots.max()) + 1
+        for col in [col for col in TEMPORAL_SOURCES if col in df]:
+            dense = np.full(n_slots, np.nan)
+            dense[slots] = np.asarray(df[col], dtype=float)
+
+            for lag in LAGS:
+                lagged = np.full(n_slots, np.nan)
+                if lag < n_slots:
+                    lagged[lag:] = dense[:-lag]
+                features[lag_name(col, lag)] = lagged[slots]
+
+            # Tổng luỹ kế (đã trừ mean để giữ độ chính xác) -> tổng của mọi cửa sổ trong O(n)
+            valid = np.isfinite(dense)
+            center = dense[valid].mean() if valid.any() else 0.0
+            centered = np.where(valid, dense - center, 0.0)
+            cum_sum = np.concatenate([[0.0], np.cumsum(centered)])
+            cum_sumsq = np.concatenate([[0.0], np.cumsum(centered ** 2)])
+            cum_count = np.concatenate([[0], np.cumsum(valid)])
+            for window in ROLLING_WINDOWS:
+                # Cửa sổ của giờ t là [t - window, t - 1]
+                end = slots
+                begin = np.maximum(slots - window, 0)
+                mean, std = window_moments(cum_sum[end] - cum_sum[begin],
+                                           cum_sumsq[end] - cum_sumsq[begin],
+                                           cum_count[end] - cum_count[begin])
+                mean_name, std_name = rolling_names(col, window)
+                features[mean_name] = mean + center
+                features[std_name] = std
+
+    features.update(harmonic_features(hours))
+    for name, values in features.items():
+        df[name] = values
+    return df
+
+
+def iter_temporal_features(chunks, timestamp_col='timestamp'):
+    """
+    add_temporal_features cho từng chunk (theo thứ tự thời gian) của preprocessing 2 lượt:
+    giữ lại HISTORY_HOURS giờ cuối của chunk trước làm ngữ cảnh để chỗ nối chunk
+    cho kết quả giống như tính trên toàn bộ dữ liệu
+    """
+    context = None
+    for chunk in chunks:
+        n_context = 0 if context is None else len(context)
+        frame = chunk if context is None else pd.concat([context, chunk], ignore_index=True)
+        frame = add_temporal_features(frame.copy(), timestamp_col)
+        yield frame.iloc[n_context:].reset_index(drop=True)
+
+        raw = frame[chunk.columns]
+        hours = to_hours(raw[timestamp_col])
+        context = raw[hours > hours.max() - HISTORY_HOURS] if len(raw) else context
+
+
+class ObservationBuffer:
+    """
+    Ring buffer HISTORY_HOURS giờ quan sát gần nhất của một vị trí (mỗi ô một giờ, NaN nếu thiếu).
+    Giữ sẵn tổng / tổng bình phương / số quan sát của từng cửa sổ rolling và cập nhật khi
+    thêm hay đẩy giờ, nên tính features cho giờ kế tiếp là O(1), không phụ thuộc độ dài cửa sổ.
+    """
+
+    def __init__(self, sources=None, history=HISTORY_HOURS):
+        self.sources = list(sources if sources is not None else TEMPORAL_SOURCES)
+        self.capacity = history
+        self.values = np.full((history, len(self.sources)), np.nan)
+        self.last_hour = None
+        self.reset()
+
+    def reset(self, hour=None):
+        self.values[:] = np.nan
+        self.sums = {w: np.zeros(len(self.sources)) for w in ROLLING_WINDOWS}
+        self.sumsq = {w: np.zeros(len(self.sources)) for w in ROLLING_WINDOWS}
+        self.counts = {w: np.zeros(len(self.sources)) for w in ROLLING_WINDOWS}
+        self.last_hour = hour
+
+    def _accumulate(self, window, row, sign):
+        valid = np.isfinite(row)
+        row = np.where(valid, row, 0.0)
+        self.sums[window] += sign * row
+        self.sumsq[window] += sign * row ** 2
+        self.counts[window] += sign * valid
+
+    def advance(self, hour):
+        """
+        Đẩy buffer tới giờ `hour`; các giờ chưa có quan sát là NaN
+        """
+        if self.last_hour is None or hour - self.last_hour >= self.capacity:
+            self.reset(hour)
+            return
+        while self.last_hour < hour:
+            nxt = self.last_hour + 1
+            for window in ROLLING_WINDOWS:
+                # Giờ nxt - window rời khỏi cửa sổ (với window == capacity chính là ô sắp bị ghi đè)
+                self._accumulate(window, self.values[(nxt - window) % self.capacity], -1)
+            self.values[nxt % self.capacity] = np.nan
+            self.last_hour = nxt
+
+    def push(self, hour, row):
+        """
+        Ghi quan sát của giờ `hour` (thay giá trị cũ nếu đã có). Bỏ qua nếu quá cũ so với buffer.
+        """
+        row = np.asarray(row, dtype=float)
+        if self.last_hour is None or hour > self.last_hour:
+            self.advance(hour)
+        elif self.last_hour - hour >= self.capacity:
+            return False
+
+        slot = hour % self.capacity
+        for window in ROLLING_WINDOWS:
+            if self.last_hour - hour < window:
+                self._accumulate(window, self.values[slot], -1)
+                self._accumulate(window, row, 1)
+        self.values[slot] = row
+        return True
+
+    def value_at(self, hour):
+        if self.last_hour is None or not (self.last_hour - self.capacity < hour <= self.last_hour):
+            return np.full(len(self.sources), np.nan)
+        return self.values[hour % self.capacity]
+
+    def features(self, hour):
+        """
+        Features cho giờ `hour` từ các quan sát trước đó (giống add_temporal_features lúc train).
+        Chỉ đọc, không đẩy buffer: giờ sau last_hour chưa có quan sát nên là NaN.
+        """
+        result = {}
+        lags = {lag: self.value_at(hour - lag) for lag in LAGS}
+        for window in ROLLING_WINDOWS:
+            if self.last_hour == hour - 1:
+                mean, std = window_moments(self.sums[window], self.sumsq[window], self.counts[window])
+            else:
+                # Giờ không liền sau quan sát cuối (quá khứ hoặc xa hơn): tính trực tiếp trên cửa sổ
+                rows = np.array([self.value_at(h) for h in range(hour - window, hour)])
+                valid = np.isfinite(rows)
+                filled = np.where(valid, rows, 0.0)
+                mean, std = window_moments(filled.sum(axis=0), (filled ** 2).sum(axis=0), valid.sum(axis=0))
+            for i, col in enumerate(self.sources):
+                mean_name, std_name = rolling_names(col, window)
+                result[mean_name] = float(mean[i])
+                result[std_name] = float(std[i])
+
+        for i, col in enumerate(self.sources):
+            for lag in LAGS:
+                result[lag_name(col, lag)] = float(lags[lag][i])
+        for name, values in harmonic_features([hour]).items():
+            result[name] = float(values[0])
+        return result
+
+
+class TemporalFeatureStore:
+    """
+    ObservationBuffer theo vị trí (toạ độ snap lưới như forecast cache), LRU giới hạn số vị trí.
+    Quan sát được nạp dần từ dữ liệu hourly của Open-Meteo, chỉ các giờ mới so với lần trước.
+    """
+
+    def __init__(self, grid=0.01, max_locations=1024):
+        self.grid = grid
+        self.max_locations = max_locations
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        self.observations = 0
+
+    def _buffer(self, lat, lon, create=False):
+        key = snap_to_grid(lat, lon, self.grid)
+        buffer = self._buffers.get(key)
+        if buffer is not None:
+            self._buffers.move_to_end(key)
+        elif create:
+            buffer = self._buffers[key] = ObservationBuffer()
+            while len(self._buffers) > self.max_locations:
+                self._buffers.popitem(last=False)
+        return buffer
+
+    def observe(self, lat, lon, timestamp, values):
+        """
+        Một quan sát (dict cột -> giá trị) tại một thời điểm
+        """
+        with self._lock:
+            buffer = self._buffer(lat, lon, create=True)
+            row = [values.get(col, np.nan) for col in buffer.sources]
+            row = [np.nan if value is None else value for value in row]
+            self.observations += buffer.push(int(to_hours([timestamp])[0]), row)
+
+    def observe_forecast(self, lat, lon, data):
+        """
+        Nạp các giờ đã qua (trước giờ hiện tại của data['current']['time']) trong data['hourly'].
+        Giờ hourly của Open-Meteo liên tục nên vị trí bắt đầu tính thẳng từ giờ cuối đã nạp.
+        Trả về số giờ mới được nạp.
+        """
+        hourly = data.get('hourly') or {}
+        times = hourly.get('time') or []
+        now = (data.get('current') or {}).get('time')
+        if not times or not now:
+            return 0
+
+        first_hour = int(to_hours([times[0]])[0])
+        now_hour = int(to_hours([now])[0])
+        columns = {col: hourly.get(name) for name, col in OPEN_METEO_SOURCES.items()}
+        with self._lock:
+            buffer = self._buffer(lat, lon, create=True)
+            end = min(len(times), now_hour - first_hour)
+            start = max(0, end - buffer.capacity)
+            if buffer.last_hour is not None:
+                start = max(start, buffer.last_hour + 1 - first_hour)
+            added = 0
+            for i in range(start, end):
+                row = [np.nan if columns.get(col) is None or columns[col][i] is None else columns[col][i]
+                       for col in buffer.sources]
+                added += buffer.push(first_hour + i, row)
+            self.observations += added
+            return added
+
+    def features(self, lat, lon, timestamp):
+        """
+        Features thời gian cho vị trí tại thời điểm `timestamp`
+        (chưa có quan sát nào thì lag / rolling là NaN, chỉ có harmonic)
+        """
+        hour = int(to_hours([timestamp])[0])
+        with self._lock:
+            buffer = self._buffer(lat, lon)
+            return (buffer or ObservationBuffer()).features(hour)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'locations': len(self._buffers),
+                'max_locations': self.max_locations,
+                'history_hours': HISTORY_HOURS,
+                'observations': self.observations
+            }
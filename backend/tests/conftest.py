@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def backend_app():
+    """
+    Module app với database SQLite tạm, không theo dõi thư mục model
+    """
+    os.chdir(BACKEND_DIR)
+    os.environ.setdefault('DATABASE_URI', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+    os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')
+    import app
+    return app
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Thay time.monotonic bằng đồng hồ giả, tiến bằng clock.advance(giây)
+    """
+    fake = Clock()
+    monkeypatch.setattr(time, 'monotonic', fake)
+    return fake
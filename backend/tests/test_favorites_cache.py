@@ -0,0 +1,149 @@
+import uuid
+
+import pytest
+
+from favorites_cache import FavoritesCache, favorites_document
+
+
+class Favorites:
+    """
+    Database giả: load() trả bản sao danh sách hiện tại và đếm số lần đọc
+    """
+    def __init__(self, items=None):
+        self.items = list(items or [])
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        return list(self.items)
+
+
+def test_etag_depends_only_on_content():
+    a = favorites_document([{'id': 1, 'city_name': 'Hanoi'}])
+    b = favorites_document([{'city_name': 'Hanoi', 'id': 1}])
+    c = favorites_document([{'id': 1, 'city_name': 'Hue'}])
+    assert a['etag'] == b['etag'] != c['etag']
+    assert a['body'] == b['body']
+
+
+def test_second_read_is_a_hit():
+    cache = FavoritesCache()
+    load = Favorites([{'id': 1}])
+    first = cache.get_or_load(7, load)
+    assert cache.get_or_load('7', load) is first
+    assert load.loads == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_invalidate_reloads_new_content():
+    cache = FavoritesCache()
+    load = Favorites([{'id': 1}])
+    before = cache.get_or_load(7, load)
+
+    load.items.append({'id': 2})
+    cache.invalidate(7)
+    after = cache.get_or_load(7, load)
+    assert after['items'] == [{'id': 1}, {'id': 2}]
+    assert after['etag'] != before['etag']
+    assert load.loads == 2
+
+
+def test_read_racing_a_write_is_not_cached():
+    cache = FavoritesCache()
+    load = Favorites([{'id': 1}])
+
+    def load_then_write():
+        # Lần ghi commit trong lúc lần đọc này đang chạy: kết quả đọc đã cũ
+        items = load()
+        load.items.append({'id': 2})
+        cache.invalidate(7)
+        return items
+
+    assert cache.get_or_load(7, load_then_write)['items'] == [{'id': 1}]
+    assert cache.get_or_load(7, load)['items'] == [{'id': 1}, {'id': 2}]
+
+
+def test_invalidation_is_per_user():
+    cache = FavoritesCache()
+    load = Favorites([{'id': 1}])
+    cache.get_or_load(1, load)
+    cache.get_or_load(2, load)
+    cache.invalidate(1)
+    cache.get_or_load(2, load)
+    assert load.loads == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = FavoritesCache(ttl=60)
+    load = Favorites([{'id': 1}])
+    cache.get_or_load(7, load)
+    clock.advance(59)
+    cache.get_or_load(7, load)
+    assert load.loads == 1
+    clock.advance(1)
+    cache.get_or_load(7, load)
+    assert load.loads == 2
+
+
+def test_lru_bounds_entries():
+    cache = FavoritesCache(max_size=2)
+    load = Favorites()
+    for user_id in range(3):
+        cache.get_or_load(user_id, load)
+    assert cache.stats()['size'] == 2
+    cache.get_or_load(0, load)
+    assert load.loads == 4
+
+
+@pytest.fixture(scope='module')
+def auth(backend_app):
+    from flask_jwt_extended import create_access_token
+    with backend_app.app.app_context():
+        user = backend_app.User(username=f'favorites_{uuid.uuid4().hex}', password_hash='x')
+        backend_app.db.session.add(user)
+        backend_app.db.session.commit()
+        token = create_access_token(identity=str(user.id))
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_favorites_endpoint_revalidates_with_etag(backend_app, auth):
+    client = backend_app.app.test_client()
+    first = client.get('/api/favorites/', headers=auth)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    cached = client.get('/api/favorites/', headers=dict(auth, **{'If-None-Match': etag}))
+    assert cached.status_code == 304
+
+    added = client.post('/api/favorites/', headers=auth,
+                        json={'city_name': 'Hanoi', 'latitude': 21.0285, 'longitude': 105.8542})
+    assert added.status_code == 201
+
+    changed = client.get('/api/favorites/', headers=dict(auth, **{'If-None-Match': etag}))
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert [fav['city_name'] for fav in changed.get_json()] == ['Hanoi']
+
+
+def test_generations_are_bounded():
+    cache = FavoritesCache(max_size=2)
+    for user_id in range(10):
+        cache.invalidate(user_id)
+    assert cache.stats()['generations'] == 2
+
+
+def test_read_racing_a_write_is_not_cached_after_generation_eviction():
+    cache = FavoritesCache(max_size=1)
+    load = Favorites([{'id': 1}])
+
+    def load_then_write():
+        items = load()
+        load.items.append({'id': 2})
+        cache.invalidate(7)
+        # User 8 ghi sau đẩy generation của user 7 ra khỏi bộ nhớ
+        cache.invalidate(8)
+        return items
+
+    assert cache.get_or_load(7, load_then_write)['items'] == [{'id': 1}]
+    assert cache.get_or_load(7, load)['items'] == [{'id': 1}, {'id': 2}]
+    assert cache.get_or_load(7, load) is cache.get_or_load(7, load)
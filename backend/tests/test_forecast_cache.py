@@ -0,0 +1,162 @@
+import pytest
+
+from forecast_cache import ForecastCache, snap_to_grid
+
+
+class Upstream:
+    """
+    fetch giả: trả lần lượt 'v1', 'v2', ... hoặc raise nếu failing
+    """
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+
+    def __call__(self):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError('upstream down')
+        return f'v{self.calls}'
+
+
+def wait_refreshes(cache):
+    # refresh_workers=1: một task rỗng chạy xong nghĩa là mọi refresh trước đó đã xong
+    cache._executor.submit(lambda: None).result(timeout=5)
+
+
+@pytest.fixture
+def cache(clock):
+    return ForecastCache(max_size=3, field_ttl={'current': 60, 'hourly': 600}, stale_ttl=30, refresh_workers=1)
+
+
+def test_snap_to_grid():
+    assert snap_to_grid(21.02849, 105.85421) == (21.03, 105.85)
+    assert snap_to_grid(-0.004, 179.996) == (-0.0, 180.0)
+
+
+def test_ttl_is_smallest_requested_field(cache):
+    assert cache.ttl_for(['hourly', 'current']) == 60
+    assert cache.ttl_for(['hourly']) == 600
+
+
+def test_fresh_entry_is_served_from_cache(cache, clock):
+    upstream = Upstream()
+    key = cache.make_key(21.0285, 105.8542)
+    assert cache.get_or_fetch(key, upstream, fields=['current']) == 'v1'
+    clock.advance(59)
+    assert cache.get_or_fetch(key, upstream, fields=['current']) == 'v1'
+    assert upstream.calls == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_stale_entry_is_served_then_refreshed(cache, clock):
+    upstream = Upstream()
+    key = cache.make_key(21.0285, 105.8542)
+    cache.get_or_fetch(key, upstream, fields=['current'])
+
+    clock.advance(70)
+    assert cache.get_or_fetch(key, upstream, fields=['current']) == 'v1'
+    wait_refreshes(cache)
+    assert upstream.calls == 2
+    assert cache.get_or_fetch(key, upstream, fields=['current']) == 'v2'
+    assert cache.stats()['stale_hits'] == 1
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_expired_entry_is_refetched_synchronously(cache, clock):
+    upstream = Upstream()
+    key = cache.make_key(21.0285, 105.8542)
+    cache.get_or_fetch(key, upstream, fields=['current'])
+
+    clock.advance(60 + 30)
+    assert cache.get(key)[1] == 'expired'
+    assert cache.get_or_fetch(key, upstream, fields=['current']) == 'v2'
+
+
+def test_expired_entry_is_served_when_upstream_fails(cache, clock):
+    upstream = Upstream()
+    key = cache.make_key(21.0285, 105.8542)
+    cache.get_or_fetch(key, upstream, fields=['current'])
+
+    clock.advance(600)
+    upstream.failing = True
+    assert cache.get_or_fetch(key, upstream, fields=['current']) == 'v1'
+    assert cache.stats()['served_on_error'] == 1
+
+    # Không có bản cũ thì lỗi được trả về cho caller
+    with pytest.raises(ConnectionError):
+        cache.get_or_fetch(cache.make_key(10.0, 10.0), upstream, fields=['current'])
+
+
+def test_failed_background_refresh_keeps_stale_value(cache, clock):
+    upstream = Upstream()
+    key = cache.make_key(21.0285, 105.8542)
+    cache.get_or_fetch(key, upstream, fields=['current'])
+
+    clock.advance(70)
+    upstream.failing = True
+    assert cache.get_or_fetch(key, upstream, fields=['current']) == 'v1'
+    wait_refreshes(cache)
+    assert cache.stats()['refresh_errors'] == 1
+    assert cache.get(key) == ('v1', 'stale')
+
+
+def test_lru_evicts_least_recently_used(cache):
+    for i in range(3):
+        cache.set((float(i), 0.0), i, 60)
+    cache.get((0.0, 0.0))
+    cache.set((3.0, 0.0), 3, 60)
+
+    assert cache.get((1.0, 0.0)) == (None, None)
+    assert cache.get((0.0, 0.0))[0] == 0
+    assert cache.stats()['evictions'] == 1
+
+
+def test_points_are_reference_counted_across_entries(cache):
+    # Hai entry (khác tập biến) cùng một điểm lưới
+    cache.set((21.03, 105.85, 'a'), 'a', 60)
+    cache.set((21.03, 105.85, 'b'), 'b', 60)
+    cache.set((1.0, 1.0), 'c', 60)
+    assert len(cache.points) == 2
+
+    cache.set((2.0, 2.0), 'd', 60)
+    assert (21.03, 105.85) in cache.points
+    cache.set((3.0, 3.0), 'e', 60)
+    assert (21.03, 105.85) not in cache.points
+    assert len(cache.points) == 3
+
+
+def test_get_many_fetches_missing_keys_in_one_batch(cache):
+    batches = []
+
+    def fetch_many(keys):
+        batches.append(list(keys))
+        return [f'value {key[0]}' for key in keys]
+
+    cache.set((1.0, 1.0), 'cached', 60)
+    found = cache.get_many_or_fetch([(1.0, 1.0), (2.0, 2.0), (3.0, 3.0)], fetch_many, fields=['current'])
+    assert found == {(1.0, 1.0): 'cached', (2.0, 2.0): 'value 2.0', (3.0, 3.0): 'value 3.0'}
+    assert batches == [[(2.0, 2.0), (3.0, 3.0)]]
+
+
+def test_derive_recomputes_after_refresh(cache):
+    computed = []
+    value = {'hourly': [1]}
+    for _ in range(2):
+        cache.derive(value, 'model', lambda: computed.append(1) or len(computed))
+    assert len(computed) == 1
+
+    refreshed = {'hourly': [1]}
+    assert cache.derive(refreshed, 'model', lambda: computed.append(1) or len(computed)) == 2
+
+
+def test_keys_are_grid_only_by_default(cache):
+    cache.set(cache.make_key(21.03, 105.85), 'hanoi', 60)
+    assert cache.make_key(21.0401, 105.85) == (21.04, 105.85)
+
+
+def test_snap_km_reuses_nearest_cached_point():
+    cache = ForecastCache(snap_km=2)
+    cache.set(cache.make_key(21.03, 105.85), 'hanoi', 60)
+    assert cache.make_key(21.0401, 105.85) == (21.03, 105.85)
+    assert cache.make_key(21.1, 105.85) == (21.1, 105.85)
+    assert cache.stats()['snapped'] == 1
@@ -0,0 +1,25 @@
+from gazetteer import Gazetteer, read_geonames
+
+GEONAMES_LINES = [
+    '1581130\tHanoi\tHanoi\tHa Noi,Hà Nội\t21.0245\t105.84117\tP\tPPLC\tVN\t\t44\t\t\t\t8053663\t\t20\tAsia/Bangkok\t2024-01-01\n',
+    '1566083\tHo Chi Minh City\tHo Chi Minh City\tSaigon,Sài Gòn\t10.82302\t106.62965\tP\tPPLA\tVN\t\t20\t\t\t\t8993082\t\t10\tAsia/Ho_Chi_Minh\t2024-01-01\n',
+    'truncated\tline\n'
+]
+
+
+def test_read_geonames_tab_separated_without_header():
+    entries = read_geonames(GEONAMES_LINES)
+    assert [entry['name'] for entry in entries] == ['Hanoi', 'Ho Chi Minh City']
+    assert entries[0]['alternate_names'] == ['Ha Noi', 'Hà Nội']
+    assert entries[1]['country_code'] == 'VN' and entries[1]['admin1'] == '20'
+
+
+def test_load_geonames_file(tmp_path):
+    path = tmp_path / 'cities15000.txt'
+    path.write_text(''.join(GEONAMES_LINES), encoding='utf-8')
+    gazetteer = Gazetteer.load(str(path))
+
+    result = gazetteer.search('sai gon')[0]
+    assert result['name'] == 'Ho Chi Minh City'
+    assert result['population'] == 8993082
+    assert gazetteer.search('ha noi')[0]['latitude'] == 21.0245
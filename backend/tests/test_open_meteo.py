@@ -0,0 +1,112 @@
+import pytest
+import requests
+
+import open_meteo
+from open_meteo import OpenMeteoClient, CircuitBreaker, CircuitOpenError
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        return self.body
+
+
+class Session:
+    """
+    Session giả: mỗi lần get trả (hoặc raise) phần tử kế tiếp trong outcomes
+    """
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    monkeypatch.setattr(open_meteo.time, 'sleep', lambda seconds: None)
+
+    def make(outcomes, **kwargs):
+        client = OpenMeteoClient(**kwargs)
+        client.session = Session(outcomes)
+        return client
+    return make
+
+
+def test_retries_server_errors_then_succeeds(make_client):
+    client = make_client([Response(503), requests.exceptions.ConnectionError('reset'), Response(200, {'ok': 1})],
+                         max_retries=2)
+    assert client.forecast({}) == {'ok': 1}
+    assert client.stats()['requests'] == 3
+    assert client.stats()['retries'] == 2
+    assert client.breaker.state == 'closed'
+
+
+def test_gives_up_after_max_retries(make_client):
+    client = make_client([Response(503)] * 3, max_retries=2, breaker_threshold=5)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.forecast({})
+    assert client.session.calls == 3
+    assert client.stats()['failures'] == 1
+    assert client.stats()['circuit']['consecutive_failures'] == 1
+
+
+def test_client_errors_are_not_retried_or_counted_by_breaker(make_client):
+    client = make_client([Response(400)], max_retries=2, breaker_threshold=1)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.forecast({})
+    assert client.session.calls == 1
+    assert client.breaker.state == 'closed'
+
+
+def test_open_circuit_fails_fast(make_client, clock):
+    client = make_client([requests.exceptions.Timeout()] * 2, max_retries=0, breaker_threshold=2, breaker_cooldown=30)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.Timeout):
+            client.forecast({})
+    assert client.breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError):
+        client.forecast({})
+    assert client.session.calls == 2
+    assert client.stats()['circuit']['rejected'] == 1
+
+
+def test_half_open_trial_closes_or_reopens_circuit(make_client, clock):
+    client = make_client([requests.exceptions.Timeout(), requests.exceptions.Timeout(), Response(200, {'ok': 1})],
+                         max_retries=0, breaker_threshold=1, breaker_cooldown=30)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.forecast({})
+
+    # Hết cooldown: một request thử thất bại thì mở lại ngay, không cần đủ threshold
+    clock.advance(30)
+    assert client.breaker.state == 'half-open'
+    with pytest.raises(requests.exceptions.Timeout):
+        client.forecast({})
+    assert client.breaker.state == 'open'
+
+    clock.advance(30)
+    assert client.forecast({}) == {'ok': 1}
+    assert client.breaker.state == 'closed'
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.allow() is True
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def client(backend_app):
+    if not backend_app.model_registry.predictor.models:
+        pytest.skip('No trained model in model/')
+    return backend_app.app.test_client()
+
+
+OBSERVATION = {'radiation': 300.0, 'winddirection': 90.0, 'weathercode': 61}
+
+
+@pytest.mark.parametrize('missing', ['pressure_msl', 'radiation', 'winddirection', 'weathercode'])
+def test_batch_matches_single_row_when_field_missing(client, missing):
+    row = dict(OBSERVATION, pressure_msl=1012.0)
+    del row[missing]
+
+    single = client.post('/api/predict-temperature/', json=row)
+    batch = client.post('/api/predict/batch/', json=[row, dict(OBSERVATION, pressure_msl=1012.0)])
+    assert single.status_code == 200 and batch.status_code == 200
+
+    single, batch = single.get_json(), batch.get_json()
+    assert batch['predicted_temperature'][0] == single['predicted_temperature']
+    for target in ('humidity', 'precipitation'):
+        if f'predicted_{target}' in single:
+            assert batch[f'predicted_{target}'][0] == single[f'predicted_{target}']
+
+
+@pytest.mark.parametrize('payload', [
+    [dict(OBSERVATION, pressure_msl=[1, 2])],
+    [dict(OBSERVATION, pressure_msl=True)],
+    [dict(OBSERVATION, pressure_msl='abc')],
+    {'columns': {'pressure_msl': [1012.0, False], 'radiation': [300.0, 200.0]}},
+    {'columns': {'pressure_msl': [[1012.0], [1013.0]]}},
+    ['not an object']
+])
+def test_batch_rejects_non_numeric_values(client, payload):
+    response = client.post('/api/predict/batch/', json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, n_callers):
+    """
+    Gọi flight.do từ n_callers thread; fn chỉ chạy tiếp khi mọi caller đã vào hàng chờ.
+    Trả về list (result, error) theo thứ tự thread.
+    """
+    release = threading.Event()
+    outcomes = [None] * n_callers
+
+    def leader_fn():
+        release.wait(timeout=5)
+        return fn()
+
+    def caller(i):
+        try:
+            outcomes[i] = (flight.do(key, leader_fn), None)
+        except Exception as e:
+            outcomes[i] = (None, e)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(n_callers)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flight.stats()['shared'] < n_callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    return outcomes
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    outcomes = run_concurrently(flight, 'hanoi', lambda: calls.append(1) or {'temp': 25}, 8)
+
+    assert len(calls) == 1
+    assert all(result is outcomes[0][0] and error is None for result, error in outcomes)
+    assert flight.stats() == {'executed': 1, 'shared': 7, 'in_flight': 0}
+
+
+def test_error_is_raised_to_every_waiter():
+    flight = SingleFlight()
+
+    def fail():
+        raise ConnectionError('upstream down')
+
+    outcomes = run_concurrently(flight, 'hanoi', fail, 4)
+    errors = [error for _, error in outcomes]
+    assert all(isinstance(error, ConnectionError) for error in errors)
+    assert all(error is errors[0] for error in errors)
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_key_is_released_after_call():
+    flight = SingleFlight()
+    assert flight.do('hanoi', lambda: 1) == 1
+    assert flight.do('hanoi', lambda: 2) == 2
+
+    with pytest.raises(ValueError):
+        flight.do('hanoi', lambda: int('x'))
+    assert flight.do('hanoi', lambda: 3) == 3
+    assert flight.stats()['executed'] == 4
+
+
+def test_different_keys_do_not_share():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 'a') == 'a'
+    assert flight.do('b', lambda: 'b') == 'b'
+    assert flight.stats()['shared'] == 0
@@ -0,0 +1,83 @@
+import math
+import random
+
+import pytest
+
+from spatial_index import SpatialIndex, distance_km
+
+
+def brute_force_within(points, lat, lon, radius_km):
+    return sorted(key for key, (p_lat, p_lon) in points.items() if distance_km(lat, lon, p_lat, p_lon) <= radius_km)
+
+
+@pytest.fixture
+def index():
+    return SpatialIndex(cell_km=10)
+
+
+def cell_border(index, lat):
+    # Vĩ độ của cạnh ô gần lat nhất
+    return math.floor((lat + 90) / index.cell_deg) * index.cell_deg - 90
+
+
+def test_nearest_finds_point_across_latitude_border(index):
+    border = cell_border(index, 21.03)
+    index.insert('across', border + 0.002, 105.85)
+    index.insert('same_cell', border - 0.05, 105.85)
+
+    item, km = index.nearest(border - 0.001, 105.85, max_km=10)
+    assert item == 'across'
+    assert km < 0.5
+
+
+def test_nearest_finds_point_across_longitude_border(index):
+    j = math.floor((105.85 + 180) / index.lon_cell_deg)
+    border = j * index.lon_cell_deg - 180
+    index.insert('across', 21.03, border - 0.002)
+    index.insert('same_cell', 21.03, border + 0.06)
+
+    assert index.nearest(21.03, border + 0.001, max_km=10)[0] == 'across'
+
+
+def test_nearest_across_antimeridian(index):
+    index.insert('east', 0.0, 179.99)
+    item, km = index.nearest(0.0, -179.99, max_km=5)
+    assert item == 'east'
+    assert km == pytest.approx(2.2, abs=0.1)
+
+
+def test_nearest_near_pole(index):
+    index.insert('far_lon', 89.9, -120.0)
+    assert index.nearest(89.9, 60.0, max_km=30)[0] == 'far_lon'
+
+
+def test_nearest_outside_radius(index):
+    index.insert('hanoi', 21.03, 105.85)
+    assert index.nearest(10.82, 106.63, max_km=50) == (None, None)
+    assert index.nearest(10.82, 106.63)[0] == 'hanoi'
+
+
+def test_within_matches_brute_force():
+    rng = random.Random(0)
+    index = SpatialIndex(cell_km=25)
+    points = {i: (rng.uniform(20, 22), rng.uniform(105, 107)) for i in range(300)}
+    for key, (lat, lon) in points.items():
+        index.insert(key, lat, lon)
+
+    for _ in range(50):
+        lat, lon = rng.uniform(20, 22), rng.uniform(105, 107)
+        radius = rng.uniform(1, 60)
+        found = index.within(lat, lon, radius)
+        assert sorted(item for item, _ in found) == brute_force_within(points, lat, lon, radius)
+        assert [km for _, km in found] == sorted(km for _, km in found)
+
+
+def test_insert_moves_and_remove_deletes(index):
+    index.insert('p', 21.03, 105.85)
+    index.insert('p', 10.82, 106.63)
+    assert len(index) == 1
+    assert index.nearest(21.03, 105.85, max_km=10) == (None, None)
+
+    index.remove('p')
+    assert 'p' not in index
+    assert index.nearest(10.82, 106.63) == (None, None)
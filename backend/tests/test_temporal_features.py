@@ -0,0 +1,53 @@
+import numpy as np
+
+from temporal_features import TemporalFeatureStore, ObservationBuffer, add_temporal_features, to_hours
+
+
+def forecast(now, first='2026-10-17T00:00', hours=24):
+    """
+    Dữ liệu hourly giả kiểu Open-Meteo: nhiệt độ tăng 1 độ mỗi giờ từ 30
+    """
+    start = np.datetime64(first)
+    return {
+        'current': {'time': now},
+        'hourly': {
+            'time': [str(start + np.timedelta64(i, 'h'))[:16] for i in range(hours)],
+            'temperature_2m': [30.0 + i for i in range(hours)],
+            'relative_humidity_2m': [80.0] * hours,
+            'pressure_msl': [1010.0] * hours
+        }
+    }
+
+
+def test_features_query_does_not_change_buffer():
+    queried = TemporalFeatureStore()
+    queried.observe_forecast(21.0, 105.8, forecast('2026-10-17T05:10'))
+    queried.features(21.0, 105.8, '2026-10-17T12:00')
+    queried.observe_forecast(21.0, 105.8, forecast('2026-10-17T13:10'))
+
+    plain = TemporalFeatureStore()
+    plain.observe_forecast(21.0, 105.8, forecast('2026-10-17T05:10'))
+    plain.observe_forecast(21.0, 105.8, forecast('2026-10-17T13:10'))
+
+    expected = plain.features(21.0, 105.8, '2026-10-17T13:00')
+    np.testing.assert_equal(queried.features(21.0, 105.8, '2026-10-17T13:00'), expected)
+    assert expected['temperature_lag2'] == 41.0
+    assert expected['temperature_roll6_mean'] == 39.5
+
+
+def test_buffer_matches_training_features():
+    data = forecast('2026-10-17T23:10')
+    times, values = data['hourly']['time'], data['hourly']['temperature_2m']
+    buffer = ObservationBuffer(sources=['temperature'])
+    hours = to_hours(times)
+    for hour, value in zip(hours[:12], values[:12]):
+        buffer.push(int(hour), [value])
+
+    columns = add_temporal_features({'timestamp': times, 'temperature': np.array(values)})
+    served = buffer.features(int(hours[12]))
+    for name in ('temperature_lag1', 'temperature_lag3', 'temperature_roll6_mean', 'temperature_roll6_std'):
+        assert np.isclose(served[name], columns[name][12])
+
+    # Giờ 12..14 chưa có quan sát: lag1 của giờ 15 là NaN, buffer giữ nguyên
+    assert np.isnan(buffer.features(int(hours[15]))['temperature_lag1'])
+    assert buffer.last_hour == int(hours[11])
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+# Bộ mã thời tiết WMO mà Open-Meteo trả về (cố định, không phụ thuộc dữ liệu)
+WMO_CODES = [
+    0, 1, 2, 3,
+    45, 48,
+    51, 53, 55, 56, 57,
+    61, 63, 65, 66, 67,
+    71, 73, 75, 77,
+    80, 81, 82, 85, 86,
+    95, 96, 99
+]
+
+LOOKUP_SIZE = 256
+
+
+class WeatherCodeVocabulary:
+    """
+    Từ vựng one-hot cho weathercode: bảng tra code -> chỉ số cột (int16, -1 nếu không có trong từ vựng).
+    Dùng chung cho preprocessing (scatter vector hoá) và serving (ghi một phần tử mỗi request).
+    """
+
+    def __init__(self, codes=None):
+        self.codes = sorted(int(code) for code in (codes if codes is not None else WMO_CODES))
+        self.columns = [f'w_{code}' for code in self.codes]
+        self.lookup = np.full(LOOKUP_SIZE, -1, dtype=np.int16)
+        for i, code in enumerate(self.codes):
+            self.lookup[code] = i
+
+    def __len__(self):
+        return len(self.codes)
+
+    def index(self, code):
+        """
+        Chỉ số cột của một code, -1 nếu không hợp lệ / không có trong từ vựng
+        """
+        try:
+            code = int(code)
+        except (TypeError, ValueError):
+            return -1
+        return int(self.lookup[code]) if 0 <= code < LOOKUP_SIZE else -1
+
+    def indices(self, codes):
+        codes = np.asarray(codes, dtype=float)
+        valid = np.isfinite(codes) & (codes >= 0) & (codes < LOOKUP_SIZE)
+        result = np.full(codes.shape, -1, dtype=np.int16)
+        result[valid] = self.lookup[codes[valid].astype(np.int64)]
+        return result
+
+    def one_hot(self, codes, dtype=np.uint8):
+        """
+        Ma trận one-hot (n_rows x len(vocabulary)); code ngoài từ vựng là hàng toàn 0
+        """
+        indices = self.indices(codes)
+        matrix = np.zeros((len(indices), len(self.codes)), dtype=dtype)
+        rows = np.flatnonzero(indices >= 0)
+        matrix[rows, indices[rows]] = 1
+        return matrix
+
+    def encode_frame(self, df, column='weathercode'):
+        """
+        Thay cột weathercode của DataFrame bằng các cột w_xx (luôn đủ và cùng thứ tự)
+        """
+        codes = df.pop(column).to_numpy()
+        matrix = self.one_hot(codes, dtype=np.int64)
+        for i, name in enumerate(self.columns):
+            df[name] = matrix[:, i]
+        return df, int(np.sum(self.indices(codes) < 0))
@@ -0,0 +1,291 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow là tuỳ chọn, không có thì chỉ dùng được CSV
+    pa = None
+    pq = None
+
+
+# Kiểu dữ liệu gọn cho các cột đã biết; cột w_xx (dummy) lưu dạng bool
+COMPACT_DTYPES = {
+    'temperature': 'float32',
+    'humidity': 'float32',
+    'precipitation': 'float32',
+    'weathercode': 'int8',
+    'cloud_cover': 'float32',
+    'windspeed': 'float32',
+    'winddirection': 'float32',
+    'pressure_msl': 'float32',
+    'radiation': 'float32',
+    'wind_x': 'float32',
+    'wind_y': 'float32'
+}
+
+PARTITION_FILE = 'data.parquet'
+
+
+def is_csv(path):
+    return str(path).lower().endswith('.csv')
+
+
+def exists(path):
+    if is_csv(path):
+        return os.path.exists(path)
+    return bool(partition_files(path))
+
+
+def to_compact(df):
+    """
+    Ép các cột về kiểu gọn (float32, int8 weathercode, bool dummy) và timestamp dạng datetime
+    """
+    df = df.copy()
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    for col, dtype in COMPACT_DTYPES.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    for col in df.columns:
+        if col.startswith('w_'):
+            df[col] = df[col].astype(bool)
+    return df
+
+
+def partition_path(root, year, month):
+    return os.path.join(root, f'year={year:04d}', f'month={month:02d}', PARTITION_FILE)
+
+
+def partition_files(root):
+    return sorted(glob.glob(os.path.join(root, 'year=*', 'month=*', PARTITION_FILE)))
+
+
+def _partition_key(path):
+    month_dir = os.path.basename(os.path.dirname(path))
+    year_dir = os.path.basename(os.path.dirname(os.path.dirname(path)))
+    return int(year_dir.split('=')[1]), int(month_dir.split('=')[1])
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise ImportError("pyarrow is required for Parquet storage (pip install pyarrow), or use a .csv path")
+
+
+def _write_partition(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    pq.write_table(table, path + '.tmp', compression='zstd')
+    os.replace(path + '.tmp', path)
+
+
+def write_weather(df, path):
+    """
+    Ghi toàn bộ dataset: path *.csv -> CSV (export), ngược lại -> Parquet phân vùng theo năm/tháng
+    path/year=YYYY/month=MM/data.parquet. Các phân vùng cũ không còn dữ liệu sẽ bị xoá.
+    """
+    if is_csv(path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        df.to_csv(path, index=False)
+        return
+
+    _require_pyarrow()
+    df = to_compact(df).sort_values('timestamp')
+    written = set()
+    for (year, month), part in df.groupby([df['timestamp'].dt.year, df['timestamp'].dt.month]):
+        target = partition_path(path, year, month)
+        _write_partition(part, target)
+        written.add(target)
+    for old in partition_files(path):
+        if old not in written:
+            os.remove(old)
+
+
+def upsert_weather(df, path):
+    """
+    Gộp các dòng mới vào dataset theo timestamp (dòng mới thắng), chỉ ghi lại các phân vùng bị ảnh hưởng.
+    Trả về số dòng có timestamp chưa từng tồn tại.
+    """
+    if is_csv(path):
+        existing = pd.read_csv(path) if os.path.exists(path) else df.iloc[0:0]
+        merged = pd.concat([existing, df], ignore_index=True)
+        merged = merged.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+        merged.to_csv(path, index=False)
+        return len(merged) - len(existing)
+
+    _require_pyarrow()
+    df = to_compact(df)
+    added = 0
+    for (year, month), part in df.groupby([df['timestamp'].dt.year, df['timestamp'].dt.month]):
+        target = partition_path(path, year, month)
+        if os.path.exists(target):
+            existing = pd.read_parquet(target)
+            merged = pd.concat([existing, part], ignore_index=True)
+            merged = merged.drop_duplicates(subset='timestamp', keep='last')
+            added += len(merged) - len(existing)
+        else:
+            merged = part.drop_duplicates(subset='timestamp', keep='last')
+            added += len(merged)
+        _write_partition(to_compact(merged).sort_values('timestamp'), target)
+    return added
+
+
+def read_weather(path, columns=None, start=None, end=None):
+    """
+    Đọc dataset, chỉ lấy các cột cần (timestamp luôn có) và khoảng thời gian [start, end].
+    Với Parquet, các phân vùng năm/tháng nằm ngoài khoảng bị bỏ qua không đọc.
+    Raise FileNotFoundError nếu không có dữ liệu.
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    if columns is not None and 'timestamp' not in columns:
+        columns = ['timestamp'] + list(columns)
+
+    if is_csv(path):
+        if columns is not None:
+            wanted = set(columns)
+            df = pd.read_csv(path, usecols=lambda col: col in wanted)
+        else:
+            df = pd.read_csv(path)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    else:
+        _require_pyarrow()
+        files = partition_files(path)
+        if not files:
+            raise FileNotFoundError(f"No weather data found in {path}")
+        if start is not None:
+            files = [f for f in files if _partition_key(f) >= (start.year, start.month)]
+        if end is not None:
+            files = [f for f in files if _partition_key(f) <= (end.year, end.month)]
+
+        parts = []
+        for f in files:
+            available = pq.read_schema(f).names
+            cols = [c for c in columns if c in available] if columns is not None else None
+            parts.append(pq.read_table(f, columns=cols).to_pandas())
+        if not parts:
+            return pd.DataFrame(columns=columns or ['timestamp'])
+        df = pd.concat(parts, ignore_index=True)
+
+    if start is not None:
+        df = df[df['timestamp'] >= start]
+    if end is not None:
+        df = df[df['timestamp'] <= end]
+    return df.sort_values('timestamp').reset_index(drop=True)
+
+
+def iter_weather(path, columns=None, chunk_rows=100000):
+    """
+    Đọc dataset theo từng chunk tối đa chunk_rows dòng (theo thứ tự thời gian với Parquet),
+    để xử lý dữ liệu lớn hơn bộ nhớ
+    """
+    if columns is not None and 'timestamp' not in columns:
+        columns = ['timestamp'] + list(columns)
+
+    if is_csv(path):
+        usecols = (lambda col: col in set(columns)) if columns is not None else None
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+            chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+            yield chunk
+        return
+
+    _require_pyarrow()
+    files = partition_files(path)
+    if not files:
+        raise FileNotFoundError(f"No weather data found in {path}")
+    for f in files:
+        parquet_file = pq.ParquetFile(f)
+        cols = [c for c in columns if c in parquet_file.schema_arrow.names] if columns is not None else None
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=cols):
+            yield batch.to_pandas()
+
+
+class WeatherWriter:
+    """
+    Ghi dataset tăng dần theo từng chunk. Với Parquet chỉ giữ trong bộ nhớ các phân vùng tháng
+    chưa hoàn chỉnh (chunk đến theo thứ tự thời gian), phân vùng cũ không được ghi lại sẽ bị xoá khi close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.pending = {}
+        self.written = set()
+        if is_csv(path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        else:
+            _require_pyarrow()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    def write(self, df):
+        if df.empty:
+            return
+        if is_csv(self.path):
+            df.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+            self.rows += len(df)
+            return
+
+        df = to_compact(df)
+        keys = []
+        for key, part in df.groupby([df['timestamp'].dt.year, df['timestamp'].dt.month]):
+            self.pending.setdefault(key, []).append(part)
+            keys.append(key)
+        self.rows += len(df)
+
+        # Các tháng trước chunk hiện tại đã đủ dữ liệu
+        oldest = min(keys)
+        for key in [k for k in self.pending if k < oldest]:
+            self._flush(key)
+
+    def _flush(self, key):
+        part = pd.concat(self.pending.pop(key), ignore_index=True)
+        target = partition_path(self.path, *key)
+        if target in self.written:
+            # Dữ liệu vào không theo thứ tự: gộp với phần đã ghi
+            part = pd.concat([pd.read_parquet(target), part], ignore_index=True)
+        _write_partition(part.sort_values('timestamp'), target)
+        self.written.add(target)
+
+    def close(self):
+        if is_csv(self.path):
+            return
+        for key in sorted(self.pending):
+            self._flush(key)
+        for old in partition_files(self.path):
+            if old not in self.written:
+                os.remove(old)
+
+
+def last_timestamp(path):
+    """
+    Timestamp lớn nhất trong dataset (chỉ đọc phân vùng cuối với Parquet), None nếu chưa có dữ liệu
+    """
+    if not exists(path):
+        return None
+    if is_csv(path):
+        return pd.to_datetime(pd.read_csv(path, usecols=['timestamp'])['timestamp']).max()
+    last = partition_files(path)[-1]
+    return pd.Timestamp(np.max(pq.read_table(last, columns=['timestamp']).column('timestamp').to_pandas()))
+
+
+def export_csv(path, csv_path, columns=None, start=None, end=None):
+    df = read_weather(path, columns=columns, start=start, end=end)
+    write_weather(df, csv_path)
+    return len(df)
+
+
+if __name__ == "__main__":
+    # python weather_store.py <dataset> <file.csv>: xuất dataset Parquet ra CSV
+    import sys
+
+    rows = export_csv(sys.argv[1], sys.argv[2])
+    print(f"Exported {rows} rows to {sys.argv[2]}")
@@ -0,0 +1,152 @@
+import json
+import os
+import pickle
+from datetime import datetime
+
+import numpy as np
+
+from weather_codes import WeatherCodeVocabulary
+
+
+TRANSFORM_FORMAT = 'weather-preprocessing'
+TRANSFORM_FORMAT_VERSION = 1
+TRANSFORM_FILE = 'preprocessing.json'
+LEGACY_SCALER_FILE = 'preprocessing_scaler.pkl'
+
+# Thứ tự cột của preprocessing_scaler.pkl cũ (nếu scaler không lưu feature_names_in_)
+LEGACY_NUMERICAL_COLS = ['temperature', 'humidity', 'precipitation',
+                         'cloud_cover', 'windspeed', 'pressure_msl',
+                         'radiation', 'wind_x', 'wind_y']
+
+
+def encode_wind(columns):
+    """
+    winddirection (độ) -> wind_x, wind_y; dùng được cho DataFrame lẫn dict cột
+    """
+    radians = np.deg2rad(np.asarray(columns.pop('winddirection'), dtype=float))
+    columns['wind_x'] = np.sin(radians)
+    columns['wind_y'] = np.cos(radians)
+    return columns
+
+
+class WeatherTransform:
+    """
+    Phép tiền xử lý đã fit (giống scripts/preprocessing.py): weathercode -> one-hot theo từ vựng,
+    winddirection -> wind_x/wind_y, clip theo quantile, điền missing bằng mean và chuẩn hóa.
+    Training ghi ra preprocessing.json, WeatherPredictor áp dụng vector hoá cho một dòng hay cả batch
+    và đổi dự báo (trên thang chuẩn hóa) về đơn vị gốc.
+    """
+
+    def __init__(self, numerical_cols, mean, scale, clip_bounds=None, codes=None):
+        self.numerical_cols = list(numerical_cols)
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.clip_bounds = {col: (float(lower), float(upper)) for col, (lower, upper) in (clip_bounds or {}).items()}
+        self.codes = codes if codes is not None else WeatherCodeVocabulary()
+        self.index = {col: i for i, col in enumerate(self.numerical_cols)}
+
+    @classmethod
+    def from_scaler(cls, scaler, clip_bounds=None, codes=None, numerical_cols=None):
+        if numerical_cols is None:
+            names = getattr(scaler, 'feature_names_in_', None)
+            numerical_cols = list(names) if names is not None else LEGACY_NUMERICAL_COLS
+        return cls(numerical_cols, scaler.mean_, scaler.scale_, clip_bounds, codes)
+
+    def transform_columns(self, columns):
+        """
+        Áp dụng cho dict cột -> list/array (một dòng là các mảng độ dài 1).
+        Chỉ các cột transform biết được đổi sang float; các cột khác giữ nguyên.
+        """
+        columns = dict(columns)
+        if 'winddirection' in columns:
+            wind = encode_wind({'winddirection': columns.pop('winddirection')})
+            columns.setdefault('wind_x', wind['wind_x'])
+            columns.setdefault('wind_y', wind['wind_y'])
+
+        if 'weathercode' in columns:
+            matrix = self.codes.one_hot(np.asarray(columns.pop('weathercode'), dtype=float), dtype=float)
+            for k, col in enumerate(self.codes.columns):
+                columns[col] = matrix[:, k]
+
+        for col, (lower, upper) in self.clip_bounds.items():
+            if col in columns:
+                columns[col] = np.clip(np.asarray(columns[col], dtype=float), lower, upper)
+
+        present = [col for col in self.numerical_cols if col in columns]
+        if present:
+            idx = [self.index[col] for col in present]
+            values = np.column_stack([np.asarray(columns[col], dtype=float) for col in present])
+            values = (values - self.mean[idx]) / self.scale[idx]
+            # Missing được điền bằng mean, tức 0 sau chuẩn hóa
+            values[np.isnan(values)] = 0.0
+            for k, col in enumerate(present):
+                columns[col] = values[:, k]
+
+        return columns
+
+    def transform_frame(self, df):
+        """
+        Áp dụng cho DataFrame dữ liệu thô (thứ tự cột giống preprocess_weather_data)
+        """
+        df, _ = self.codes.encode_frame(df)
+        df = encode_wind(df)
+        for col, (lower, upper) in self.clip_bounds.items():
+            if col in df.columns:
+                df[col] = df[col].clip(lower, upper)
+        cols = [col for col in self.numerical_cols if col in df.columns]
+        idx = [self.index[col] for col in cols]
+        df[cols] = (df[cols].astype(float).fillna(dict(zip(cols, self.mean[idx]))) - self.mean[idx]) / self.scale[idx]
+        return df
+
+    def inverse_target(self, target, values):
+        """
+        Đổi giá trị trên thang chuẩn hóa về đơn vị gốc (target không được chuẩn hóa thì giữ nguyên)
+        """
+        i = self.index.get(target)
+        if i is None:
+            return values
+        return values * self.scale[i] + self.mean[i]
+
+    def to_dict(self):
+        return {
+            'format': TRANSFORM_FORMAT,
+            'format_version': TRANSFORM_FORMAT_VERSION,
+            'created_at': datetime.now().isoformat(),
+            'numerical_cols': self.numerical_cols,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'clip_bounds': {col: list(bounds) for col, bounds in self.clip_bounds.items()},
+            'weather_codes': self.codes.codes
+        }
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, TRANSFORM_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(path + '.tmp', path)
+        return path
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Đọc preprocessing.json; với model cũ chỉ có preprocessing_scaler.pkl thì dựng lại
+        (không có clip). Trả về None nếu không có cả hai.
+        Raise ValueError nếu file không đúng định dạng.
+        """
+        path = os.path.join(directory, TRANSFORM_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                spec = json.load(f)
+            if spec.get('format') != TRANSFORM_FORMAT or spec.get('format_version') != TRANSFORM_FORMAT_VERSION:
+                raise ValueError(f"Unsupported preprocessing format: {spec.get('format')} v{spec.get('format_version')}")
+            return cls(spec['numerical_cols'], spec['mean'], spec['scale'], spec.get('clip_bounds'),
+                       WeatherCodeVocabulary(spec.get('weather_codes')))
+
+        legacy_path = os.path.join(directory, LEGACY_SCALER_FILE)
+        if os.path.exists(legacy_path):
+            with open(legacy_path, 'rb') as f:
+                scaler = pickle.load(f)
+            return cls.from_scaler(scaler, codes=WeatherCodeVocabulary())
+
+        return None
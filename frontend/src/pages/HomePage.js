@@ -276,17 +276,9 @@ const HomePage = () => {
 
     const fetchFavorites = async () => {
         try {
-            const res = await api.get('favorites/');
-            const listWithTemp = await Promise.all(res.data.map(async (item) => {
-                try {
-                    const w = await fetch(`https://api.open-meteo.com/v1/forecast?latitude=${item.latitude}&longitude=${item.longitude}&current=temperature_2m`);
-                    const j = await w.json();
-                    return { ...item, current_temp: j.current.temperature_2m };
-                } catch {
-                    return { ...item, current_temp: null };
-                }
-            }));
-            setFavorites(listWithTemp);
+            // Backend returns current temperature too (one Open-Meteo request for all favorites)
+            const res = await api.get('favorites/conditions/');
+            setFavorites(res.data);
         } catch (error) {
             console.error("Error fetching favorites:", error);
         }